@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark: per-request insert_one vs. the write-behind contact queue.
+
+Submits the same contact documents from ``--concurrency`` concurrent workers,
+once awaiting ``insert_one`` per submission (the old ``/api/contact`` path) and
+once through ``WriteBehindQueue.put``. Reports acknowledgement throughput and
+latency, and for the queue also the time until every document is in Mongo.
+Needs a reachable mongod; the benchmark database is dropped afterwards.
+
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_contact_ingest.py --count 20000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ingest import WriteBehindQueue  # noqa: E402
+
+
+def make_submission(i: int) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "name": f"Клиент {i}",
+        "phone": f"+7 900 {i:07d}",
+        "email": f"client{i}@example.ru",
+        "message": "Хотим оформить стену кафе, площадь около 30 м². Перезвоните, пожалуйста.",
+        "status": "new",
+        "created_at": datetime.utcnow(),
+    }
+
+
+async def drive(submit, count: int, concurrency: int):
+    latencies = []
+    counter = iter(range(count))
+
+    async def worker():
+        for i in counter:
+            document = make_submission(i)
+            start = time.perf_counter()
+            await submit(document)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies
+
+
+def report(name: str, count: int, elapsed: float, latencies, persisted_after: float = None):
+    ordered = sorted(latencies)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    line = (f"  {name:<16} acks {count / elapsed:9.0f}/s  "
+            f"p50 {statistics.median(ordered) * 1e3:7.3f} ms  p99 {p99 * 1e3:7.3f} ms")
+    if persisted_after is not None:
+        line += f"  persisted {count / persisted_after:9.0f}/s"
+    print(line)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--fsync", action="store_true", help="fsync the journal before each acknowledgement")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[f"bench_ingest_{uuid.uuid4().hex[:8]}"]
+    try:
+        await db.contact_submissions.create_index("id", unique=True)
+        print(f"{args.count} submissions, concurrency {args.concurrency}")
+
+        elapsed, latencies = await drive(db.contact_submissions.insert_one, args.count, args.concurrency)
+        report("insert_one", args.count, elapsed, latencies, persisted_after=elapsed)
+        await db.contact_submissions.delete_many({})
+
+        async def flush(documents):
+            await db.contact_submissions.insert_many(documents, ordered=False)
+
+        with tempfile.TemporaryDirectory() as journal_dir:
+            queue = WriteBehindQueue(flush, Path(journal_dir), name="bench", max_batch=args.batch, fsync=args.fsync)
+            await queue.start()
+            start = time.perf_counter()
+            elapsed, latencies = await drive(queue.put, args.count, args.concurrency)
+            await queue.stop()
+            persisted_after = time.perf_counter() - start
+        assert await db.contact_submissions.count_documents({}) == args.count
+        report("write-behind", args.count, elapsed, latencies, persisted_after=persisted_after)
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
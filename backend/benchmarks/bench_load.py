@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Load benchmark: throughput and latency percentiles for every /api route.
+
+Runs the FastAPI app in-process over ``httpx.ASGITransport`` (or against a
+running server with ``--url``) on a throwaway database of a local mongod,
+optionally filled with ``cli.py generate`` data first. Each endpoint is driven
+on its own by ``--concurrency`` workers for ``--requests`` requests; the
+results go to a JSON file that a later run can be compared against:
+
+    python benchmarks/bench_load.py --portfolio 100000 --output before.json
+    python benchmarks/bench_load.py --portfolio 100000 --baseline before.json
+
+Compared to the baseline, an endpoint whose p95 grew or whose throughput
+dropped by more than ``--threshold`` percent is a regression, and the exit
+status is 1.
+
+Deliberately not driven: ``POST /api/seed-data`` and the admin
+``PUT /api/pricing-rules`` and ``DELETE /api/portfolio/{id}``, since they
+replace or remove the data being measured, and ``GET /api/stream``, whose
+long-lived connections have their own benchmark in ``bench_stream.py``. The
+admin export is driven only when ``ADMIN_TOKEN`` is known (always in-process).
+"""
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+
+class Endpoint(NamedTuple):
+    name: str
+    method: str
+    path: str
+    body: Optional[Callable[[int], dict]] = None  # request number -> JSON body
+    form: Optional[Callable[[int], dict]] = None  # request number -> multipart ``data`` and ``files``
+    headers: Optional[Dict[str, str]] = None
+
+
+# Request numbers are never reused within a run, and the run id differs between runs, so no
+# contact submission repeats an earlier one and is dropped by duplicate suppression
+RUN_ID = uuid.uuid4().hex[:8]
+REQUEST_NUMBERS = itertools.count()
+
+
+def contact_body(i: int) -> dict:
+    return {
+        "name": f"Клиент {i}",
+        "phone": f"+7 900 {i % 10_000_000:07d}",
+        "email": f"client{i}.{RUN_ID}@example.ru",
+        "message": f"Хотим оформить стену кафе, площадь около 30 м². Перезвоните, пожалуйста. ({RUN_ID}-{i})",
+    }
+
+
+def project_body(i: int) -> dict:
+    return {
+        "title": f"Нагрузочный проект {i}",
+        "category": "murals",
+        "image": "https://images.unsplash.com/photo-1487452066049-a710f7296400?fm=jpg&q=85",
+        "description": "Создан нагрузочным тестом.",
+    }
+
+
+def upload_form(image: bytes) -> Callable[[int], dict]:
+    def form(i: int) -> dict:
+        fields = project_body(i)
+        del fields["image"]
+        return {"data": fields, "files": {"image": ("project.png", image, "image/png")}}
+    return form
+
+
+def bulk_form(image: bytes, size: int = 10) -> Callable[[int], dict]:
+    def form(i: int) -> dict:
+        projects = [{**project_body(i * size + j), "image": "photo"} for j in range(size)]
+        return {"data": {"projects": json.dumps(projects, ensure_ascii=False)},
+                "files": {"photo": ("project.png", image, "image/png")}}
+    return form
+
+
+def price_body(i: int) -> dict:
+    return {"area": 5 + i % 200, "tier": ("basic", "standard", "premium")[i % 3]}
+
+
+def batch_price_body(i: int) -> dict:
+    return {"rows": [price_body(i + j) for j in range(100)]}
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def setup_endpoints(client: httpx.AsyncClient, image_digest: Optional[str],
+                          admin_token: Optional[str]) -> List[Endpoint]:
+    first_page = await client.get("/api/portfolio")
+    first_page.raise_for_status()
+    endpoints = [
+        Endpoint("landing", "GET", "/api/landing"),
+        Endpoint("portfolio", "GET", "/api/portfolio"),
+        Endpoint("portfolio by category", "GET", "/api/portfolio?category=murals"),
+        Endpoint("portfolio featured", "GET", "/api/portfolio?featured=true"),
+        Endpoint("portfolio sparse", "GET", "/api/portfolio?fields=title,category,image,variants"),
+        Endpoint("portfolio categories", "GET", "/api/portfolio/categories"),
+        Endpoint("services", "GET", "/api/services"),
+        Endpoint("testimonials", "GET", "/api/testimonials"),
+        Endpoint("faqs", "GET", "/api/faqs"),
+        Endpoint("process", "GET", "/api/process"),
+        Endpoint("pricing rules", "GET", "/api/pricing-rules"),
+        Endpoint("metrics", "GET", "/api/metrics"),
+        Endpoint("search", "GET", "/api/search?q=граффити%20в%20пере"),
+        Endpoint("calculate price", "POST", "/api/calculate-price", price_body),
+        Endpoint("calculate price batch", "POST", "/api/calculate-price/batch", batch_price_body),
+        Endpoint("contact", "POST", "/api/contact", contact_body),
+        Endpoint("create project", "POST", "/api/portfolio", project_body),
+        Endpoint("upload project", "POST", "/api/portfolio/upload", form=upload_form(make_png(400, 300))),
+        Endpoint("bulk upload", "POST", "/api/portfolio/bulk", form=bulk_form(make_png(400, 300))),
+    ]
+    if admin_token:
+        # Submissions made since setup: the ones this run posts, not the whole generated history
+        since = datetime.utcnow().isoformat()
+        endpoints.append(Endpoint("contact export", "GET", f"/api/contact/export?format=ndjson&since={since}",
+                                  headers={"X-Admin-Token": admin_token}))
+    cursor = first_page.headers.get("X-Next-Cursor")
+    if cursor:
+        endpoints.insert(2, Endpoint("portfolio page 2", "GET", f"/api/portfolio?cursor={cursor}"))
+    if image_digest:
+        endpoints.append(Endpoint("image", "GET", f"/api/images/{image_digest}"))
+    return endpoints
+
+
+LATENCY_FIELDS = ("rps", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+
+
+async def drive(client: httpx.AsyncClient, endpoint: Endpoint, count: int, concurrency: int) -> Dict:
+    latencies: List[float] = []
+    errors = 0
+    counter = itertools.islice(REQUEST_NUMBERS, count)
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            kwargs = {"headers": endpoint.headers}
+            if endpoint.body:
+                kwargs["json"] = endpoint.body(i)
+            elif endpoint.form:
+                kwargs.update(endpoint.form(i))
+            start = time.perf_counter()
+            response = await client.request(endpoint.method, endpoint.path, **kwargs)
+            await response.aread()
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    ordered = sorted(latencies)
+    if not ordered:
+        return {"requests": 0, "errors": errors, **dict.fromkeys(LATENCY_FIELDS, 0.0)}
+    return {
+        "requests": count,
+        "errors": errors,
+        "rps": count / elapsed,
+        "mean_ms": sum(ordered) / len(ordered) * 1e3,
+        "p50_ms": percentile(ordered, 0.50) * 1e3,
+        "p95_ms": percentile(ordered, 0.95) * 1e3,
+        "p99_ms": percentile(ordered, 0.99) * 1e3,
+        "max_ms": ordered[-1] * 1e3,
+    }
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Print the change per endpoint against ``baseline``; returns the names of regressed endpoints."""
+    regressions = []
+    print(f"\nvs. baseline {baseline['meta'].get('commit', '?')} (threshold {threshold:.0f}%)")
+    for name, current in results["endpoints"].items():
+        before = baseline["endpoints"].get(name)
+        if before is None:
+            print(f"  {name:<24} new")
+            continue
+        if not current["requests"] or not before["requests"]:
+            print(f"  {name:<24} no requests to compare")
+            continue
+        p95_change = (current["p95_ms"] / before["p95_ms"] - 1) * 100
+        rps_change = (current["rps"] / before["rps"] - 1) * 100
+        regressed = p95_change > threshold or rps_change < -threshold
+        if regressed:
+            regressions.append(name)
+        print(f"  {name:<24} p95 {p95_change:+7.1f}%  rps {rps_change:+7.1f}%{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_png(width: int = 1200, height: int = 800) -> bytes:
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (220, 40, 90)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+async def run(args) -> Dict:
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+        image_digest = None
+        server = None
+    else:
+        import server
+        from cli import generate_data
+        # Startup seeds the empty database; generated data then replaces the seeded collections
+        await server.app.router.startup()
+        if any((args.portfolio, args.testimonials, args.contacts)):
+            counts = {"portfolio": args.portfolio, "testimonials": args.testimonials,
+                      "contact_submissions": args.contacts}
+            await generate_data(counts, seed=42, days=3 * 365, chunk_size=5000, in_flight=4, drop=True, interval=5.0)
+            server.response_cache.clear()
+        image_digest = server.blob_store.put(make_png())
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://bench", timeout=60)
+
+    try:
+        endpoints = await setup_endpoints(client, image_digest, os.environ.get("ADMIN_TOKEN"))
+        if args.only:
+            endpoints = [e for e in endpoints if any(part in e.name for part in args.only.split(","))]
+        results = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": datetime.utcnow().isoformat(),
+                "target": args.url or "asgi",
+                "concurrency": args.concurrency,
+                "requests": args.requests,
+                "cache": not args.no_cache,
+                "python": platform.python_version(),
+            },
+            "endpoints": {},
+        }
+        print(f"{len(endpoints)} endpoints, {args.requests} requests each, concurrency {args.concurrency}")
+        for endpoint in endpoints:
+            if args.warmup > 0:
+                await drive(client, endpoint, args.warmup, min(args.concurrency, args.warmup))
+            result = await drive(client, endpoint, args.requests, args.concurrency)
+            results["endpoints"][endpoint.name] = result
+            print(f"  {endpoint.name:<24} {result['rps']:9.0f}/s  p50 {result['p50_ms']:8.2f} ms  "
+                  f"p95 {result['p95_ms']:8.2f} ms  p99 {result['p99_ms']:8.2f} ms"
+                  f"{'  errors ' + str(result['errors']) if result['errors'] else ''}")
+        return results
+    finally:
+        await client.aclose()
+        if server is not None:
+            await server.app.router.shutdown()
+            if not args.keep:
+                drop_client = server.AsyncIOMotorClient(server.mongo_url)
+                await drop_client.drop_database(server.db.name)
+                drop_client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=50, help="Unrecorded requests per endpoint first")
+    parser.add_argument("--only", help="Comma-separated substrings of the endpoint names to run")
+    parser.add_argument("--portfolio", type=int, default=0, help="Generate this many projects first")
+    parser.add_argument("--testimonials", type=int, default=0)
+    parser.add_argument("--contacts", type=int, default=0)
+    parser.add_argument("--no-cache", action="store_true", help="Disable the response cache")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark database")
+    parser.add_argument("--output", type=Path, help="Write the results as JSON")
+    parser.add_argument("--baseline", type=Path, help="Compare with the JSON of an earlier run")
+    parser.add_argument("--threshold", type=float, default=20.0, help="Regression threshold in percent")
+    args = parser.parse_args()
+
+    if not args.url:
+        # Configure the in-process app before it is imported
+        os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+        os.environ["DB_NAME"] = os.environ.get("BENCH_DB_NAME") or f"bench_load_{uuid.uuid4().hex[:8]}"
+        os.environ.setdefault("MEDIA_DIR", tempfile.mkdtemp(prefix="bench-media-"))
+        os.environ.setdefault("JOURNAL_DIR", tempfile.mkdtemp(prefix="bench-journal-"))
+        # Every request comes from one address; measure the endpoint, not its spam limits
+        os.environ.setdefault("CONTACT_IP_BURST", "1e9")
+        os.environ.setdefault("ADMIN_TOKEN", uuid.uuid4().hex)
+        if args.no_cache:
+            os.environ["CACHE_MAX_BYTES"] = "0"
+
+    results = asyncio.run(run(args))
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2, ensure_ascii=False))
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        if compare(results, json.loads(args.baseline.read_text()), args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
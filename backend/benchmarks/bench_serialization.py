@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: list-response serialization, validated vs. trusted fast path.
+
+Compares what a list endpoint used to do per request -- build a model per
+Mongo document, re-validate the list against ``response_model`` and encode
+with the stdlib -- with the fast path: project out ``_id`` and encode the raw
+documents with orjson. No database is needed; documents are synthesized.
+
+    python benchmarks/bench_serialization.py --items 1000 --rounds 50
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+
+from server import PortfolioProject, dump_json  # noqa: E402
+
+
+def make_documents(count: int) -> List[dict]:
+    return [
+        {
+            "_id": ObjectId(),
+            "id": str(uuid.uuid4()),
+            "title": f"Граффити проект №{i}",
+            "category": ("murals", "portraits", "commercial", "abstract", "automotive")[i % 5],
+            "image": "/api/images/" + uuid.uuid4().hex * 2,
+            "variants": None,
+            "description": "Масштабная работа в подземном переходе с яркими цветами и современным дизайном.",
+            "featured": i % 7 == 0,
+            "created_at": datetime.utcnow(),
+        }
+        for i in range(count)
+    ]
+
+
+def validated(documents: List[dict]) -> bytes:
+    models = [PortfolioProject(**document) for document in documents]
+    adapter = TypeAdapter(List[PortfolioProject])
+    value = adapter.validate_python(models)
+    content = adapter.dump_python(value, mode="json")
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def fast(documents: List[dict]) -> bytes:
+    # Mongo applies the {"_id": 0} projection server-side; strip it here to match
+    return dump_json([{k: v for k, v in document.items() if k != "_id"} for document in documents])
+
+
+def fast_projected(documents: List[dict]) -> bytes:
+    return dump_json(documents)
+
+
+def measure(fn, documents, rounds: int) -> float:
+    fn(documents)  # warm-up
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn(documents)
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    documents = make_documents(args.items)
+    projected = [{k: v for k, v in document.items() if k != "_id"} for document in documents]
+    assert json.loads(validated(documents)) == json.loads(fast_projected(projected))
+
+    baseline = measure(validated, documents, args.rounds)
+    results = {
+        "models + response_model + json": baseline,
+        "orjson, _id stripped in Python": measure(fast, documents, args.rounds),
+        "orjson, _id projected by Mongo": measure(fast_projected, projected, args.rounds),
+    }
+    print(f"{args.items} portfolio items, {args.rounds} rounds")
+    for name, seconds in results.items():
+        per_item = seconds / args.items * 1e6
+        print(f"  {name:<34} {seconds * 1e3:8.2f} ms/response  {per_item:6.2f} µs/item  x{baseline / seconds:5.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Fan-out benchmark and end-to-end check of the /api/stream change feed.
+
+Starts a ``ChangeFeed`` on a throwaway database, attaches ``--clients``
+subscribers plus ``--slow`` ones that never read, and inserts ``--count``
+portfolio projects from ``--concurrency`` writers. Reports the insert-to-
+delivery latency over all clients and how many slow clients were reset
+instead of buffering without bound. It then reconnects with a
+``Last-Event-ID`` from the middle of the run, expecting exactly the missed
+events, and swaps the collection in through staging, expecting a ``reset``.
+
+Change streams need a replica set; a single local node is enough:
+
+    mongod --replSet rs0 --dbpath /tmp/rs0 && mongosh --eval 'rs.initiate()'
+    MONGO_URL='mongodb://localhost:27017/?directConnection=true' python benchmarks/bench_stream.py
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from changefeed import ChangeFeed  # noqa: E402
+from staging import replace_collections  # noqa: E402
+
+
+def parse(data: bytes) -> dict:
+    fields = dict(line.split(": ", 1) for line in data.decode().splitlines() if ": " in line)
+    if "data" in fields:
+        fields["data"] = json.loads(fields["data"])
+    return fields
+
+
+def make_project(i: int) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "title": f"Потоковый проект {i}",
+        "description": "Роспись стены для проверки живых обновлений",
+        "category": "murals",
+        "image": "https://example.com/mural.jpg",
+        "featured": False,
+        "created_at": datetime.utcnow(),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--slow", type=int, default=10, help="subscribers that never read")
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--queue-size", type=int, default=100)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017/?directConnection=true"))
+    db = client[f"bench_stream_{uuid.uuid4().hex[:8]}"]
+    await db.create_collection("portfolio")
+    feed = ChangeFeed(db, ["portfolio"], buffer_size=args.count, queue_size=args.queue_size,
+                      max_subscribers=args.clients + args.slow + 1)
+    try:
+        await feed.start()
+        probe = await feed.stream()
+        await probe.__anext__()
+        await asyncio.sleep(1)  # let the change stream open before writing
+        await db.portfolio.insert_one(make_project(-1))
+        try:
+            await asyncio.wait_for(probe.__anext__(), timeout=5)
+        except asyncio.TimeoutError:
+            sys.exit("No change events; is MONGO_URL a replica set?")
+        await probe.aclose()
+
+        sent = {}
+        latencies = []
+        event_ids = []
+        resets = 0
+
+        async def consume(frames, record_ids=False):
+            nonlocal resets
+            received = 0
+            async for data in frames:
+                event = parse(data)
+                if event.get("event") == "reset":
+                    resets += 1
+                    return
+                if event.get("event") == "change":
+                    latencies.append(time.perf_counter() - sent[event["data"]["document"]["id"]])
+                    if record_ids:
+                        event_ids.append(event["id"])
+                    received += 1
+                    if received == args.count:
+                        return
+
+        readers = [asyncio.create_task(consume(await feed.stream(), record_ids=i == 0)) for i in range(args.clients)]
+        slow = [await feed.stream() for _ in range(args.slow)]
+        for frames in slow:
+            await frames.__anext__()  # subscribed; never read again
+
+        counter = iter(range(args.count))
+
+        async def writer():
+            for i in counter:
+                project = make_project(i)
+                sent[project["id"]] = time.perf_counter()
+                await db.portfolio.insert_one(project)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(writer() for _ in range(args.concurrency)))
+        await asyncio.wait_for(asyncio.gather(*readers), timeout=60)
+        elapsed = time.perf_counter() - start
+        for frames in slow:
+            await frames.aclose()
+
+        ordered = sorted(latencies)
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        print(f"{args.count} inserts to {args.clients} clients in {elapsed:.2f}s "
+              f"({len(latencies) / elapsed:.0f} events/s delivered)")
+        print(f"  delivery p50 {statistics.median(ordered) * 1e3:.2f} ms  p99 {p99 * 1e3:.2f} ms")
+        print(f"  clients reset for falling behind: {feed.overflows} ({resets} of them reading)")
+
+        middle = len(event_ids) // 2
+        frames = await feed.stream(event_ids[middle])
+        await frames.__anext__()
+        missed = [parse(await frames.__anext__()) for _ in range(len(event_ids) - middle - 1)]
+        assert all(event["event"] == "change" for event in missed), "replay after Last-Event-ID is incomplete"
+        print(f"  reconnect from the middle replayed {len(missed)} events")
+
+        await replace_collections(db, {"portfolio": [make_project(i) for i in range(10)]})
+        event = parse(await asyncio.wait_for(frames.__anext__(), timeout=10))
+        assert event["event"] == "reset", event
+        print(f"  staging swap sent reset for {event['data']['collections']}")
+    finally:
+        await feed.stop()
+        await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,156 @@
+"""Content-addressed storage for uploaded images.
+
+Blobs live on disk under ``<root>/<aa>/<bb>/<sha256>`` so identical uploads are
+stored once and a blob's URL never changes meaning, which lets clients cache
+them forever. Documents reference blobs by digest only.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Iterator, Optional
+
+DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+# Leading bytes of the formats we accept, used to pick a Content-Type when serving
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+def sniff_media_type(head: bytes) -> str:
+    for signature, media_type in _SIGNATURES:
+        if head.startswith(signature):
+            return media_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:12] in (b"ftypavif", b"ftypavis"):
+        return "image/avif"
+    return "application/octet-stream"
+
+
+class BlobStore:
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def path_for(self, digest: str) -> Path:
+        if not DIGEST_RE.match(digest):
+            raise ValueError(f"Invalid blob digest: {digest!r}")
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    def exists(self, digest: str) -> bool:
+        return DIGEST_RE.match(digest) is not None and self.path_for(digest).is_file()
+
+    def put(self, data: bytes) -> str:
+        """Store ``data`` and return its sha256 hex digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".upload-")
+            try:
+                with os.fdopen(fd, "wb") as fh:
+                    fh.write(data)
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        return digest
+
+    def delete(self, digest: str) -> None:
+        try:
+            os.unlink(self.path_for(digest))
+        except FileNotFoundError:
+            pass
+
+    def writer(self) -> "BlobWriter":
+        """Store a blob written in pieces, for uploads too large to hold in memory."""
+        return BlobWriter(self)
+
+    def stat(self, digest: str) -> Optional[os.stat_result]:
+        try:
+            return self.path_for(digest).stat()
+        except (ValueError, FileNotFoundError):
+            return None
+
+    def media_type(self, digest: str) -> str:
+        with open(self.path_for(digest), "rb") as fh:
+            return sniff_media_type(fh.read(16))
+
+    def iter_range(self, digest: str, start: int, end: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """Yield bytes ``start..end`` (inclusive) of a blob in ``chunk_size`` pieces."""
+        with open(self.path_for(digest), "rb") as fh:
+            fh.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = fh.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+
+class BlobWriter:
+    """A blob being written: hashed as it streams to a temporary file, moved into place by ``commit``.
+
+    Used as a context manager, a writer that was not committed is discarded.
+    """
+
+    HEAD_BYTES = 16  # enough for ``sniff_media_type``
+
+    def __init__(self, store: BlobStore):
+        self.store = store
+        self.size = 0
+        self.head = b""
+        self._hash = hashlib.sha256()
+        store.root.mkdir(parents=True, exist_ok=True)
+        # The digest, and so the final directory, is only known at the end; same filesystem for os.replace
+        fd, self._tmp = tempfile.mkstemp(dir=store.root, prefix=".upload-")
+        self._file = os.fdopen(fd, "wb")
+        self._done = False
+        self.created = False  # whether ``commit`` added the blob rather than finding it stored
+
+    def write(self, data: bytes) -> None:
+        self._file.write(data)
+        self._hash.update(data)
+        self.size += len(data)
+        if len(self.head) < self.HEAD_BYTES:
+            self.head += data[:self.HEAD_BYTES - len(self.head)]
+
+    def commit(self) -> str:
+        """Move the blob into the store and return its sha256 hex digest."""
+        self._file.close()
+        digest = self._hash.hexdigest()
+        path = self.store.path_for(digest)
+        try:
+            if path.exists():
+                os.unlink(self._tmp)
+            else:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(self._tmp, path)
+                self.created = True
+        except BaseException:
+            self.abort()
+            raise
+        self._done = True
+        return digest
+
+    def abort(self) -> None:
+        if self._done:
+            return
+        self._done = True
+        self._file.close()
+        try:
+            os.unlink(self._tmp)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "BlobWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.abort()
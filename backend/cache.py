@@ -0,0 +1,134 @@
+"""In-process cache for serialized API responses.
+
+Content endpoints (services, FAQs, portfolio, ...) change a few times a month
+but are read on every page load, so their already-encoded JSON bodies are kept
+in memory with a TTL and an overall size cap. Entries are grouped by namespace
+(the Mongo collection they were built from) so writes can drop everything that
+depends on a collection in one call.
+
+``SingleFlight`` covers the moment between a miss and the refill: concurrent
+callers missing the same key share one in-flight load instead of each
+querying Mongo for the same body.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, Optional, Tuple, TypeVar
+
+
+T = TypeVar("T")
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    media_type: str = "application/json"
+    headers: Dict[str, str] = field(default_factory=dict)
+    encoded: Dict[str, bytes] = field(default_factory=dict)  # content-encoding -> compressed body
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(data) for data in self.encoded.values())
+
+
+class ResponseCache:
+    """LRU cache of serialized responses bounded by TTL and total body size."""
+
+    def __init__(self, ttl: float = 300.0, max_bytes: int = 32 * 1024 * 1024, derived: Iterable[str] = ()):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        # Namespaces built from other namespaces' entries, dropped by every invalidation
+        self.derived = tuple(derived)
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[float, CachedResponse]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, namespace: str, key: Hashable) -> Optional[CachedResponse]:
+        cache_key = (namespace, key)
+        with self._lock:
+            item = self._entries.get(cache_key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, entry = item
+            if expires_at <= time.monotonic():
+                self._drop(cache_key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(cache_key)
+            self.hits += 1
+            return entry
+
+    def set(self, namespace: str, key: Hashable, entry: CachedResponse) -> None:
+        if entry.size > self.max_bytes:
+            return
+        cache_key = (namespace, key)
+        with self._lock:
+            if cache_key in self._entries:
+                self._drop(cache_key)
+            self._entries[cache_key] = (time.monotonic() + self.ttl, entry)
+            self._size += entry.size
+            while self._size > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, *namespaces: str) -> None:
+        namespaces += self.derived
+        with self._lock:
+            for cache_key in [k for k in self._entries if k[0] in namespaces]:
+                self._drop(cache_key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _drop(self, cache_key: Tuple[str, Hashable]) -> None:
+        _, entry = self._entries.pop(cache_key)
+        self._size -= entry.size
+
+
+class SingleFlight:
+    """Runs at most one ``load()`` per key at a time; callers arriving meanwhile await its result.
+
+    The load runs as its own task and callers wait on it through ``asyncio.shield``,
+    so a caller that disconnects or times out stops waiting without cancelling the
+    load for the others. Failures reach every waiter, and the next call loads afresh.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Task] = {}
+        self.loads = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def run(self, key: Hashable, load: Callable[[], Awaitable[T]]) -> T:
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(load())
+            self._flights[key] = task
+            task.add_done_callback(lambda done: self._land(key, done))
+            self.loads += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _land(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here too, in case every waiter has gone
@@ -0,0 +1,67 @@
+"""Materialized per-category counts of the portfolio.
+
+``portfolio_categories`` holds one small document per category, ``{category,
+count, featured}``, so listing the categories with their totals reads a handful
+of documents instead of scanning the portfolio. Inserts and deletes adjust the
+counts with ``$inc`` as they happen; a category whose count drops to zero is
+removed. ``rebuild_counts`` recomputes the whole summary from the portfolio in
+one aggregation whose ``$out`` replaces the collection atomically (keeping its
+indexes), for after bulk loads and as a repair.
+
+An insert or delete racing with a rebuild may be counted twice or not at all;
+the next rebuild puts that right.
+"""
+from collections import Counter
+from typing import Iterable, List, Mapping
+
+from pymongo import ASCENDING, UpdateOne
+
+SUMMARY_COLLECTION = "portfolio_categories"
+
+_PROJECTION = {"_id": 0, "category": 1, "count": 1, "featured": 1}
+
+
+def _deltas(projects: Iterable[Mapping], sign: int) -> List[UpdateOne]:
+    counts: Counter = Counter()
+    featured: Counter = Counter()
+    for project in projects:
+        counts[project["category"]] += sign
+        featured[project["category"]] += sign if project.get("featured") else 0
+    return [UpdateOne({"category": category}, {"$inc": {"count": count, "featured": featured[category]}},
+                      upsert=True)
+            for category, count in counts.items()]
+
+
+async def count_added(summary, projects: Iterable[Mapping]) -> None:
+    """Count newly inserted ``projects`` in their categories."""
+    updates = _deltas(projects, 1)
+    if updates:
+        await summary.bulk_write(updates, ordered=False)
+
+
+async def count_removed(summary, projects: Iterable[Mapping]) -> None:
+    """Uncount deleted ``projects``, dropping categories left empty."""
+    updates = _deltas(projects, -1)
+    if updates:
+        await summary.bulk_write(updates, ordered=False)
+        await summary.delete_many({"count": {"$lte": 0}})
+
+
+async def rebuild_counts(portfolio, summary_name: str = SUMMARY_COLLECTION) -> None:
+    """Replace the summary with counts recomputed from every document of ``portfolio``."""
+    pipeline = [
+        {"$group": {
+            "_id": "$category",
+            "count": {"$sum": 1},
+            "featured": {"$sum": {"$cond": [{"$eq": ["$featured", True]}, 1, 0]}},
+        }},
+        {"$project": {"_id": 0, "category": "$_id", "count": "$count", "featured": "$featured"}},
+        {"$out": summary_name},
+    ]
+    async for _ in portfolio.aggregate(pipeline):
+        pass
+
+
+async def load_counts(summary) -> List[dict]:
+    """``{category, count, featured}`` for every non-empty category, by name."""
+    return await summary.find({}, _PROJECTION).sort("category", ASCENDING).to_list(None)
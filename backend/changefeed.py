@@ -0,0 +1,227 @@
+"""Server-sent events of content changes, from one shared MongoDB change stream.
+
+``ChangeFeed`` keeps a single database-level change stream on the content
+collections and fans every change out to the connected ``/api/stream`` clients.
+Each change is encoded once as an SSE frame carrying only the changed
+document, with the change's resume token as its event id:
+
+    id: 8263F1...
+    event: change
+    data: {"collection": "portfolio", "operation": "insert", "document": {...}}
+
+The last ``buffer_size`` frames are kept, so a client reconnecting with
+``Last-Event-ID`` is sent just what it missed; if its id has already left the
+buffer it gets a ``reset`` event telling it to refetch instead. ``reset`` is
+also sent when a watched collection is dropped or replaced by a rename (the
+seed endpoint swaps in whole collections that way) and for deletes whose
+pre-image is unavailable, since those no longer say which document went away.
+
+Every client reads from its own queue of at most ``queue_size`` frames. The
+watcher never waits on a client: one that falls that far behind has its queue
+emptied and replaced by a single ``reset``. The watcher itself resumes from its
+last token after an error, so a dropped connection or failover loses nothing.
+
+Change streams need a replica set. For local development a single-node one is
+enough:
+
+    mongod --replSet rs0 --dbpath /tmp/rs0 --port 27017
+    mongosh --eval 'rs.initiate()'
+    MONGO_URL='mongodb://localhost:27017/?directConnection=true'
+
+Against a standalone server the feed logs a warning once and ``/api/stream``
+only sends heartbeats.
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import AsyncIterator, Deque, Iterable, List, Optional, Set, Tuple
+
+import orjson
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Server error codes
+NAMESPACE_NOT_FOUND = 26
+CHANGE_STREAM_HISTORY_LOST = 286
+CHANGE_STREAM_FATAL_ERROR = 280
+REPLICA_SET_REQUIRED = 40573
+
+RETRY_MILLISECONDS = 5000  # how soon browsers reconnect after losing the stream
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+def frame(event: str, data: dict, event_id: Optional[str] = None) -> bytes:
+    head = f"id: {event_id}\n" if event_id else ""
+    return f"{head}event: {event}\ndata: ".encode() + orjson.dumps(data, default=str) + b"\n\n"
+
+
+class ChangeFeed:
+    def __init__(self, database, collections: Iterable[str], buffer_size: int = 1000, queue_size: int = 100,
+                 heartbeat: float = 15.0, max_subscribers: int = 1000):
+        self.database = database
+        self.collections = tuple(collections)
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.max_subscribers = max_subscribers
+        self.resume_token: Optional[dict] = None
+        self.pre_images = False
+        self.events = 0
+        self.overflows = 0
+        self._buffer: Deque[Tuple[str, bytes]] = deque(maxlen=buffer_size)  # (event id, frame)
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._background: Set[asyncio.Task] = set()
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def last_event_id(self) -> Optional[str]:
+        return self._buffer[-1][0] if self._buffer else None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        # End the open streams rather than leave them waiting on a watcher that is gone
+        for queue in self._subscribers:
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+    async def stream(self, last_event_id: Optional[str] = None) -> AsyncIterator[bytes]:
+        """SSE frames for one client: what it missed since ``last_event_id``, then live changes."""
+        if len(self._subscribers) >= self.max_subscribers:
+            raise TooManySubscribers()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        # Subscribing and reading the backlog without yielding in between means no change is missed or repeated
+        self._subscribers.add(queue)
+        backlog = self._replay(last_event_id) if last_event_id else []
+        return self._frames(queue, backlog)
+
+    async def _frames(self, queue: asyncio.Queue, backlog: List[bytes]) -> AsyncIterator[bytes]:
+        try:
+            yield f"retry: {RETRY_MILLISECONDS}\n\n".encode()
+            for data in backlog:
+                yield data
+            while True:
+                try:
+                    data = await asyncio.wait_for(queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    data = b": ping\n\n"  # keeps proxies from closing an idle connection
+                if data is None:
+                    return
+                yield data
+        finally:
+            self._subscribers.discard(queue)
+
+    def _replay(self, last_event_id: str) -> List[bytes]:
+        for position in range(len(self._buffer) - 1, -1, -1):
+            if self._buffer[position][0] == last_event_id:
+                return [data for _, data in list(self._buffer)[position + 1:]]
+        return [frame("reset", {"collections": list(self.collections)}, self.last_event_id)]
+
+    def _publish(self, data: bytes, event_id: Optional[str] = None) -> None:
+        self.events += 1
+        if event_id is not None:
+            self._buffer.append((event_id, data))
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(data)
+            except asyncio.QueueFull:
+                # A client this far behind refetches instead of working through its backlog
+                self.overflows += 1
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(frame("reset", {"collections": list(self.collections)}, event_id))
+
+    def _frame_for(self, change: dict) -> Optional[bytes]:
+        event_id = change["_id"]["_data"]
+        operation = change["operationType"]
+        collection = change.get("ns", {}).get("coll")
+        if operation in ("insert", "update", "replace"):
+            document = change.get("fullDocument")
+            if document is None:  # deleted before the lookup; its delete event follows
+                return None
+            document.pop("_id", None)
+            return frame("change", {"collection": collection, "operation": operation, "document": document},
+                         event_id)
+        if operation == "delete":
+            before = change.get("fullDocumentBeforeChange")
+            if before is not None and "id" in before:
+                return frame("change", {"collection": collection, "operation": "delete", "id": before["id"]},
+                             event_id)
+            return frame("reset", {"collections": [collection]}, event_id)
+        if operation == "rename":
+            target = change.get("to", {}).get("coll")
+            if target in self.collections:
+                # A collection swapped in by rename starts without pre-images
+                task = asyncio.create_task(self._enable_pre_images([target]))
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+            names = [name for name in (collection, target) if name in self.collections]
+            return frame("reset", {"collections": names}, event_id)
+        if operation == "drop":
+            return frame("reset", {"collections": [collection]}, event_id)
+        # dropDatabase, invalidate
+        return frame("reset", {"collections": list(self.collections)}, event_id)
+
+    async def _enable_pre_images(self, names: Iterable[str]) -> None:
+        """Record pre-images (MongoDB 6.0+) so deletes can say which document they removed."""
+        for name in names:
+            try:
+                await self.database.command("collMod", name, changeStreamPreAndPostImages={"enabled": True})
+                self.pre_images = True
+            except OperationFailure as exc:
+                if exc.code != NAMESPACE_NOT_FOUND:
+                    return  # an older server; deletes are sent as resets
+            except PyMongoError:
+                logger.exception("Failed to enable change stream pre-images for %s", name)
+
+    async def _watch(self) -> None:
+        pipeline = [{"$match": {"$or": [
+            {"ns.coll": {"$in": list(self.collections)}},
+            {"to.coll": {"$in": list(self.collections)}},
+            {"operationType": {"$in": ["dropDatabase", "invalidate"]}},
+        ]}}]
+        await self._enable_pre_images(self.collections)
+        backoff = 1.0
+        while True:
+            try:
+                async with self.database.watch(
+                    pipeline, full_document="updateLookup", resume_after=self.resume_token,
+                    full_document_before_change="whenAvailable" if self.pre_images else None,
+                ) as stream:
+                    backoff = 1.0
+                    async for change in stream:
+                        data = self._frame_for(change)
+                        if change["operationType"] == "invalidate":
+                            self.resume_token = None  # an invalidated stream cannot be resumed
+                        else:
+                            self.resume_token = change["_id"]
+                        if data is not None:
+                            self._publish(data, change["_id"]["_data"])
+                continue
+            except OperationFailure as exc:
+                if exc.code == REPLICA_SET_REQUIRED:
+                    logger.warning("Change streams need a replica set; /api/stream will only send heartbeats")
+                    return
+                if exc.code in (CHANGE_STREAM_HISTORY_LOST, CHANGE_STREAM_FATAL_ERROR):
+                    # The oplog no longer reaches our token: start over and have everyone refetch
+                    logger.warning("Change stream cannot resume (%s); resetting clients", exc)
+                    self.resume_token = None
+                    self._publish(frame("reset", {"collections": list(self.collections)}))
+                    continue
+                logger.exception("Change stream failed, retrying in %.1fs", backoff)
+            except PyMongoError:
+                logger.exception("Change stream failed, retrying in %.1fs", backoff)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
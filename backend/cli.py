@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""Command-line maintenance tasks for the studio backend.
+
+Reads MONGO_URL and DB_NAME from the environment (or backend/.env) like the API:
+
+    python cli.py generate --portfolio 1000000 --testimonials 200000 --contacts 2000000
+    python cli.py export --format csv --since 2024-01-01 --output contacts.csv
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import typer
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from categories import rebuild_counts
+from export import MEDIA_TYPES, export_chunks, iter_submissions, resume_point
+from indexes import ensure_indexes
+from versions import CollectionVersions
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+cli = typer.Typer(help="Контраст Граффити Студия backend tools", no_args_is_help=True)
+
+
+@cli.callback()
+def main():
+    """Run one of the commands below against MONGO_URL/DB_NAME."""
+
+
+def connect():
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    return client, client[os.environ['DB_NAME']]
+
+
+# Synthetic content
+CATEGORIES = ["murals", "portraits", "commercial", "abstract", "automotive"]
+CATEGORY_WEIGHTS = [35, 15, 25, 15, 10]
+PLACES = ["в переходе", "на фасаде", "в кафе", "в офисе", "во дворе", "на заборе", "в детском центре",
+          "в спортзале", "в барбершопе", "на гараже", "в лофте", "на трансформаторной будке"]
+SUBJECTS = ["Граффити", "Мурал", "Стрит-арт композиция", "Портрет", "Абстракция", "Оформление",
+            "Роспись", "Шрифтовая работа", "Персонаж", "Логотип"]
+DESCRIPTIONS = [
+    "Яркая работа с насыщенными цветами и плавными переходами.",
+    "Детализированная прорисовка с элементами фотореализма.",
+    "Геометрическая композиция в фирменных цветах заказчика.",
+    "Крупноформатная роспись, выполненная за два дня.",
+    "Работа в технике wildstyle с объёмными буквами.",
+    "Лаконичный дизайн, подчёркивающий архитектуру здания.",
+    "Оформление с учётом освещения и угла обзора с улицы.",
+]
+IMAGES = [
+    "https://images.unsplash.com/photo-1487452066049-a710f7296400?fm=jpg&q=85",
+    "https://images.unsplash.com/photo-1604716053460-3f66248bf8de?fm=jpg&q=85",
+    "https://images.unsplash.com/photo-1581850518616-bcb8077a2336?fm=jpg&q=85",
+    "https://images.pexels.com/photos/1227511/pexels-photo-1227511.jpeg",
+    "https://images.unsplash.com/photo-1530406831759-15c5c0cbce8b?fm=jpg&q=85",
+    "https://images.unsplash.com/photo-1583225238311-0278ade1070d?fm=jpg&q=85",
+]
+FIRST_NAMES = ["Анна", "Дмитрий", "Елена", "Игорь", "Мария", "Сергей", "Ольга", "Алексей", "Наталья", "Павел"]
+LAST_NAMES = ["Иванова", "Петров", "Смирнова", "Кузнецов", "Попова", "Волков", "Соколова", "Морозов"]
+ROLES = ["Владелец кафе", "Директор по маркетингу", "Частный клиент", "Управляющий ТЦ", "Арт-директор",
+         "Владелец автосервиса", "Администратор школы"]
+REVIEWS = [
+    "Сделали всё быстро и аккуратно, результат превзошёл ожидания.",
+    "Отличная команда, учли все пожелания по цветам и стилю.",
+    "Посетители постоянно фотографируются у новой стены.",
+    "Хорошая работа, но сроки немного сдвинулись.",
+    "Рекомендую, профессиональный подход на каждом этапе.",
+]
+REQUESTS = [
+    "Хотим оформить стену кафе, площадь около {area} м². Перезвоните, пожалуйста.",
+    "Интересует роспись фасада, примерно {area} м². Сколько будет стоить?",
+    "Нужно граффити в детской комнате, около {area} м².",
+    "Подскажите сроки для оформления офиса, {area} м².",
+]
+
+
+GENERATED_UNTIL = datetime(2025, 1, 1)
+
+
+def make_id(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def make_created_at(rng: random.Random, now: datetime, days: int) -> datetime:
+    # Millisecond precision, which is what Mongo stores
+    return now - timedelta(milliseconds=rng.randrange(days * 86_400_000))
+
+
+def make_project(rng: random.Random, now: datetime, days: int) -> dict:
+    return {
+        "id": make_id(rng),
+        "title": f"{rng.choice(SUBJECTS)} {rng.choice(PLACES)}",
+        "category": rng.choices(CATEGORIES, CATEGORY_WEIGHTS)[0],
+        "image": rng.choice(IMAGES),
+        "variants": None,
+        "description": " ".join(rng.sample(DESCRIPTIONS, rng.randint(1, 3))),
+        "featured": rng.random() < 0.05,
+        "created_at": make_created_at(rng, now, days),
+    }
+
+
+def make_testimonial(rng: random.Random, now: datetime, days: int) -> dict:
+    return {
+        "id": make_id(rng),
+        "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)[0]}.",
+        "role": rng.choice(ROLES),
+        "text": " ".join(rng.sample(REVIEWS, rng.randint(1, 2))),
+        "rating": rng.choices([3, 4, 5], [5, 25, 70])[0],
+        "approved": rng.random() < 0.9,
+        "created_at": make_created_at(rng, now, days),
+    }
+
+
+def make_contact(rng: random.Random, now: datetime, days: int) -> dict:
+    number = rng.randrange(10_000_000)
+    return {
+        "id": make_id(rng),
+        "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        "phone": f"+7 9{rng.randrange(100):02d} {number:07d}",
+        "email": f"client{number}@example.ru",
+        "message": rng.choice(REQUESTS).format(area=rng.randint(5, 300)),
+        "status": rng.choices(["new", "processed"], [20, 80])[0],
+        "created_at": make_created_at(rng, now, days),
+    }
+
+
+GENERATORS: Dict[str, Callable[[random.Random, datetime, int], dict]] = {
+    "portfolio": make_project,
+    "testimonials": make_testimonial,
+    "contact_submissions": make_contact,
+}
+
+
+async def load_collection(collection, make: Callable, count: int, seed: int, now: datetime, days: int,
+                          chunk_size: int, in_flight: int, progress: Dict[str, int]) -> None:
+    """Insert ``count`` generated documents in unordered chunks, ``in_flight`` chunks at a time.
+
+    Each chunk draws from its own generator seeded by (seed, collection, chunk),
+    so the data set is the same however the inserts interleave.
+    """
+    chunks = iter(range(0, count, chunk_size))
+
+    async def worker():
+        for start in chunks:
+            rng = random.Random(f"{seed}:{collection.name}:{start}")
+            documents = [make(rng, now, days) for _ in range(min(chunk_size, count - start))]
+            await collection.insert_many(documents, ordered=False)
+            progress[collection.name] += len(documents)
+
+    await asyncio.gather(*(worker() for _ in range(in_flight)))
+
+
+async def report_progress(progress: Dict[str, int], totals: Dict[str, int], interval: float) -> None:
+    started = time.perf_counter()
+    while True:
+        await asyncio.sleep(interval)
+        elapsed = time.perf_counter() - started
+        done = sum(progress.values())
+        parts = [f"{name} {progress[name]:,}/{totals[name]:,}" for name in totals]
+        typer.echo(f"[{elapsed:7.1f}s] {' | '.join(parts)} | {done / elapsed:,.0f} docs/s")
+
+
+async def generate_data(counts: Dict[str, int], seed: int, days: int, chunk_size: int, in_flight: int,
+                        drop: bool, interval: float) -> None:
+    client, db = connect()
+    totals = {name: count for name, count in counts.items() if count > 0}
+    progress = {name: 0 for name in totals}
+    # Generated timestamps count back from a fixed instant, so equal seeds give equal documents
+    now = GENERATED_UNTIL
+    try:
+        if drop:
+            for name in totals:
+                await db.drop_collection(name)
+        reporter = asyncio.create_task(report_progress(progress, totals, interval))
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(
+                load_collection(db[name], GENERATORS[name], count, seed, now, days, chunk_size, in_flight, progress)
+                for name, count in totals.items()
+            ))
+        finally:
+            reporter.cancel()
+        elapsed = time.perf_counter() - started
+        for name, count in totals.items():
+            typer.echo(f"{name}: {count:,} documents")
+        typer.echo(f"Inserted {sum(totals.values()):,} documents in {elapsed:.1f}s "
+                   f"({sum(totals.values()) / elapsed:,.0f} docs/s)")
+
+        # Building indexes once over the loaded data is cheaper than maintaining them per insert
+        started = time.perf_counter()
+        await ensure_indexes(db)
+        typer.echo(f"Indexes ready in {time.perf_counter() - started:.1f}s")
+        if "portfolio" in totals:
+            await rebuild_counts(db.portfolio)
+        # New ETags, so running servers drop their cached responses and clients refetch
+        await CollectionVersions(db.collection_versions).bump(*totals)
+    finally:
+        client.close()
+
+
+@cli.command()
+def generate(
+    portfolio: int = typer.Option(100_000, min=0, help="Portfolio projects to generate"),
+    testimonials: int = typer.Option(10_000, min=0, help="Testimonials to generate"),
+    contacts: int = typer.Option(100_000, min=0, help="Contact submissions to generate"),
+    seed: int = typer.Option(42, help="Same seed, same documents"),
+    days: int = typer.Option(3 * 365, min=1, help="Spread created_at over this many days"),
+    chunk_size: int = typer.Option(5_000, min=1, help="Documents per insert_many"),
+    in_flight: int = typer.Option(4, min=1, help="Concurrent insert_many calls per collection"),
+    drop: bool = typer.Option(False, "--drop", help="Drop the target collections first"),
+    interval: float = typer.Option(2.0, min=0.1, help="Seconds between progress lines"),
+):
+    """Bulk-load synthetic portfolio projects, testimonials and contact submissions."""
+    counts = {"portfolio": portfolio, "testimonials": testimonials, "contact_submissions": contacts}
+    asyncio.run(generate_data(counts, seed, days, chunk_size, in_flight, drop, interval))
+
+
+async def export_submissions(fmt: str, since: Optional[datetime], until: Optional[datetime], status: Optional[str],
+                             after: Optional[str], output: Optional[Path]) -> None:
+    client, db = connect()
+    last_id = after
+    try:
+        resume = None
+        if after:
+            resume = await resume_point(db.contact_submissions, after)
+            if resume is None:
+                raise typer.BadParameter(f"No contact submission with id {after}", param_hint="--after")
+        documents = iter_submissions(db.contact_submissions, since, until, status, resume)
+        # A resumed export is appended to the file of the one it continues
+        out = open(output, "ab" if after else "wb") if output else nullcontext(sys.stdout.buffer)
+        try:
+            with out as stream:
+                async for chunk, chunk_last_id in export_chunks(documents, fmt, header=not (after and output)):
+                    stream.write(chunk)
+                    last_id = chunk_last_id or last_id
+        except BaseException:
+            if last_id:
+                typer.echo(f"Export interrupted; resume with --after {last_id}", err=True)
+            raise
+    finally:
+        client.close()
+    typer.echo(f"Exported up to submission {last_id}" if last_id else "Nothing to export", err=True)
+
+
+@cli.command()
+def export(
+    fmt: str = typer.Option("ndjson", "--format", help="ndjson or csv"),
+    since: Optional[datetime] = typer.Option(None, help="Created at or after (UTC)"),
+    until: Optional[datetime] = typer.Option(None, help="Created before (UTC)"),
+    status: Optional[str] = typer.Option(None, help="Only submissions with this status"),
+    after: Optional[str] = typer.Option(None, help="Resume after this submission id"),
+    output: Optional[Path] = typer.Option(None, "--output", "-o", help="File to write instead of stdout"),
+):
+    """Stream contact submissions, oldest first, as NDJSON or CSV."""
+    if fmt not in MEDIA_TYPES:
+        raise typer.BadParameter("must be ndjson or csv", param_hint="--format")
+    asyncio.run(export_submissions(fmt, since, until, status, after, output))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,104 @@
+"""Content-encoding negotiation and one-off compression of cached bodies.
+
+Cached responses are compressed once, when they are built, and the encoded
+bytes are reused for every request that accepts them. That still happens on a
+cache miss, so by default the levels are moderate; ``strong`` settings, far
+slower for a few percent less, are for the handful of long-lived bodies such as
+the landing page. Brotli is used when the ``brotli`` package is installed; gzip always is.
+"""
+import gzip
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from starlette.middleware.gzip import GZipMiddleware
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+# encoding -> (default level, strong level)
+GZIP_LEVELS = (6, 9)
+BROTLI_QUALITIES = (5, 11)
+
+# Preferred first when a client accepts several equally
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def compress(body: bytes, encoding: str, strong: bool = False) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITIES[strong])
+    if encoding == "gzip":
+        # mtime=0 keeps the output, and so any ETag derived from it, stable
+        return gzip.compress(body, compresslevel=GZIP_LEVELS[strong], mtime=0)
+    raise ValueError(f"Unsupported encoding {encoding}")
+
+
+def compress_all(body: bytes, min_size: int, strong: bool = False) -> Dict[str, bytes]:
+    """Every supported encoding of ``body`` that is actually smaller; nothing for bodies under ``min_size``."""
+    if len(body) < min_size:
+        return {}
+    encoded = {encoding: compress(body, encoding, strong) for encoding in ENCODINGS}
+    return {encoding: data for encoding, data in encoded.items() if len(data) < len(body)}
+
+
+def negotiate(accept_encoding: Optional[str], available: Iterable[str]) -> Optional[str]:
+    """The available encoding the ``Accept-Encoding`` header ranks highest, or None for identity."""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+    best, best_weight = None, 0.0
+    for encoding in available:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+class SelectiveGZipMiddleware:
+    """``GZipMiddleware`` for every request except paths starting with one of ``excluded``.
+
+    For responses it must not touch: event streams, which its compressor would
+    buffer, and images, which are compressed already and served in ranges. A
+    strong ETag on a body it encodes gets the ``-gzip`` suffix, like the ETags
+    of precompressed responses, as the bytes differ from the identity body's.
+    """
+
+    def __init__(self, app, minimum_size: int = 500, excluded: Iterable[str] = ()):
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size)
+        self.excluded = tuple(excluded)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.excluded):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_etag(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = gzip_etag(message["headers"])
+            await send(message)
+
+        await self.gzip(scope, receive, send_with_etag)
+
+
+def gzip_etag(headers: List[Tuple[bytes, bytes]]) -> List[Tuple[bytes, bytes]]:
+    """``headers`` with a strong ETag suffixed ``-gzip`` if the body is gzip-encoded and it has no suffix yet."""
+    if (b"content-encoding", b"gzip") not in ((name.lower(), value) for name, value in headers):
+        return headers
+    tagged = []
+    for name, value in headers:
+        if (name.lower() == b"etag" and value.startswith(b'"') and value.endswith(b'"')
+                and not value.endswith(b'-gzip"')):
+            value = value[:-1] + b'-gzip"'
+        tagged.append((name, value))
+    return tagged
@@ -0,0 +1,112 @@
+"""Streaming export of contact submissions as NDJSON or CSV.
+
+Submissions are read oldest first, ordered by ``(created_at, id)``, from a
+Motor cursor that fetches ``batch_size`` documents at a time, and encoded into
+chunks of about ``chunk_bytes`` as they arrive. Nothing but the current batch
+and chunk is held in memory, whatever the size of the collection. An export
+that was cut off is resumed with the id of the last row received: the next run
+starts right after that row's ``(created_at, id)``.
+
+Used by the admin ``GET /api/contact/export`` endpoint and ``cli.py export``.
+"""
+import csv
+import io
+import re
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional, Tuple
+
+import orjson
+from pymongo import ASCENDING
+
+EXPORT_FIELDS = ("id", "created_at", "status", "name", "phone", "email", "message")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+EXPORT_SORT = [("created_at", ASCENDING), ("id", ASCENDING)]
+_PROJECTION = {"_id": 0, **{field: 1 for field in EXPORT_FIELDS}}
+
+# Cells a spreadsheet would evaluate as a formula; "+7 900 ..." phone numbers are left alone
+_FORMULA_RE = re.compile(r"^(?:[=@\t\r]|[+-](?![\d\s()-]*$))")
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Submissions store naive UTC times; an aware bound is converted to match."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+async def resume_point(collection, after_id: str) -> Optional[Tuple[datetime, str]]:
+    """Sort key of submission ``after_id``, or None if there is no such submission."""
+    document = await collection.find_one({"id": after_id}, {"_id": 0, "created_at": 1, "id": 1})
+    return (document["created_at"], document["id"]) if document else None
+
+
+async def iter_submissions(collection, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                           status: Optional[str] = None, after: Optional[Tuple[datetime, str]] = None,
+                           batch_size: int = 1000) -> AsyncIterator[dict]:
+    """Submissions created in ``[since, until)`` with ``status``, after sort key ``after``, oldest first."""
+    query: dict = {}
+    created_at = {}
+    if since is not None:
+        created_at["$gte"] = naive_utc(since)
+    if until is not None:
+        created_at["$lt"] = naive_utc(until)
+    if created_at:
+        query["created_at"] = created_at
+    if status is not None:
+        query["status"] = status
+    if after is not None:
+        query["$or"] = [
+            {"created_at": {"$gt": after[0]}},
+            {"created_at": after[0], "id": {"$gt": after[1]}},
+        ]
+    cursor = collection.find(query, _PROJECTION).sort(EXPORT_SORT).batch_size(batch_size)
+    async for document in cursor:
+        yield document
+
+
+def _csv_cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    text = str(value)
+    return "'" + text if _FORMULA_RE.match(text) else text
+
+
+async def export_chunks(documents: AsyncIterator[dict], fmt: str, header: bool = True,
+                        chunk_bytes: int = 64 * 1024) -> AsyncIterator[Tuple[bytes, Optional[str]]]:
+    """Encoded ``(chunk, id of its last row)`` pairs; a chunk only ever holds whole rows.
+
+    ``header=False`` leaves out the CSV header line, for appending to an earlier export.
+    """
+    if fmt not in MEDIA_TYPES:
+        raise ValueError(f"Unsupported export format {fmt}")
+    last_id = None
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if header:
+            writer.writerow(EXPORT_FIELDS)
+        async for document in documents:
+            writer.writerow([_csv_cell(document.get(field)) for field in EXPORT_FIELDS])
+            last_id = document.get("id")
+            if buffer.tell() >= chunk_bytes:
+                yield buffer.getvalue().encode("utf-8"), last_id
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8"), last_id
+        return
+    lines = []
+    size = 0
+    async for document in documents:
+        line = orjson.dumps(document, default=str) + b"\n"
+        lines.append(line)
+        size += len(line)
+        last_id = document.get("id")
+        if size >= chunk_bytes:
+            yield b"".join(lines), last_id
+            lines, size = [], 0
+    if lines:
+        yield b"".join(lines), last_id
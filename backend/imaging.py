@@ -0,0 +1,86 @@
+"""Responsive image derivatives rendered on a process pool.
+
+Decoding and re-encoding a photo takes tens to hundreds of milliseconds of pure
+CPU, so it never runs on the event loop: ``render_variants`` executes in worker
+processes, reads the original straight from the blob store and writes each
+derivative back into it, so only digests cross the process boundary.
+"""
+import asyncio
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+from PIL import Image, ImageOps
+
+from blobstore import BlobStore
+
+VARIANT_WIDTHS = (320, 800, 1600)
+
+# format name -> (Pillow encoder, save options)
+VARIANT_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def render_variants(store_root: str, digest: str, widths: Sequence[int] = VARIANT_WIDTHS) -> Dict[str, Dict[str, str]]:
+    """Resize blob ``digest`` to each width in every format; returns ``{format: {width: digest}}``.
+
+    Widths larger than the original are skipped (a single variant at the
+    original width is produced if all of them are), so images are never upscaled.
+    """
+    store = BlobStore(Path(store_root))
+    with Image.open(store.path_for(digest)) as original:
+        # Let the JPEG decoder downscale by a power of two while decoding
+        original.draft("RGB", (max(widths), max(widths)))
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        targets = sorted({w for w in widths if w < image.width} or {image.width}, reverse=True)
+
+        variants: Dict[str, Dict[str, str]] = {name: {} for name in VARIANT_FORMATS}
+        for width in targets:
+            height = max(1, round(image.height * width / image.width))
+            # Each step resizes the previous (larger) one, which is much cheaper than from the original
+            image = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+            for name, (encoder, options) in VARIANT_FORMATS.items():
+                frame = image.convert("RGB") if encoder == "JPEG" and image.mode != "RGB" else image
+                buffer = io.BytesIO()
+                frame.save(buffer, encoder, **options)
+                variants[name][str(width)] = store.put(buffer.getvalue())
+    return variants
+
+
+class DerivativePipeline:
+    def __init__(self, store: BlobStore, max_workers: Optional[int] = None):
+        self.store = store
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    async def render(self, digest: str) -> Dict[str, Dict[str, str]]:
+        """Render ``digest``'s variants, retrying once on a fresh pool if a worker died (e.g. OOM-killed)."""
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            executor = self._pool()
+            try:
+                return await loop.run_in_executor(executor, render_variants, str(self.store.root), digest)
+            except BrokenProcessPool:
+                # A broken pool refuses all further work; the next call starts a new one
+                if self._executor is executor:
+                    self.shutdown()
+                if attempt:
+                    raise
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a process that runs Motor's threads can inherit held locks
+            self._executor = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,139 @@
+"""Declarative MongoDB index registry, applied idempotently at startup.
+
+``INDEXES`` lists every index the application relies on and ``QUERY_SHAPES``
+every filter/sort combination the API issues. On startup the indexes are
+created (a no-op when they already exist) and any query shape no index can
+serve is logged, so a new query without an index shows up before it is slow.
+"""
+import logging
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+
+def _unique_id() -> IndexModel:
+    return IndexModel([("id", ASCENDING)], unique=True)
+
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "portfolio": [
+        _unique_id(),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("category", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("featured", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+    ],
+    "services": [
+        _unique_id(),
+        IndexModel([("active", ASCENDING), ("order", ASCENDING)]),
+    ],
+    "faqs": [
+        _unique_id(),
+        IndexModel([("active", ASCENDING), ("order", ASCENDING)]),
+    ],
+    "process_steps": [
+        _unique_id(),
+        IndexModel([("active", ASCENDING), ("step", ASCENDING)]),
+    ],
+    "testimonials": [
+        _unique_id(),
+        IndexModel([("approved", ASCENDING)]),
+    ],
+    "contact_submissions": [
+        _unique_id(),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)]),
+    ],
+    "portfolio_categories": [
+        IndexModel([("category", ASCENDING)], unique=True),
+    ],
+    "pricing_rules": [
+        IndexModel([("revision", ASCENDING)], unique=True),
+    ],
+    "collection_versions": [
+        IndexModel([("collection", ASCENDING)], unique=True),
+    ],
+    "notification_outbox": [
+        _unique_id(),
+        IndexModel([("channel", ASCENDING), ("status", ASCENDING), ("next_attempt_at", ASCENDING)]),
+        IndexModel([("lease", ASCENDING)], sparse=True),
+    ],
+}
+
+
+class QueryShape(NamedTuple):
+    collection: str
+    equality: Tuple[str, ...] = ()  # fields matched by value
+    sort: Tuple[Tuple[str, int], ...] = ()  # sort (or distinct) keys, in order
+    description: str = ""
+
+
+QUERY_SHAPES: List[QueryShape] = [
+    QueryShape("portfolio", (), (("created_at", DESCENDING), ("id", DESCENDING)), "portfolio page"),
+    QueryShape("portfolio", ("category",), (("created_at", DESCENDING), ("id", DESCENDING)), "portfolio page by category"),
+    QueryShape("portfolio", ("featured",), (("created_at", DESCENDING), ("id", DESCENDING)), "featured portfolio page"),
+    QueryShape("portfolio", ("id",), (), "portfolio project by id"),
+    QueryShape("portfolio_categories", (), (("category", ASCENDING),), "category counts"),
+    QueryShape("services", ("active",), (("order", ASCENDING),), "active services"),
+    QueryShape("faqs", ("active",), (("order", ASCENDING),), "active FAQs"),
+    QueryShape("process_steps", ("active",), (("step", ASCENDING),), "active process steps"),
+    QueryShape("testimonials", ("approved",), (), "approved testimonials"),
+    QueryShape("contact_submissions", (), (("created_at", ASCENDING), ("id", ASCENDING)), "contact export"),
+    QueryShape("contact_submissions", ("status",), (("created_at", ASCENDING), ("id", ASCENDING)),
+               "contact export by status"),
+    QueryShape("contact_submissions", ("id",), (), "contact export resume point"),
+    QueryShape("pricing_rules", (), (("revision", DESCENDING),), "latest pricing rules"),
+    QueryShape("collection_versions", ("collection",), (), "collection version bump"),
+    QueryShape("notification_outbox", ("channel", "status"), (("next_attempt_at", ASCENDING),), "due notifications"),
+    QueryShape("notification_outbox", ("lease",), (), "claimed notifications"),
+]
+
+
+def index_serves(keys: List[Tuple[str, int]], shape: QueryShape) -> bool:
+    """True when an index with ``keys`` can answer ``shape`` without a collection scan or in-memory sort.
+
+    The equality fields must form the index prefix (in any order), followed by
+    the sort keys in order, all in the index direction or all reversed.
+    """
+    if not shape.equality and not shape.sort:
+        return False
+    prefix = keys[:len(shape.equality)]
+    if {field for field, _ in prefix} != set(shape.equality):
+        return False
+    tail = keys[len(shape.equality):len(shape.equality) + len(shape.sort)]
+    if [field for field, _ in tail] != [field for field, _ in shape.sort]:
+        return False
+    directions = {index_dir == sort_dir for (_, index_dir), (_, sort_dir) in zip(tail, shape.sort)}
+    return len(directions) <= 1
+
+
+def uncovered_shapes(registry: Dict[str, List[IndexModel]] = INDEXES,
+                     shapes: Iterable[QueryShape] = QUERY_SHAPES) -> List[QueryShape]:
+    uncovered = []
+    for shape in shapes:
+        candidates = [list(model.document["key"].items()) for model in registry.get(shape.collection, [])]
+        if not any(index_serves(keys, shape) for keys in candidates):
+            uncovered.append(shape)
+    return uncovered
+
+
+async def create_collection_indexes(collection, name: Optional[str] = None) -> None:
+    """Create the registered indexes of collection ``name`` (default: its own name) on ``collection``."""
+    models = INDEXES.get(name or collection.name)
+    if not models:
+        return
+    try:
+        await collection.create_indexes(models)
+    except OperationFailure as exc:
+        # Duplicate ids or a same-named index with other options; serve anyway and let the log say why
+        logger.error("Could not create indexes on %s: %s", collection.name, exc)
+
+
+async def ensure_indexes(db) -> None:
+    for name in INDEXES:
+        await create_collection_indexes(db[name])
+    for shape in uncovered_shapes():
+        logger.warning("No index serves %s query on %s (equality=%s, sort=%s); it will scan the collection",
+                       shape.description or "a", shape.collection, list(shape.equality), list(shape.sort))
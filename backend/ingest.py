@@ -0,0 +1,210 @@
+"""Write-behind queue with a local append-only journal.
+
+Requests hand a document to ``WriteBehindQueue.put`` and are acknowledged as
+soon as it is appended to the journal; a background task hands buffered
+documents to ``flush`` in batches bounded by size and delay. The journal is
+split into segments: each flush rotates to a fresh segment and deletes the old
+one only after its documents were written, so a crash between acknowledgement
+and flush loses nothing -- leftover segments are replayed by ``start``.
+
+Several processes (uvicorn workers) may share one journal directory. Each
+queue writes its own segments, ``{name}.{writer}.{sequence}.jsonl``, and holds
+an exclusive ``flock`` on ``{name}.{writer}.lock`` while it runs. ``start``
+only takes over the segments of writers whose lock is free -- processes that
+are gone -- and claims each one by renaming it into its own namespace, so a
+segment is replayed by exactly one process and never while its writer is alive.
+
+``flush`` must be idempotent (e.g. ``insert_many`` over a unique index with
+duplicate-key errors ignored), since a replay may repeat a batch that was
+written just before a crash.
+"""
+import asyncio
+import fcntl
+import logging
+import os
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional, Sequence, Tuple
+
+import orjson
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised by ``put`` when too many documents are waiting for the database."""
+
+
+class WriteBehindQueue:
+    def __init__(
+        self,
+        flush: Callable[[List[dict]], Awaitable[None]],
+        journal_dir: Path,
+        name: str = "queue",
+        max_batch: int = 500,
+        max_delay: float = 0.25,
+        max_pending: int = 100_000,
+        fsync: bool = False,
+        datetime_fields: Sequence[str] = ("created_at",),
+    ):
+        self.flush = flush
+        self.journal_dir = Path(journal_dir)
+        self.name = name
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.fsync = fsync
+        self.datetime_fields = tuple(datetime_fields)
+        self._buffer: List[dict] = []
+        # Rotated segments whose documents are not in the database yet
+        self._unflushed: List[Tuple[Path, List[dict]]] = []
+        self._fd: Optional[int] = None
+        self._segment: Optional[Path] = None
+        self._sequence = 0
+        self.writer = uuid.uuid4().hex[:12]
+        self._lock_fd: Optional[int] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.accepted = 0
+        self.flushed = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer) + sum(len(docs) for _, docs in self._unflushed)
+
+    @property
+    def _lock_path(self) -> Path:
+        return self.journal_dir / f"{self.name}.{self.writer}.lock"
+
+    async def start(self) -> None:
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        self._lock_fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        for segment in self._orphaned_segments():
+            claimed = self._next_segment()
+            try:
+                os.rename(segment, claimed)
+            except FileNotFoundError:
+                continue  # another process claimed it first
+            documents = self._read_segment(claimed)
+            if documents:
+                logger.info("Replaying %d journaled %s documents from %s", len(documents), self.name, segment.name)
+            self._unflushed.append((claimed, documents))
+        self._open_segment()
+        self._task = asyncio.create_task(self._run())
+        if self._unflushed:
+            self._wakeup.set()
+
+    async def put(self, document: dict) -> None:
+        """Journal ``document`` and buffer it for the next batch."""
+        if self.pending >= self.max_pending:
+            raise QueueFull(f"{self.name}: {self.pending} documents waiting for the database")
+        # os.write on an O_APPEND fd reaches the kernel before we acknowledge, so it survives a process crash
+        os.write(self._fd, orjson.dumps(document, option=orjson.OPT_APPEND_NEWLINE))
+        self._buffer.append(document)
+        self.accepted += 1
+        if len(self._buffer) >= self.max_batch:
+            self._wakeup.set()
+        elif len(self._buffer) == 1:
+            asyncio.get_running_loop().call_later(self.max_delay, self._wakeup.set)
+        if self.fsync:
+            # Also survive power loss; concurrent callers share the disk flush
+            await run_in_threadpool(os.fsync, self._fd)
+
+    async def stop(self) -> None:
+        """Flush everything buffered, then close the journal."""
+        self._stopping = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        if self._segment is not None and not self._unflushed and self._segment.stat().st_size == 0:
+            self._segment.unlink()
+            self._lock_path.unlink(missing_ok=True)
+        if self._lock_fd is not None:
+            # Anything still journaled is left for the next process to claim
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def _orphaned_segments(self) -> List[Path]:
+        """Segments whose writer no longer holds its lock, oldest first per writer."""
+        orphaned = []
+        for lock_path in self.journal_dir.glob(f"{self.name}.*.lock"):
+            writer = lock_path.name[len(self.name) + 1:-len(".lock")]
+            if writer == self.writer:
+                continue
+            try:
+                fd = os.open(lock_path, os.O_RDWR)
+            except FileNotFoundError:
+                continue
+            try:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # a live process
+                orphaned.extend(sorted(self.journal_dir.glob(f"{self.name}.{writer}.*.jsonl")))
+                # Its segments are claimed by rename below, so the lock file has nothing left to guard
+                lock_path.unlink(missing_ok=True)
+            finally:
+                os.close(fd)
+        # Segments of the single-process journal layout, from before writers had ids
+        orphaned.extend(sorted(self.journal_dir.glob(f"{self.name}-*.jsonl")))
+        return orphaned
+    async def _run(self) -> None:
+        backoff = self.max_delay
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if self._buffer:
+                self._unflushed.append((self._segment, self._buffer))
+                self._buffer = []
+                os.close(self._fd)
+                self._open_segment()
+            try:
+                while self._unflushed:
+                    segment, documents = self._unflushed[0]
+                    for start in range(0, len(documents), self.max_batch):
+                        await self.flush(documents[start:start + self.max_batch])
+                    self.flushed += len(documents)
+                    self._unflushed.pop(0)
+                    segment.unlink(missing_ok=True)
+                backoff = self.max_delay
+            except Exception:
+                if self._stopping:
+                    logger.exception("%s: giving up on %d documents; they stay journaled", self.name, self.pending)
+                    return
+                logger.exception("%s: flush failed, retrying in %.1fs", self.name, backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                self._wakeup.set()
+                continue
+            if self._stopping and not self._buffer:
+                return
+
+    def _next_segment(self) -> Path:
+        self._sequence += 1
+        return self.journal_dir / f"{self.name}.{self.writer}.{self._sequence:012d}.jsonl"
+
+    def _open_segment(self) -> None:
+        self._segment = self._next_segment()
+        self._fd = os.open(self._segment, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+
+    def _read_segment(self, segment: Path) -> List[dict]:
+        documents = []
+        with open(segment, "rb") as fh:
+            for line in fh:
+                try:
+                    document = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    # A torn final line from a crash mid-write was never acknowledged
+                    continue
+                for field in self.datetime_fields:
+                    if isinstance(document.get(field), str):
+                        document[field] = datetime.fromisoformat(document[field])
+                documents.append(document)
+        return documents
@@ -0,0 +1,267 @@
+"""Request, MongoDB command and connection pool metrics in Prometheus text format.
+
+``MetricsMiddleware`` times every request by route template and status code.
+``CommandMetrics`` is a pymongo ``CommandListener`` that attributes database
+time to each command and collection, and ``PoolMetrics`` a
+``ConnectionPoolListener`` that measures how long operations wait to check a
+connection out of the pool. Both listeners are called from the threads Motor
+runs pymongo on, so everything recorded here is guarded by a lock; an
+observation costs a bisect and two increments.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Seconds; from sub-millisecond cache hits to multi-second slow queries
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(key, list(counts), total[0]) for key, (counts, total) in sorted(self._series.items())]
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total!r}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in values)
+        return lines
+
+
+class Gauge:
+    """A value read when the metrics are rendered: ``read()`` returns a number or ``{labels: number}``."""
+
+    def __init__(self, name: str, help: str, read: Callable[[], object], kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        value = self.read()
+        if isinstance(value, dict):
+            for labels, item in sorted(value.items()):
+                lines.append(f"{self.name}{_format_labels(labels)} {_format_value(item)}")
+        else:
+            lines.append(f"{self.name} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, buckets))
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._register(Counter(name, help))
+
+    def gauge(self, name: str, help: str, read: Callable[[], object], kind: str = "gauge") -> Gauge:
+        return self._register(Gauge(name, help, read, kind))
+
+    def render(self) -> bytes:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return ("\n".join(lines) + "\n").encode()
+
+    def _register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            # Registering the same histogram or counter again (e.g. a rebuilt middleware stack) shares it
+            if type(existing) is not type(metric) or isinstance(metric, Gauge):
+                raise ValueError(f"Metric {metric.name} is already registered")
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing each request until its last body chunk is sent.
+
+    Requests are labelled with the route template (``/api/images/{digest}``),
+    not the raw path, so the number of series stays bounded.
+    """
+
+    def __init__(self, app, registry: MetricsRegistry):
+        self.app = app
+        self.latency = registry.histogram("http_request_duration_seconds", "HTTP request latency by route and status.")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            self.latency.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status),
+            )
+
+
+class CommandMetrics(monitoring.CommandListener):
+    def __init__(self, registry: MetricsRegistry):
+        self.duration = registry.histogram("mongodb_command_duration_seconds",
+                                           "MongoDB command round-trip time by command and collection.")
+        self.failures = registry.counter("mongodb_command_failures_total", "Failed MongoDB commands.")
+        # (connection, request id) -> collection; the completion events do not carry the command
+        self._collections: Dict[Tuple, str] = {}
+
+    @staticmethod
+    def _collection(event: monitoring.CommandStartedEvent) -> str:
+        if event.command_name == "getMore":
+            value = event.command.get("collection")
+        else:
+            value = event.command.get(event.command_name)
+        return value if isinstance(value, str) else ""
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        self._collections[(event.connection_id, event.request_id)] = self._collection(event)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        self.duration.observe(event.duration_micros / 1e6, command=event.command_name, collection=collection)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        self.duration.observe(event.duration_micros / 1e6, command=event.command_name, collection=collection)
+        self.failures.inc(command=event.command_name, collection=collection)
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    def __init__(self, registry: MetricsRegistry):
+        self.wait = registry.histogram("mongodb_pool_checkout_wait_seconds",
+                                       "Time spent waiting to check a connection out of the pool.")
+        self.checkout_failures = registry.counter("mongodb_pool_checkout_failures_total",
+                                                  "Connection checkouts that failed, by reason.")
+        self._local = threading.local()  # a checkout starts and ends on the same thread
+        self._lock = threading.Lock()
+        self.open = 0
+        self.in_use = 0
+        registry.gauge("mongodb_pool_connections", "Open pool connections.", lambda: self.open)
+        registry.gauge("mongodb_pool_connections_in_use", "Pool connections checked out.", lambda: self.in_use)
+
+    def _waited(self) -> Optional[float]:
+        start = getattr(self._local, "start", None)
+        self._local.start = None
+        return None if start is None else time.perf_counter() - start
+
+    def connection_check_out_started(self, event) -> None:
+        self._local.start = time.perf_counter()
+
+    def connection_checked_out(self, event) -> None:
+        waited = self._waited()
+        if waited is not None:
+            self.wait.observe(waited, outcome="ok")
+        with self._lock:
+            self.in_use += 1
+
+    def connection_check_out_failed(self, event) -> None:
+        waited = self._waited()
+        if waited is not None:
+            self.wait.observe(waited, outcome="failed")
+        self.checkout_failures.inc(reason=str(event.reason))
+
+    def connection_checked_in(self, event) -> None:
+        with self._lock:
+            self.in_use -= 1
+
+    def connection_created(self, event) -> None:
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event) -> None:
+        with self._lock:
+            self.open -= 1
+
+    def connection_ready(self, event) -> None:
+        pass
+
+    def pool_created(self, event) -> None:
+        pass
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_cleared(self, event) -> None:
+        pass
+
+    def pool_closed(self, event) -> None:
+        pass
@@ -0,0 +1,355 @@
+"""Outbox-driven delivery of contact-form notifications by e-mail and Telegram.
+
+Storing a submission also stores one ``notification_outbox`` record per
+configured channel; nothing is sent on the request path. ``NotificationDispatcher``
+workers claim due records with a lease, deliver them in batches and mark them
+sent, or reschedule them with exponential backoff until ``max_attempts``.
+A worker that dies mid-delivery leaves its lease to expire, after which the
+record is claimed again, so delivery is at-least-once; the expiry counts as an
+attempt, so a record that keeps killing its worker still ends up failed.
+
+Channels are configured from the environment (see ``channels_from_env``); the
+SMTP host and the Telegram API base URL can point at local stand-ins such as
+``aiosmtpd`` and a fake HTTP server.
+"""
+import asyncio
+import logging
+import random
+import smtplib
+import ssl
+import time
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import httpx
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+PENDING, SENDING, SENT, FAILED = "pending", "sending", "sent", "failed"
+
+
+def format_submission(payload: dict) -> str:
+    return (
+        "Новая заявка с сайта\n"
+        f"Имя: {payload['name']}\n"
+        f"Телефон: {payload['phone']}\n"
+        f"Email: {payload['email']}\n"
+        f"Сообщение: {payload['message']}"
+    )
+
+
+def header_value(text: str) -> str:
+    """``text`` on one line: a CR or LF from a form field must not end or split a mail header."""
+    return " ".join(str(text).splitlines())
+
+
+def outbox_records(submission: dict, channels) -> List[dict]:
+    """Outbox records for ``submission``; ids are deterministic so a replayed batch is not notified twice."""
+    now = datetime.utcnow()
+    payload = {key: submission[key] for key in ("name", "phone", "email", "message", "created_at")}
+    return [
+        {
+            "id": f"{submission['id']}:{channel}",
+            "channel": channel,
+            "submission_id": submission["id"],
+            "payload": payload,
+            "status": PENDING,
+            "attempts": 0,
+            "next_attempt_at": now,
+            "last_error": None,
+            "created_at": now,
+            "sent_at": None,
+        }
+        for channel in channels
+    ]
+
+
+class SmtpChannel:
+    """Sends one e-mail per record over a single reused SMTP connection."""
+
+    def __init__(self, host: str, port: int, sender: str, recipients: List[str],
+                 username: Optional[str] = None, password: Optional[str] = None,
+                 starttls: bool = False, use_ssl: bool = False, timeout: float = 30.0,
+                 idle_timeout: float = 60.0):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipients = recipients
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._connection: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self._lock = asyncio.Lock()
+
+    async def deliver(self, records: List[dict]) -> List[Optional[str]]:
+        async with self._lock:
+            return await run_in_threadpool(self._deliver, records)
+
+    async def close(self) -> None:
+        async with self._lock:
+            await run_in_threadpool(self._disconnect)
+
+    def _deliver(self, records: List[dict]) -> List[Optional[str]]:
+        errors: List[Optional[str]] = []
+        for record in records:
+            try:
+                message = self._message(record["payload"])
+                self._send(message)
+                errors.append(None)
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as exc:
+                errors.append(f"{type(exc).__name__}: {exc}")
+            except (smtplib.SMTPException, OSError) as exc:
+                # The server is unreachable or broke the session: fail the rest of the batch now
+                self._disconnect()
+                errors.extend([f"{type(exc).__name__}: {exc}"] * (len(records) - len(errors)))
+                break
+            except Exception as exc:
+                # A record that cannot be turned into a message fails alone
+                errors.append(f"{type(exc).__name__}: {exc}")
+        return errors
+
+    def _message(self, payload: dict) -> EmailMessage:
+        message = EmailMessage()
+        message["Subject"] = header_value(f"Заявка с сайта: {payload['name']}")
+        message["From"] = self.sender
+        message["To"] = ", ".join(self.recipients)
+        message["Reply-To"] = header_value(payload["email"])
+        message.set_content(format_submission(payload))
+        return message
+
+    def _send(self, message: EmailMessage) -> None:
+        if self._connection is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            # The server has most likely dropped an idle session already
+            self._disconnect()
+        try:
+            self._connect().send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            self._disconnect()
+            self._connect().send_message(message)
+        self._last_used = time.monotonic()
+
+    def _connect(self) -> smtplib.SMTP:
+        if self._connection is None:
+            if self.use_ssl:
+                connection = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout,
+                                              context=ssl.create_default_context())
+            else:
+                connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+                if self.starttls:
+                    connection.starttls(context=ssl.create_default_context())
+            if self.username:
+                connection.login(self.username, self.password or "")
+            self._connection = connection
+        return self._connection
+
+    def _disconnect(self) -> None:
+        if self._connection is not None:
+            try:
+                self._connection.quit()
+            except (smtplib.SMTPException, OSError):
+                self._connection.close()
+            self._connection = None
+
+
+class TelegramChannel:
+    """Packs as many records as fit into each Telegram message."""
+
+    MAX_MESSAGE_LENGTH = 4096
+    SEPARATOR = "\n\n———\n\n"
+
+    def __init__(self, token: str, chat_id: str, api_url: str = "https://api.telegram.org", timeout: float = 10.0):
+        self.url = f"{api_url.rstrip('/')}/bot{token}/sendMessage"
+        self.chat_id = chat_id
+        self._client = httpx.AsyncClient(timeout=timeout)
+
+    async def deliver(self, records: List[dict]) -> List[Optional[str]]:
+        errors: List[Optional[str]] = [None] * len(records)
+        texts = []
+        for i, record in enumerate(records):
+            try:
+                texts.append((i, format_submission(record["payload"])[:self.MAX_MESSAGE_LENGTH]))
+            except Exception as exc:
+                # A record that cannot be formatted fails alone
+                errors[i] = f"{type(exc).__name__}: {exc}"
+        for indexes, text in self._pack(texts):
+            error = await self._send(text)
+            for i in indexes:
+                errors[i] = error
+        return errors
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+    def _pack(self, texts: List[Tuple[int, str]]):
+        """Groups of ``(record index, text)`` joined into messages of at most ``MAX_MESSAGE_LENGTH``."""
+        indexes: List[int] = []
+        parts: List[str] = []
+        length = 0
+        for i, text in texts:
+            added = len(text) + (len(self.SEPARATOR) if parts else 0)
+            if parts and length + added > self.MAX_MESSAGE_LENGTH:
+                yield indexes, self.SEPARATOR.join(parts)
+                indexes, parts, length = [], [], 0
+                added = len(text)
+            indexes.append(i)
+            parts.append(text)
+            length += added
+        if parts:
+            yield indexes, self.SEPARATOR.join(parts)
+
+    async def _send(self, text: str) -> Optional[str]:
+        try:
+            response = await self._client.post(self.url, json={
+                "chat_id": self.chat_id,
+                "text": text,
+                "disable_web_page_preview": True,
+            })
+        except httpx.HTTPError as exc:
+            return f"{type(exc).__name__}: {exc}"
+        if response.status_code != 200:
+            return f"HTTP {response.status_code}: {response.text[:200]}"
+        return None
+
+
+def channels_from_env(environ: Mapping[str, str]) -> Dict[str, object]:
+    channels: Dict[str, object] = {}
+    if environ.get("SMTP_HOST") and environ.get("NOTIFY_EMAIL_TO"):
+        port = int(environ.get("SMTP_PORT", 587))
+        channels["email"] = SmtpChannel(
+            host=environ["SMTP_HOST"],
+            port=port,
+            sender=environ.get("SMTP_FROM") or environ.get("SMTP_USERNAME") or "noreply@localhost",
+            recipients=[address.strip() for address in environ["NOTIFY_EMAIL_TO"].split(",") if address.strip()],
+            username=environ.get("SMTP_USERNAME"),
+            password=environ.get("SMTP_PASSWORD"),
+            starttls=environ.get("SMTP_STARTTLS", "true" if port == 587 else "false").lower() in ("1", "true", "yes"),
+            use_ssl=environ.get("SMTP_SSL", "true" if port == 465 else "false").lower() in ("1", "true", "yes"),
+        )
+    if environ.get("TELEGRAM_BOT_TOKEN") and environ.get("TELEGRAM_CHAT_ID"):
+        channels["telegram"] = TelegramChannel(
+            token=environ["TELEGRAM_BOT_TOKEN"],
+            chat_id=environ["TELEGRAM_CHAT_ID"],
+            api_url=environ.get("TELEGRAM_API_URL", "https://api.telegram.org"),
+        )
+    return channels
+
+
+class NotificationDispatcher:
+    def __init__(self, outbox, channels: Dict[str, object], workers_per_channel: int = 2,
+                 batch_size: int = 20, poll_interval: float = 5.0, lease: float = 60.0,
+                 max_attempts: int = 8, base_backoff: float = 5.0, max_backoff: float = 3600.0):
+        self.outbox = outbox
+        self.channels = channels
+        self.workers_per_channel = workers_per_channel
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._wakeups = {channel: asyncio.Event() for channel in channels}
+        self._tasks: List[asyncio.Task] = []
+        self.sent = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        for channel in self.channels:
+            for _ in range(self.workers_per_channel):
+                self._tasks.append(asyncio.create_task(self._worker(channel)))
+
+    def wake(self) -> None:
+        """Called after new records are written so workers need not wait for the next poll."""
+        for event in self._wakeups.values():
+            event.set()
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for channel in self.channels.values():
+            await channel.close()
+
+    async def _worker(self, channel: str) -> None:
+        wakeup = self._wakeups[channel]
+        while True:
+            try:
+                if await self.dispatch_once(channel):
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Notification worker for %s failed", channel)
+            wakeup.clear()
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def dispatch_once(self, channel: str) -> int:
+        """Claim and deliver one batch of due records for ``channel``; returns how many were claimed."""
+        records = await self._claim(channel)
+        if not records:
+            return 0
+        try:
+            errors = await self.channels[channel].deliver(records)
+        except Exception as exc:
+            # Settle the batch as failed rather than leave it to sit out its lease and fail again
+            logger.exception("Delivering %d %s notifications failed", len(records), channel)
+            errors = [f"{type(exc).__name__}: {exc}"] * len(records)
+        now = datetime.utcnow()
+        for record, error in zip(records, errors):
+            if error is None:
+                update = {"$set": {"status": SENT, "sent_at": now, "last_error": None}, "$inc": {"attempts": 1}}
+                self.sent += 1
+            else:
+                attempts = record["attempts"] + 1
+                delay = min(self.base_backoff * 2 ** (attempts - 1), self.max_backoff) * random.uniform(0.8, 1.2)
+                status = FAILED if attempts >= self.max_attempts else PENDING
+                update = {"$set": {"status": status, "next_attempt_at": now + timedelta(seconds=delay),
+                                   "last_error": error, "attempts": attempts}}
+                if status == FAILED:
+                    self.failed += 1
+                    logger.error("Giving up on %s notification %s: %s", channel, record["id"], error)
+                else:
+                    logger.warning("%s notification %s failed (attempt %d): %s", channel, record["id"], attempts, error)
+            await self.outbox.update_one({"id": record["id"], "lease": record["lease"]}, update)
+        return len(records)
+
+    async def _reclaim_expired(self, channel: str, now: datetime) -> None:
+        """Count an expired lease as a failed attempt, so a record that kills its worker every time still fails."""
+        # A "sending" record whose next_attempt_at has passed holds an expired lease
+        await self.outbox.update_many(
+            {"channel": channel, "status": SENDING, "next_attempt_at": {"$lte": now}},
+            {"$set": {"status": PENDING, "last_error": "Lease expired before delivery finished"},
+             "$inc": {"attempts": 1}},
+        )
+        result = await self.outbox.update_many(
+            {"channel": channel, "status": PENDING, "attempts": {"$gte": self.max_attempts}},
+            {"$set": {"status": FAILED}},
+        )
+        if result.modified_count:
+            self.failed += result.modified_count
+            logger.error("Giving up on %d %s notifications whose leases kept expiring",
+                         result.modified_count, channel)
+
+    async def _claim(self, channel: str) -> List[dict]:
+        now = datetime.utcnow()
+        await self._reclaim_expired(channel, now)
+        due = {"channel": channel, "status": PENDING, "next_attempt_at": {"$lte": now}}
+        candidates = await self.outbox.find(due, {"_id": 0, "id": 1}).sort("next_attempt_at", 1).to_list(self.batch_size)
+        if not candidates:
+            return []
+        lease = uuid.uuid4().hex
+        await self.outbox.update_many(
+            {**due, "id": {"$in": [c["id"] for c in candidates]}},
+            {"$set": {"status": SENDING, "lease": lease, "next_attempt_at": now + timedelta(seconds=self.lease)}},
+        )
+        return await self.outbox.find({"lease": lease}, {"_id": 0}).to_list(self.batch_size)
@@ -0,0 +1,233 @@
+"""Price quotes for the calculator, driven by rules stored in Mongo.
+
+A ruleset lives in the ``pricing_rules`` collection as one document per
+revision: tiers with their price per m², area discount brackets, percentage
+surcharges grouped by option (surface, complexity, ...) and minimum charges.
+The newest revision is compiled into an immutable ``PricingTable`` whose
+lookups are a bisect over the bracket breakpoints plus a few dict/tuple
+indexes, so a quote costs the same however many rules there are.
+``PricingEngine`` swaps the compiled table atomically whenever a newer
+revision appears, whether written through this process or another one.
+
+A bracket applies when the area is strictly above its breakpoint, so with
+breakpoints (20, 50) an area of 20 m² gets no discount, 20.5 m² gets 5% and
+anything above 50 m² gets 10%.
+"""
+import asyncio
+import logging
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+from pymongo import DESCENDING
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+
+class UnknownTier(ValueError):
+    pass
+
+
+class UnknownOption(ValueError):
+    pass
+
+
+class InvalidRules(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class PricingTable:
+    tiers: Tuple[str, ...]
+    prices: Tuple[float, ...]  # ₽ per m², by tier
+    descriptions: Tuple[str, ...]  # by tier
+    minimum_charges: Tuple[float, ...]  # ₽, by tier
+    breakpoints: Tuple[float, ...]  # ascending area thresholds
+    discounts: Tuple[float, ...]  # percent, one more than breakpoints
+    multipliers: Tuple[float, ...]  # 1 - discount, one more than breakpoints
+    surcharges: Mapping[str, Mapping[str, float]] = field(default_factory=lambda: MappingProxyType({}))  # group -> option -> percent
+    revision: int = 0
+
+    def tier_index(self, tier: str) -> int:
+        try:
+            return self.tiers.index(tier)
+        except ValueError:
+            raise UnknownTier(tier)
+
+    def surcharge_percent(self, options: Optional[Mapping[str, str]]) -> float:
+        percent = 0
+        for group, option in (options or {}).items():
+            try:
+                percent += self.surcharges[group][option]
+            except KeyError:
+                raise UnknownOption(f"{group}={option}")
+        return percent
+
+    def quote(self, area: float, tier: str, options: Optional[Mapping[str, str]] = None) -> Dict:
+        i = self.tier_index(tier)
+        bracket = bisect_left(self.breakpoints, area)
+        surcharge = self.surcharge_percent(options)
+        subtotal = self.prices[i] * area
+        total = subtotal * self.multipliers[bracket]
+        if surcharge:
+            total *= 1 + surcharge / 100
+        return {
+            "base_price_per_m2": self.prices[i],
+            "area": area,
+            "subtotal": subtotal,
+            "discount": self.discounts[bracket],
+            "surcharge": surcharge,
+            "minimum_charge": self.minimum_charges[i],
+            "total": max(total, self.minimum_charges[i]),
+            "tier_description": self.descriptions[i],
+        }
+
+    def quote_batch(self, areas: Sequence[float], tiers: Sequence[str],
+                    options: Optional[Sequence[Optional[Mapping[str, str]]]] = None) -> Dict[str, np.ndarray]:
+        """Quote every (area, tier[, options]) row in one pass; returns the breakdown fields as parallel arrays."""
+        areas = np.asarray(areas, dtype=np.float64)
+        names, inverse = np.unique(np.asarray(tiers, dtype=object), return_inverse=True)
+        tier_indexes = np.array([self.tier_index(name) for name in names], dtype=np.intp)[inverse]
+        brackets = np.searchsorted(np.asarray(self.breakpoints, dtype=np.float64), areas, side="left")
+        prices = np.asarray(self.prices)[tier_indexes]
+        subtotals = prices * areas
+        totals = subtotals * np.asarray(self.multipliers, dtype=np.float64)[brackets]
+        if options is not None and any(options):
+            surcharges = np.array([self.surcharge_percent(row) for row in options])
+            totals = np.where(surcharges != 0, totals * (1 + surcharges / 100), totals)
+        else:
+            surcharges = np.zeros(len(areas), dtype=np.int64)
+        minimums = np.asarray(self.minimum_charges)[tier_indexes]
+        return {
+            "tier_index": tier_indexes,
+            "base_price_per_m2": prices,
+            "area": areas,
+            "subtotal": subtotals,
+            "discount": np.asarray(self.discounts)[brackets],
+            "surcharge": surcharges,
+            "minimum_charge": minimums,
+            "total": np.maximum(totals, minimums),
+        }
+
+
+DEFAULT_RULES: Dict[str, Any] = {
+    "tiers": [
+        {"name": "basic", "price_per_m2": 1500, "description": "Простое художественное оформление"},
+        {"name": "standard", "price_per_m2": 3500, "description": "Детализированная работа с элементами"},
+        {"name": "premium", "price_per_m2": 7000, "description": "Премиальная работа с максимальной детализацией"},
+    ],
+    "area_brackets": [
+        {"above": 20, "discount": 5},
+        {"above": 50, "discount": 10},
+    ],
+    # e.g. {"group": "surface", "option": "brick", "percent": 15}
+    "surcharges": [],
+    "minimum_charge": 0,
+}
+
+
+def compile_rules(rules: Mapping[str, Any], revision: int = 0) -> PricingTable:
+    """Validate a ruleset and compile it into a ``PricingTable``; raises ``InvalidRules``."""
+    try:
+        tiers = list(rules["tiers"])
+        if not tiers:
+            raise InvalidRules("At least one tier is required")
+        names = [str(tier["name"]) for tier in tiers]
+        if len(set(names)) != len(names):
+            raise InvalidRules("Tier names must be unique")
+        default_minimum = rules.get("minimum_charge", 0)
+        brackets = sorted(rules.get("area_brackets", []), key=lambda bracket: bracket["above"])
+        breakpoints = [bracket["above"] for bracket in brackets]
+        if len(set(breakpoints)) != len(breakpoints):
+            raise InvalidRules("Area bracket thresholds must be unique")
+        discounts = [0] + [bracket["discount"] for bracket in brackets]
+        if any(not 0 <= discount < 100 for discount in discounts):
+            raise InvalidRules("Discounts must be between 0 and 100 percent")
+        surcharges: Dict[str, Dict[str, float]] = {}
+        for surcharge in rules.get("surcharges", []):
+            surcharges.setdefault(str(surcharge["group"]), {})[str(surcharge["option"])] = surcharge["percent"]
+        prices = [tier["price_per_m2"] for tier in tiers]
+        minimums = [default_minimum if tier.get("minimum_charge") is None else tier["minimum_charge"] for tier in tiers]
+        if any(not isinstance(value, (int, float)) or value < 0 for value in prices + minimums + breakpoints):
+            raise InvalidRules("Prices, minimum charges and thresholds must be non-negative numbers")
+    except (KeyError, TypeError) as exc:
+        raise InvalidRules(f"Malformed pricing rules: {exc!r}")
+    return PricingTable(
+        tiers=tuple(names),
+        prices=tuple(prices),
+        descriptions=tuple(str(tier.get("description", "")) for tier in tiers),
+        minimum_charges=tuple(minimums),
+        breakpoints=tuple(breakpoints),
+        discounts=tuple(discounts),
+        multipliers=tuple(1 - discount / 100 for discount in discounts),
+        surcharges=MappingProxyType({group: MappingProxyType(options) for group, options in surcharges.items()}),
+        revision=revision,
+    )
+
+
+DEFAULT_TABLE = compile_rules(DEFAULT_RULES)
+
+RULE_FIELDS = ("tiers", "area_brackets", "surcharges", "minimum_charge")
+
+
+class PricingEngine:
+    """Holds the compiled table of the newest ruleset revision and keeps it current."""
+
+    def __init__(self, collection, poll_interval: float = 30.0):
+        self.collection = collection
+        self.poll_interval = poll_interval
+        self.table = DEFAULT_TABLE
+        self.rules: Dict[str, Any] = dict(DEFAULT_RULES)
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if await self.collection.count_documents({}, limit=1) == 0:
+            await self.replace(DEFAULT_RULES)
+        else:
+            await self.reload()
+        self._task = asyncio.create_task(self._poll())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def reload(self) -> None:
+        document = await self.collection.find_one({}, {"_id": 0}, sort=[("revision", DESCENDING)])
+        if document is None or document["revision"] <= self.table.revision:
+            return
+        try:
+            table = compile_rules(document, document["revision"])
+        except InvalidRules as exc:
+            logger.error("Ignoring pricing rules revision %s: %s", document["revision"], exc)
+            return
+        # Requests read self.table once, so a single reference swap is atomic for them
+        self.rules = {field: document[field] for field in RULE_FIELDS if field in document}
+        self.table = table
+        logger.info("Loaded pricing rules revision %s", table.revision)
+
+    async def replace(self, rules: Mapping[str, Any]) -> int:
+        """Store ``rules`` as a new revision and start quoting with it; returns the revision."""
+        compile_rules(rules)
+        while True:
+            latest = await self.collection.find_one({}, {"_id": 0, "revision": 1}, sort=[("revision", DESCENDING)])
+            revision = (latest["revision"] if latest else 0) + 1
+            document = {field: rules[field] for field in RULE_FIELDS if field in rules}
+            try:
+                await self.collection.insert_one({**document, "revision": revision, "created_at": datetime.utcnow()})
+            except DuplicateKeyError:
+                continue  # another writer took this revision number
+            await self.reload()
+            return revision
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.reload()
+            except Exception:
+                logger.exception("Failed to reload pricing rules")
@@ -0,0 +1,170 @@
+"""In-memory full-text search over portfolio projects, services and FAQs.
+
+Text is lower-cased, "ё" folded into "е", stop words dropped and every word
+reduced to its Russian Snowball stem, so "стены", "стену" and "стеной" all
+match. An inverted index maps each stem to the documents containing it with a
+field-weighted term frequency (a title counts more than a description) and
+results are ranked with BM25. The last word of a query also matches as a
+prefix -- "граф" finds "граффити" -- via bisect over the sorted vocabulary,
+which is what type-ahead needs.
+
+Everything is plain dicts and lists held by one object, so a lookup over the
+studio's catalogue takes well under a millisecond. Documents are added and
+removed one at a time as content is written, and a full rebuild swaps in a new
+``SearchIndex`` without disturbing searches in flight.
+"""
+import math
+import re
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+import snowballstemmer
+
+# kind -> field -> weight
+SEARCH_FIELDS: Dict[str, Dict[str, float]] = {
+    "portfolio": {"title": 3.0, "description": 1.0},
+    "services": {"title": 3.0, "description": 1.0},
+    "faqs": {"question": 2.0, "answer": 1.0},
+}
+
+# kind -> fields returned with each hit
+RESULT_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "portfolio": ("id", "title", "description", "category", "image"),
+    "services": ("id", "title", "description", "icon", "price"),
+    "faqs": ("id", "question", "answer"),
+}
+
+STOP_WORDS = frozenset(
+    "и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по только ее мне было вот "
+    "от меня еще нет о из ему теперь когда даже ну ли если уже или ни быть был него до вас нибудь опять уж "
+    "вам ведь там потом себя ничего ей может они тут где есть надо ней для мы тебя их чем была сам чтоб без "
+    "будто чего раз тоже себе под будет ж тогда кто этот того потому этого какой совсем ним здесь этом один "
+    "почти мой тем чтобы нее сейчас были куда зачем всех никогда можно при наконец два об другой хоть после "
+    "над больше тот через эти нас про всего них какая много разве три эту моя впрочем хорошо свою этой перед "
+    "иногда лучше чуть том нельзя такой им более всегда конечно всю между".split()
+)
+
+WORD_RE = re.compile(r"\w+")
+MAX_PREFIX_EXPANSIONS = 50
+PREFIX_WEIGHT = 0.7  # a prefix match ranks below the same word typed in full
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_russian = snowballstemmer.stemmer("russian")
+_english = snowballstemmer.stemmer("english")
+
+
+@lru_cache(maxsize=100_000)
+def stem(word: str) -> str:
+    return (_english if word.isascii() else _russian).stemWord(word)
+
+
+def words(text: str) -> List[str]:
+    """Lower-cased words of ``text`` without stop words."""
+    return [word for word in WORD_RE.findall(text.lower().replace("ё", "е")) if word not in STOP_WORDS]
+
+
+class SearchIndex:
+    def __init__(self):
+        self.postings: Dict[str, Dict[Tuple[str, str], float]] = defaultdict(dict)  # stem -> doc -> weighted tf
+        self.lengths: Dict[Tuple[str, str], float] = {}  # doc -> weighted word count
+        self.documents: Dict[Tuple[str, str], dict] = {}  # doc -> result payload
+        self.vocabulary: List[str] = []  # sorted distinct words, for prefix lookups
+        self._word_counts: Counter = Counter()  # word -> documents containing it
+        self._word_stems: Dict[str, str] = {}
+        self._doc_words: Dict[Tuple[str, str], Set[str]] = {}
+        self._doc_terms: Dict[Tuple[str, str], Set[str]] = {}
+        self._total_length = 0.0
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def add(self, kind: str, document: Mapping) -> None:
+        key = (kind, document["id"])
+        if key in self.documents:
+            self.remove(kind, document["id"])
+        frequencies: Dict[str, float] = defaultdict(float)
+        doc_words: Set[str] = set()
+        for field, weight in SEARCH_FIELDS[kind].items():
+            for word in words(document.get(field) or ""):
+                frequencies[stem(word)] += weight
+                doc_words.add(word)
+        for term, frequency in frequencies.items():
+            self.postings[term][key] = frequency
+        for word in doc_words:
+            if self._word_counts[word] == 0:
+                self.vocabulary.insert(bisect_left(self.vocabulary, word), word)
+                self._word_stems[word] = stem(word)
+            self._word_counts[word] += 1
+        length = sum(frequencies.values())
+        self.lengths[key] = length
+        self._total_length += length
+        self._doc_words[key] = doc_words
+        self._doc_terms[key] = set(frequencies)
+        self.documents[key] = {"type": kind, **{field: document.get(field) for field in RESULT_FIELDS[kind]}}
+
+    def remove(self, kind: str, document_id: str) -> None:
+        key = (kind, document_id)
+        if key not in self.documents:
+            return
+        for word in self._doc_words.pop(key):
+            self._word_counts[word] -= 1
+            if self._word_counts[word] == 0:
+                del self._word_counts[word]
+                del self.vocabulary[bisect_left(self.vocabulary, word)]
+                del self._word_stems[word]
+        for term in self._doc_terms.pop(key):
+            postings = self.postings[term]
+            del postings[key]
+            if not postings:
+                del self.postings[term]
+        self._total_length -= self.lengths.pop(key)
+        del self.documents[key]
+
+    def expand_prefix(self, prefix: str) -> Set[str]:
+        """Stems of the indexed words starting with ``prefix``, at most ``MAX_PREFIX_EXPANSIONS`` of them."""
+        start = bisect_left(self.vocabulary, prefix)
+        stems = set()
+        for word in self.vocabulary[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not word.startswith(prefix):
+                break
+            stems.add(self._word_stems[word])
+        return stems
+
+    def search(self, query: str, limit: int = 20, kinds: Optional[Iterable[str]] = None) -> List[dict]:
+        """Ranked hits for ``query``; documents matching more of its words always rank first."""
+        query_words = words(query)
+        if not query_words or not self.documents:
+            return []
+        # The word being typed is a prefix unless the query already moved past it
+        typing = not query[-1:].isspace()
+        kinds = set(kinds) if kinds else None
+        count = len(self.documents)
+        average_length = self._total_length / count or 1.0
+        scores: Dict[Tuple[str, str], float] = defaultdict(float)
+        matched: Dict[Tuple[str, str], int] = defaultdict(int)
+        for position, word in enumerate(query_words):
+            terms = {stem(word): 1.0}
+            if typing and position == len(query_words) - 1:
+                for term in self.expand_prefix(word):
+                    terms.setdefault(term, PREFIX_WEIGHT)
+            word_scores: Dict[Tuple[str, str], float] = {}
+            for term, boost in terms.items():
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for key, frequency in postings.items():
+                    if kinds is not None and key[0] not in kinds:
+                        continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[key] / average_length)
+                    score = boost * idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+                    # Several expansions of one word count once, by the best of them
+                    word_scores[key] = max(word_scores.get(key, 0.0), score)
+            for key, score in word_scores.items():
+                scores[key] += score
+                matched[key] += 1
+        ranked = sorted(scores, key=lambda key: (matched[key], scores[key]), reverse=True)[:limit]
+        return [{**self.documents[key], "score": round(scores[key], 4)} for key in ranked]
@@ -1,24 +1,120 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Header, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DESCENDING
+from pymongo.errors import BulkWriteError
 import os
+import json
+import asyncio
+import orjson
+import numpy as np
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+from typing import List, Optional, Dict, Any, Tuple, Union
 import uuid
 from datetime import datetime
 import base64
+import math
+import binascii
+import secrets
+from functools import partial
+
+from blobstore import BlobStore, sniff_media_type
+from cache import CachedResponse, ResponseCache, SingleFlight
+from categories import SUMMARY_COLLECTION, count_added, count_removed, load_counts, rebuild_counts
+from changefeed import ChangeFeed, TooManySubscribers
+from compression import SelectiveGZipMiddleware, compress_all, negotiate
+from export import MEDIA_TYPES, export_chunks, iter_submissions, resume_point
+from imaging import DerivativePipeline
+from indexes import ensure_indexes
+from metrics import CommandMetrics, MetricsMiddleware, MetricsRegistry, PoolMetrics
+from ingest import QueueFull, WriteBehindQueue
+from notifications import NotificationDispatcher, channels_from_env, outbox_records
+from pricing import InvalidRules, PricingEngine, UnknownOption, UnknownTier
+from search import SEARCH_FIELDS, SearchIndex
+from spam import RollingBloomFilter, TokenBuckets, fingerprint
+from staging import drop_stale_staging, replace_collections
+from uploads import InvalidUpload, MultipartReceiver, UnsupportedMediaType, UploadTooLarge, receive_multipart
+from versions import CollectionVersions, matching_etag
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# Prometheus metrics, served at /api/metrics
+metrics = MetricsRegistry()
+
+# MongoDB connection, with command timings and pool checkout waits recorded in metrics
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[CommandMetrics(metrics), PoolMetrics(metrics)])
 db = client[os.environ['DB_NAME']]
 
+# Serialized responses of the read-only content endpoints
+# The landing body is assembled from the others, so it is dropped whenever any of them is
+response_cache = ResponseCache(
+    ttl=float(os.environ.get('CACHE_TTL_SECONDS', 300)),
+    max_bytes=int(os.environ.get('CACHE_MAX_BYTES', 32 * 1024 * 1024)),
+    derived=("landing",),
+)
+# Cache misses in progress, keyed by (namespace, cache key, ETag): concurrent misses of one
+# body share its load, and a request arriving after a write never joins a load from before it
+cache_fills = SingleFlight()
+# Cached bodies at least this large are stored gzip/brotli-compressed as well
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1000))
+
+# Version stamps of the content collections, the source of their ETags; writes by
+# other instances are picked up by polling and drop the affected cached responses
+CONTENT_COLLECTIONS = ("portfolio", "services", "process_steps", "testimonials", "faqs")
+versions = CollectionVersions(
+    db.collection_versions,
+    poll_interval=float(os.environ.get('VERSION_POLL_SECONDS', 5)),
+    on_change=lambda names: content_changed_elsewhere(names),
+)
+CONTENT_CACHE_CONTROL = (
+    f"public, max-age={int(os.environ.get('CONTENT_MAX_AGE', 60))}, "
+    f"stale-while-revalidate={int(os.environ.get('CONTENT_STALE_WHILE_REVALIDATE', 600))}"
+)
+
+# Content changes pushed to browsers over /api/stream, from one change stream shared by all of them
+change_feed = ChangeFeed(
+    db,
+    CONTENT_COLLECTIONS,
+    buffer_size=int(os.environ.get('STREAM_BUFFER_SIZE', 1000)),
+    queue_size=int(os.environ.get('STREAM_QUEUE_SIZE', 100)),
+    heartbeat=float(os.environ.get('STREAM_HEARTBEAT_SECONDS', 15)),
+    max_subscribers=int(os.environ.get('STREAM_MAX_CLIENTS', 1000)),
+)
+
+# Uploaded images, stored by content hash and served from /api/images/{digest}
+blob_store = BlobStore(Path(os.environ.get('MEDIA_DIR', ROOT_DIR / 'media')))
+MAX_IMAGE_BYTES = int(os.environ.get('MAX_IMAGE_BYTES', 10 * 1024 * 1024))
+# Multipart uploads: whole request and number of files, for bulk portfolio imports
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 256 * 1024 * 1024))
+MAX_UPLOAD_FILES = int(os.environ.get('MAX_UPLOAD_FILES', 100))
+IMAGE_URL_PREFIX = "/api/images/"
+image_pipeline = DerivativePipeline(blob_store, max_workers=int(os.environ.get('IMAGE_WORKERS', 2)))
+
+# Strong references to fire-and-forget tasks so they are not garbage collected mid-flight
+background_tasks = set()
+
+# Portfolio pagination
+PORTFOLIO_PAGE_SIZE = int(os.environ.get('PORTFOLIO_PAGE_SIZE', 24))
+PORTFOLIO_MAX_PAGE_SIZE = 100
+PORTFOLIO_SORT = [("created_at", DESCENDING), ("id", DESCENDING)]
+PORTFOLIO_CURSOR_FIELDS = ("created_at", "id")  # returned even when ``fields`` leaves them out
+
+# Price calculator, quoting from the newest revision of the pricing_rules collection
+pricing = PricingEngine(db.pricing_rules, poll_interval=float(os.environ.get('PRICING_RELOAD_SECONDS', 30)))
+MAX_BATCH_QUOTES = int(os.environ.get('MAX_BATCH_QUOTES', 10000))
+
+# Per-category project counts, kept up to date by every portfolio insert and delete
+category_summary = db[SUMMARY_COLLECTION]
+
 # Create the main app without a prefix
 app = FastAPI(title="Контраст Граффити Студия API", version="1.0.0")
 
@@ -30,7 +126,8 @@ class PortfolioProject(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     title: str
     category: str  # 'murals', 'portraits', 'commercial', 'abstract', 'automotive'
-    image: str  # base64 encoded image
+    image: str  # URL: /api/images/<sha256> for uploads, or an external link
+    variants: Optional[Dict[str, Dict[str, str]]] = None  # format -> width -> URL, filled in the background
     description: str
     featured: bool = False
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -38,7 +135,7 @@ class PortfolioProject(BaseModel):
 class PortfolioProjectCreate(BaseModel):
     title: str
     category: str
-    image: str
+    image: str  # URL, data URI or bare base64
     description: str
     featured: bool = False
 
@@ -70,6 +167,7 @@ class ContactSubmissionCreate(BaseModel):
 class PriceCalculation(BaseModel):
     area: float
     tier: str  # 'basic', 'standard', 'premium'
+    options: Optional[Dict[str, str]] = None  # surcharge group -> option, e.g. {"surface": "brick"}
     
 class PriceCalculationResult(BaseModel):
     price: float
@@ -77,6 +175,42 @@ class PriceCalculationResult(BaseModel):
     tier: str
     area: float
 
+class PriceSweep(BaseModel):
+    area_from: float
+    area_to: float
+    step: float
+    tiers: List[str] = ["basic", "standard", "premium"]
+    options: Optional[Dict[str, str]] = None
+
+class BatchPriceCalculation(BaseModel):
+    rows: Optional[List[PriceCalculation]] = None
+    sweep: Optional[PriceSweep] = None
+
+class BatchPriceCalculationResult(BaseModel):
+    results: List[PriceCalculationResult]
+    totals: Dict[str, Any]
+
+class PricingTier(BaseModel):
+    name: str
+    price_per_m2: Union[int, float] = Field(ge=0)
+    description: str = ""
+    minimum_charge: Optional[Union[int, float]] = Field(None, ge=0)  # overrides the ruleset-wide minimum
+
+class AreaBracket(BaseModel):
+    above: Union[int, float] = Field(ge=0)  # applies to areas strictly above this many m²
+    discount: Union[int, float] = Field(ge=0, lt=100)  # percent
+
+class Surcharge(BaseModel):
+    group: str  # e.g. 'surface', 'complexity'
+    option: str  # e.g. 'brick', 'high'
+    percent: Union[int, float]
+
+class PricingRules(BaseModel):
+    tiers: List[PricingTier]
+    area_brackets: List[AreaBracket] = []
+    surcharges: List[Surcharge] = []
+    minimum_charge: Union[int, float] = Field(0, ge=0)
+
 class Testimonial(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
@@ -103,108 +237,836 @@ class ProcessStep(BaseModel):
     active: bool = True
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+# Admin endpoints are enabled by setting ADMIN_TOKEN and called with an X-Admin-Token header
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    admin_token = os.environ.get('ADMIN_TOKEN')
+    if not admin_token:
+        raise HTTPException(status_code=403, detail="Admin API is disabled")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+# Response caching helpers
+def dump_json(payload: Any) -> bytes:
+    """Encode trusted payloads (Mongo documents read with ``NO_ID``) without a Pydantic round-trip.
+
+    Produces the same JSON as FastAPI's encoder for these documents; anything
+    orjson cannot handle natively, such as models, falls back to ``jsonable_encoder``.
+    """
+    return orjson.dumps(payload, default=jsonable_encoder)
+
+async def cached_entry(namespace: str, key: str, loader, strong: bool = False) -> CachedResponse:
+    """Return ``loader()``'s serialized result from the response cache, filling it on a miss.
+
+    ``namespace`` is the collection the payload is built from; writes to that
+    collection must call ``content_changed(namespace)``.
+    """
+    entry = response_cache.get(namespace, key)
+    if entry is None:
+        etag = versions.etag(namespace)
+        entry = await cache_fills.run((namespace, key, etag),
+                                      partial(fill_entry, namespace, key, loader, etag, strong))
+    return entry
+
+async def fill_entry(namespace: str, key: str, loader, etag: str, strong: bool = False) -> CachedResponse:
+    entry = await build_entry(dump_json(await loader()), content_headers(etag), strong)
+    cache_if_current(namespace, key, entry, etag, namespace)
+    return entry
+
+def content_headers(etag: str) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": CONTENT_CACHE_CONTROL}
+
+def cache_if_current(namespace: str, key: str, entry: CachedResponse, etag: str, *collections: str):
+    """Cache ``entry`` unless ``collections`` were written while it was loaded, which would pin stale data."""
+    if versions.etag(*collections) == etag:
+        response_cache.set(namespace, key, entry)
+
+def content_changed_elsewhere(namespaces):
+    """Another instance wrote to ``namespaces``: drop what was derived from them here."""
+    response_cache.invalidate(*namespaces)
+    if any(namespace in SEARCH_SOURCES for namespace in namespaces):
+        schedule_search_rebuild()
+
+async def content_changed(*namespaces: str):
+    """Record a write to content collections: new ETags first, then drop the cached responses."""
+    await versions.bump(*namespaces)
+    response_cache.invalidate(*namespaces)
+
+def not_modified(if_none_match: Optional[str], etag: str) -> Optional[Response]:
+    """A 304 for a client whose copy is still current, decided without touching Mongo."""
+    matched = matching_etag(if_none_match, etag)
+    if matched is None:
+        return None
+    return Response(status_code=304, headers={**content_headers(matched), "Vary": "Accept-Encoding"})
+
+async def build_entry(body: bytes, headers: Optional[Dict[str, str]] = None, strong: bool = False) -> CachedResponse:
+    """A cache entry for ``body``, compressed once here rather than on every response.
+
+    ``strong`` compression is for the few long-lived keys; per-request keys (cursors, filters,
+    field lists) get the cheaper default, as they are built on the miss path far more often.
+    """
+    encoded = {}
+    if len(body) >= COMPRESS_MIN_BYTES:
+        encoded = await run_in_threadpool(compress_all, body, COMPRESS_MIN_BYTES, strong)
+    return CachedResponse(body=body, headers=headers or {}, encoded=encoded)
+
+def cached_response(entry: CachedResponse, accept_encoding: Optional[str] = None) -> Response:
+    """Respond with the stored encoding of ``entry`` the client prefers; the gzip middleware skips encoded responses."""
+    if not entry.encoded:
+        return Response(content=entry.body, media_type=entry.media_type, headers=entry.headers)
+    headers = {**entry.headers, "Vary": "Accept-Encoding"}
+    encoding = negotiate(accept_encoding, entry.encoded)
+    if encoding is None:
+        return Response(content=entry.body, media_type=entry.media_type, headers=headers)
+    headers["Content-Encoding"] = encoding
+    if "ETag" in headers:
+        # Each encoding is a different byte sequence, so it needs its own strong ETag
+        headers["ETag"] = headers["ETag"][:-1] + f'-{encoding}"'
+    return Response(content=entry.encoded[encoding], media_type=entry.media_type, headers=headers)
+
+async def cached_json(namespace: str, key: str, loader, accept_encoding: Optional[str] = None,
+                      if_none_match: Optional[str] = None, strong: bool = False) -> Response:
+    return (not_modified(if_none_match, versions.etag(namespace))
+            or cached_response(await cached_entry(namespace, key, loader, strong), accept_encoding))
+
+# Portfolio cursors are opaque to clients: base64url of the (created_at, id) sort key
+def encode_cursor(created_at: datetime, project_id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), project_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, project_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(project_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# Content loaders
+# Documents written by this API already match their models, so loaders return them
+# as read, minus Mongo's _id, instead of rebuilding and re-validating a model per item.
+NO_ID = {"_id": 0}
+
+def sparse_fields(model, fields: Optional[str], required: Tuple[str, ...] = ("id",)) -> Tuple[Dict[str, int], str]:
+    """Projection and cache key for a ``fields`` query: a comma-separated subset of ``model``'s fields.
+
+    ``required`` fields are always returned. Without ``fields`` the projection is ``NO_ID`` and the key empty.
+    """
+    names = {name.strip() for name in fields.split(",") if name.strip()} if fields else set()
+    if not names:
+        return NO_ID, ""
+    unknown = sorted(names - model.model_fields.keys())
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    names = sorted(names.union(required))
+    return {"_id": 0, **{name: 1 for name in names}}, ",".join(names)
+
+FIELDS_DESCRIPTION = "Comma-separated fields to return instead of whole documents"
+
+async def load_portfolio_page(category: Optional[str] = None, featured: Optional[bool] = None,
+                              cursor: Optional[str] = None, limit: int = PORTFOLIO_PAGE_SIZE,
+                              projection: Dict[str, int] = NO_ID):
+    """One page of projects, newest first, plus the cursor of the next page (or None).
+
+    ``projection`` must include ``created_at`` and ``id``, the cursor's sort key.
+    """
+    query: Dict[str, Any] = {}
+    if category:
+        query["category"] = category
+    if featured is not None:
+        query["featured"] = featured
+    if cursor:
+        created_at, project_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": project_id}},
+        ]
+    projects = await db.portfolio.find(query, projection).sort(PORTFOLIO_SORT).limit(limit + 1).to_list(limit + 1)
+    next_cursor = None
+    if len(projects) > limit:
+        projects = projects[:limit]
+        next_cursor = encode_cursor(projects[-1]["created_at"], projects[-1]["id"])
+    return projects, next_cursor
+
+async def cached_portfolio_page(category: Optional[str] = None, featured: Optional[bool] = None,
+                                cursor: Optional[str] = None, limit: int = PORTFOLIO_PAGE_SIZE,
+                                fields: Optional[str] = None) -> CachedResponse:
+    projection, fields_key = sparse_fields(PortfolioProject, fields, required=PORTFOLIO_CURSOR_FIELDS)
+    key = f"page:{category or ''}:{'' if featured is None else int(featured)}:{cursor or ''}:{limit}:{fields_key}"
+    entry = response_cache.get("portfolio", key)
+    if entry is None:
+        etag = versions.etag("portfolio")
+        entry = await cache_fills.run(("portfolio", key, etag), partial(
+            fill_portfolio_page, key, etag, category, featured, cursor, limit, projection))
+    return entry
+
+async def fill_portfolio_page(key: str, etag: str, *args) -> CachedResponse:
+    projects, next_cursor = await load_portfolio_page(*args)
+    headers = content_headers(etag)
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    entry = await build_entry(dump_json(projects), headers)
+    cache_if_current("portfolio", key, entry, etag, "portfolio")
+    return entry
+
+async def load_portfolio_categories():
+    return await load_counts(category_summary)
+
+async def load_services(projection: Dict[str, int] = NO_ID):
+    return await db.services.find({"active": True}, projection).sort("order", 1).to_list(1000)
+
+async def load_testimonials(projection: Dict[str, int] = NO_ID):
+    return await db.testimonials.find({"approved": True}, projection).to_list(1000)
+
+async def load_faqs(projection: Dict[str, int] = NO_ID):
+    return await db.faqs.find({"active": True}, projection).sort("order", 1).to_list(1000)
+
+async def load_process_steps(projection: Dict[str, int] = NO_ID):
+    return await db.process_steps.find({"active": True}, projection).sort("step", 1).to_list(1000)
+
+# Full-text search over an in-memory index, updated as content is written here and
+# rebuilt when another instance writes; kind -> cursor over its searchable documents
+SEARCH_SOURCES = {
+    "portfolio": lambda: db.portfolio.find({}, NO_ID),
+    "services": lambda: db.services.find({"active": True}, NO_ID),
+    "faqs": lambda: db.faqs.find({"active": True}, NO_ID),
+}
+search_index = SearchIndex()
+search_rebuild_requested = False
+search_rebuild: Optional[asyncio.Task] = None
+# Writes made here while a rebuild runs, as (kind, id, document or None for a removal), replayed
+# onto the fresh index before the swap: the rebuild's cursors may have passed them already
+search_changes: Optional[List[tuple]] = None
+
+def index_document(kind: str, document: dict):
+    search_index.add(kind, document)
+    if search_changes is not None:
+        search_changes.append((kind, document["id"], document))
+
+def unindex_document(kind: str, document_id: str):
+    search_index.remove(kind, document_id)
+    if search_changes is not None:
+        search_changes.append((kind, document_id, None))
+
+async def build_search_index():
+    """Index all searchable content into a fresh ``SearchIndex`` and swap it in whole."""
+    global search_index, search_changes
+    index = SearchIndex()
+    search_changes = []
+    try:
+        for kind, find in SEARCH_SOURCES.items():
+            async for document in find():
+                index.add(kind, document)
+                if len(index) % 1000 == 0:
+                    await asyncio.sleep(0)  # let requests through while a large catalogue is indexed
+        for kind, document_id, document in search_changes:
+            if document is None:
+                index.remove(kind, document_id)
+            else:
+                index.add(kind, document)
+        search_index = index
+    finally:
+        search_changes = None
+    logger.info("Search index built with %d documents", len(index))
+
+async def rebuild_search_index():
+    global search_rebuild_requested
+    while search_rebuild_requested:
+        search_rebuild_requested = False
+        try:
+            await build_search_index()
+        except Exception:
+            logger.exception("Failed to build the search index")
+
+def schedule_search_rebuild():
+    """Rebuild in the background; requests made during a rebuild are folded into one more pass."""
+    global search_rebuild, search_rebuild_requested
+    search_rebuild_requested = True
+    if search_rebuild is None or search_rebuild.done():
+        search_rebuild = asyncio.create_task(rebuild_search_index())
+
+# Landing page sections: name -> zero-argument fetcher of the section's cached body
+LANDING_SECTIONS = {
+    "portfolio": cached_portfolio_page,
+    "categories": partial(cached_entry, "portfolio", "categories", load_portfolio_categories),
+    "services": partial(cached_entry, "services", "list", load_services, strong=True),
+    "process": partial(cached_entry, "process_steps", "list", load_process_steps, strong=True),
+    "testimonials": partial(cached_entry, "testimonials", "list", load_testimonials, strong=True),
+    "faqs": partial(cached_entry, "faqs", "list", load_faqs, strong=True),
+}
+
+# Landing bootstrap endpoint
+@api_router.get("/landing")
+async def get_landing(sections: Optional[str] = None, accept_encoding: Optional[str] = Header(None),
+                      if_none_match: Optional[str] = Header(None)):
+    """Everything the landing page renders, fetched concurrently in one round-trip.
+
+    ``sections`` is an optional comma-separated subset of ``LANDING_SECTIONS``.
+    """
+    names = [name.strip() for name in sections.split(",") if name.strip()] if sections else list(LANDING_SECTIONS)
+    unknown = [name for name in names if name not in LANDING_SECTIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown sections: {', '.join(unknown)}")
+    names = list(dict.fromkeys(names))
+    # One ETag for every section combination: any content write changes it
+    etag = versions.etag(*CONTENT_COLLECTIONS)
+    response = not_modified(if_none_match, etag)
+    if response is not None:
+        return response
+    key = ",".join(names)
+    entry = response_cache.get("landing", key)
+    if entry is None:
+        entry = await cache_fills.run(("landing", key, etag), partial(fill_landing, key, names, etag))
+    return cached_response(entry, accept_encoding)
+
+async def fill_landing(key: str, names: List[str], etag: str) -> CachedResponse:
+    entries = await asyncio.gather(*(LANDING_SECTIONS[name]() for name in names))
+    parts = [b'"' + name.encode() + b'":' + entry.body for name, entry in zip(names, entries)]
+    if "portfolio" in names:
+        next_cursor = entries[names.index("portfolio")].headers.get("X-Next-Cursor")
+        parts.append(b'"portfolio_next_cursor":' + dump_json(next_cursor))
+    entry = await build_entry(b"{" + b",".join(parts) + b"}", content_headers(etag), strong=True)
+    cache_if_current("landing", key, entry, etag, *CONTENT_COLLECTIONS)
+    return entry
+
 # Portfolio endpoints
 @api_router.get("/portfolio", response_model=List[PortfolioProject])
-async def get_portfolio():
-    projects = await db.portfolio.find().to_list(1000)
-    return [PortfolioProject(**project) for project in projects]
+async def get_portfolio(
+    category: Optional[str] = None,
+    featured: Optional[bool] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(PORTFOLIO_PAGE_SIZE, ge=1, le=PORTFOLIO_MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    accept_encoding: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    """Newest projects first. When more remain, ``X-Next-Cursor`` holds the ``cursor`` for the next page.
+
+    With ``fields``, projects hold only those fields plus ``id`` and ``created_at``.
+    """
+    return (not_modified(if_none_match, versions.etag("portfolio"))
+            or cached_response(await cached_portfolio_page(category, featured, cursor, limit, fields),
+                               accept_encoding))
 
 @api_router.get("/portfolio/categories")
-async def get_portfolio_categories():
-    categories = await db.portfolio.distinct("category")
-    return {"categories": categories}
+async def get_portfolio_categories(if_none_match: Optional[str] = Header(None)):
+    """Every category with its number of projects and of featured projects."""
+    response = not_modified(if_none_match, versions.etag("portfolio"))
+    if response is not None:
+        return response
+    entry = await cached_entry("portfolio", "categories", load_portfolio_categories)
+    return Response(content=b'{"categories":' + entry.body + b"}", media_type="application/json",
+                    headers=entry.headers)
+
+# Search endpoint
+@api_router.get("/search")
+async def search_content(
+    q: str = Query(..., min_length=1, max_length=200),
+    types: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+):
+    """Ranked matches across portfolio projects, services and FAQs; the last word of ``q`` also matches as a prefix.
+
+    ``types`` is an optional comma-separated subset of ``portfolio``, ``services`` and ``faqs``.
+    """
+    kinds = [kind.strip() for kind in types.split(",") if kind.strip()] if types else None
+    unknown = [kind for kind in kinds or () if kind not in SEARCH_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown types: {', '.join(unknown)}")
+    results = search_index.search(q, limit, kinds)
+    return Response(content=dump_json({"query": q, "results": results}), media_type="application/json")
+
+# Live updates endpoint
+@api_router.get("/stream")
+async def stream_changes(last_event_id: Optional[str] = Header(None)):
+    """Server-sent ``change`` and ``reset`` events for the content collections."""
+    try:
+        frames = await change_feed.stream(last_event_id)
+    except TooManySubscribers:
+        raise HTTPException(status_code=503, detail="Слишком много подключений, попробуйте позже")
+    return StreamingResponse(frames, media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+# Images
+def is_image_url(image: str) -> bool:
+    return image.startswith(("http://", "https://", IMAGE_URL_PREFIX))
+
+async def store_inline_image(image: str) -> str:
+    """Decode a data URI or bare base64 image into the blob store and return its URL."""
+    if image.startswith("data:"):
+        image = image.partition(",")[2]
+    if len(image) * 3 // 4 > MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=413, detail="Image is too large")
+    try:
+        data = await run_in_threadpool(base64.b64decode, image, validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid image")
+    if not sniff_media_type(data).startswith("image/"):
+        raise HTTPException(status_code=415, detail="Not a JPEG, PNG, GIF, WebP or AVIF image")
+    digest = await run_in_threadpool(blob_store.put, data)
+    return IMAGE_URL_PREFIX + digest
+
+def parse_range(range_header: str, size: int):
+    """Resolve a single ``bytes=`` range to inclusive offsets; None if absent or unsupported."""
+    unit, _, spec = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if not first:
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            start, end = int(first), min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+@api_router.get("/images/{digest}")
+async def get_image(digest: str, range_header: Optional[str] = Header(None, alias="Range"),
+                    if_none_match: Optional[str] = Header(None)):
+    stat = blob_store.stat(digest)
+    if stat is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    headers = {
+        "ETag": f'"{digest}"',
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Accept-Ranges": "bytes",
+    }
+    if if_none_match and digest in if_none_match:
+        return Response(status_code=304, headers=headers)
+    size = stat.st_size
+    byte_range = parse_range(range_header, size) if range_header and size else None
+    start, end = byte_range or (0, size - 1)
+    headers["Content-Length"] = str(end - start + 1)
+    status_code = 200
+    if byte_range:
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    media_type = await run_in_threadpool(blob_store.media_type, digest)
+    return StreamingResponse(blob_store.iter_range(digest, start, end), status_code=status_code,
+                             media_type=media_type, headers=headers)
+
+async def generate_variants(project_id: str, image_url: str):
+    try:
+        rendered = await image_pipeline.render(image_url[len(IMAGE_URL_PREFIX):])
+    except Exception:
+        logger.exception("Failed to render image variants for portfolio project %s", project_id)
+        return
+    variants = {fmt: {width: IMAGE_URL_PREFIX + digest for width, digest in widths.items()}
+                for fmt, widths in rendered.items()}
+    await db.portfolio.update_one({"id": project_id, "image": image_url}, {"$set": {"variants": variants}})
+    await content_changed("portfolio")
+
+def schedule_variants(project_id: str, image_url: str):
+    if image_url.startswith(IMAGE_URL_PREFIX):
+        task = asyncio.create_task(generate_variants(project_id, image_url))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+
+async def migrate_inline_images():
+    """Move base64 images still embedded in portfolio documents into the blob store and queue their derivatives."""
+    migrated = 0
+    legacy = {"image": {"$type": "string", "$not": {"$regex": r"^(https?://|/api/images/)"}}}
+    async for project in db.portfolio.find(legacy, {"_id": 0, "id": 1, "image": 1}):
+        inline = project.get("image")
+        try:
+            url = await store_inline_image(inline)
+        except HTTPException as exc:
+            logger.warning("Skipping inline image of portfolio project %s: %s", project.get("id"), exc.detail)
+            continue
+        # Every worker runs this at startup; only the one that still finds the inline image swaps it
+        result = await db.portfolio.update_one({"id": project.get("id"), "image": inline}, {"$set": {"image": url}})
+        migrated += result.modified_count
+    if migrated:
+        await content_changed("portfolio")
+        logger.info("Moved %d inline portfolio images to the blob store", migrated)
+    # Uploads that have no derivatives yet, including the ones just migrated
+    pending = {"image": {"$regex": "^/api/images/"}, "variants": None}
+    async for project in db.portfolio.find(pending, {"_id": 0, "id": 1, "image": 1}):
+        schedule_variants(project["id"], project["image"])
+
+async def insert_portfolio_projects(projects: List[PortfolioProject]):
+    documents = [project.dict() for project in projects]
+    await db.portfolio.insert_many(documents)
+    await count_added(category_summary, documents)
+    await content_changed("portfolio")
+    for project in projects:
+        index_document("portfolio", project.dict())
+        schedule_variants(project.id, project.image)
 
 @api_router.post("/portfolio", response_model=PortfolioProject)
 async def create_portfolio_project(project: PortfolioProjectCreate):
     project_dict = project.dict()
+    if not is_image_url(project_dict["image"]):
+        project_dict["image"] = await store_inline_image(project_dict["image"])
     project_obj = PortfolioProject(**project_dict)
-    await db.portfolio.insert_one(project_obj.dict())
+    await insert_portfolio_projects([project_obj])
+    return project_obj
+
+@api_router.delete("/portfolio/{project_id}", status_code=204, dependencies=[Depends(require_admin)])
+async def delete_portfolio_project(project_id: str):
+    project = await db.portfolio.find_one_and_delete({"id": project_id}, {"_id": 0, "category": 1, "featured": 1})
+    if project is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    await count_removed(category_summary, [project])
+    await content_changed("portfolio")
+    unindex_document("portfolio", project_id)
+    return Response(status_code=204)
+
+# Multipart uploads, streamed into the blob store without holding files in memory
+async def receive_upload(request: Request, receiver: MultipartReceiver) -> MultipartReceiver:
+    try:
+        return await receive_multipart(request.stream(), request.headers.get("content-type"),
+                                       request.headers.get("content-length"), receiver, MAX_UPLOAD_BYTES)
+    except InvalidUpload as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except UploadTooLarge as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
+    except UnsupportedMediaType as exc:
+        raise HTTPException(status_code=415, detail=str(exc))
+
+async def discard_upload(receiver: MultipartReceiver):
+    """Delete the blobs a failed upload added to the store, unless a project has come to use one."""
+    for file in receiver.files:
+        if file.created and not await db.portfolio.find_one({"image": IMAGE_URL_PREFIX + file.digest}, {"_id": 1}):
+            await run_in_threadpool(blob_store.delete, file.digest)
+
+@api_router.post("/portfolio/upload", response_model=PortfolioProject)
+async def upload_portfolio_project(request: Request):
+    """Create a project from a multipart form with ``title``, ``category``, ``description``,
+    ``featured`` and an ``image`` file."""
+    receiver = MultipartReceiver(blob_store, max_file_bytes=MAX_IMAGE_BYTES, max_files=1)
+    try:
+        upload = await receive_upload(request, receiver)
+        image = next((file for file in upload.files if file.field == "image"), None)
+        if image is None:
+            raise HTTPException(status_code=400, detail="Missing image file")
+        try:
+            project = PortfolioProjectCreate(**{**upload.fields, "image": IMAGE_URL_PREFIX + image.digest})
+        except ValidationError as exc:
+            raise RequestValidationError(exc.errors())
+        project_obj = PortfolioProject(**project.dict())
+        await insert_portfolio_projects([project_obj])
+    except Exception:
+        await discard_upload(receiver)
+        raise
     return project_obj
 
+portfolio_manifest = TypeAdapter(List[PortfolioProjectCreate])
+
+@api_router.post("/portfolio/bulk", response_model=List[PortfolioProject])
+async def bulk_upload_portfolio(request: Request):
+    """Create many projects from one multipart upload.
+
+    The ``projects`` field is a JSON array of projects whose ``image`` is a URL or the
+    name of a file part of the same upload.
+    """
+    receiver = MultipartReceiver(blob_store, max_file_bytes=MAX_IMAGE_BYTES, max_files=MAX_UPLOAD_FILES)
+    try:
+        upload = await receive_upload(request, receiver)
+        files = {file.field: file for file in upload.files}
+        try:
+            manifest = portfolio_manifest.validate_json(upload.fields.get("projects", ""))
+        except ValidationError as exc:
+            raise RequestValidationError(exc.errors())
+        projects = []
+        for position, item in enumerate(manifest):
+            project_dict = item.dict()
+            if item.image in files:
+                project_dict["image"] = IMAGE_URL_PREFIX + files[item.image].digest
+            elif not is_image_url(item.image):
+                raise HTTPException(status_code=400,
+                                    detail=f"projects[{position}].image is neither a URL nor an uploaded file")
+            projects.append(PortfolioProject(**project_dict))
+        if projects:
+            await insert_portfolio_projects(projects)
+    except Exception:
+        await discard_upload(receiver)
+        raise
+    return projects
+
 # Services endpoints
 @api_router.get("/services", response_model=List[Service])
-async def get_services():
-    services = await db.services.find({"active": True}).sort("order", 1).to_list(1000)
-    return [Service(**service) for service in services]
+async def get_services(fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+                       accept_encoding: Optional[str] = Header(None), if_none_match: Optional[str] = Header(None)):
+    projection, fields_key = sparse_fields(Service, fields)
+    return await cached_json("services", f"list:{fields_key}" if fields_key else "list",
+                             partial(load_services, projection), accept_encoding, if_none_match,
+                             strong=not fields_key)
 
 # Contact endpoints
+async def insert_ignoring_duplicates(collection, documents: List[dict]):
+    """Unordered ``insert_many`` that treats already-present ids as success, so replays are harmless."""
+    try:
+        await collection.insert_many(documents, ordered=False)
+    except BulkWriteError as exc:
+        if any(error["code"] != 11000 for error in exc.details["writeErrors"]):
+            raise
+
+async def store_contact_submissions(submissions: List[dict]):
+    await insert_ignoring_duplicates(db.contact_submissions, submissions)
+    if notifier.channels:
+        records = [record for submission in submissions for record in outbox_records(submission, notifier.channels)]
+        await insert_ignoring_duplicates(db.notification_outbox, records)
+        notifier.wake()
+
+# E-mail/Telegram notifications are delivered from the outbox by background workers
+notifier = NotificationDispatcher(
+    db.notification_outbox,
+    channels_from_env(os.environ),
+    workers_per_channel=int(os.environ.get('NOTIFY_WORKERS', 2)),
+    max_attempts=int(os.environ.get('NOTIFY_MAX_ATTEMPTS', 8)),
+)
+
+# Submissions are acknowledged once journaled and written to Mongo in batches
+contact_queue = WriteBehindQueue(
+    store_contact_submissions,
+    journal_dir=Path(os.environ.get('JOURNAL_DIR', ROOT_DIR / 'journal')),
+    name="contact_submissions",
+    max_batch=int(os.environ.get('CONTACT_BATCH_SIZE', 500)),
+    max_delay=float(os.environ.get('CONTACT_BATCH_DELAY', 0.25)),
+    fsync=os.environ.get('JOURNAL_FSYNC', '').lower() in ('1', 'true', 'yes'),
+)
+
+# Spam protection, checked in memory before a submission is queued: token buckets per client
+# IP and per e-mail address, and a rolling Bloom filter of recent submissions' fingerprints
+CONTACT_LIMIT_KEYS = int(os.environ.get('CONTACT_LIMIT_KEYS', 100_000))
+contact_ip_limits = TokenBuckets(
+    rate=float(os.environ.get('CONTACT_IP_PER_HOUR', 20)) / 3600,
+    capacity=float(os.environ.get('CONTACT_IP_BURST', 5)),
+    max_keys=CONTACT_LIMIT_KEYS,
+)
+contact_email_limits = TokenBuckets(
+    rate=float(os.environ.get('CONTACT_EMAIL_PER_HOUR', 6)) / 3600,
+    capacity=float(os.environ.get('CONTACT_EMAIL_BURST', 3)),
+    max_keys=CONTACT_LIMIT_KEYS,
+)
+recent_contacts = RollingBloomFilter(
+    capacity=int(os.environ.get('CONTACT_DUPLICATE_CAPACITY', 100_000)),
+    window=float(os.environ.get('CONTACT_DUPLICATE_WINDOW_SECONDS', 86400)),
+)
+# Number of reverse proxies that append to X-Forwarded-For; 0 trusts only the socket peer
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))
+contact_rejections = metrics.counter("contact_rejected_total",
+                                     "Contact submissions refused for rate limits or dropped as duplicates.")
+
+CONTACT_ACCEPTED = {"success": True, "message": "Спасибо за обращение! Мы свяжемся с вами в ближайшее время."}
+
+def client_ip(request: Request) -> str:
+    if TRUSTED_PROXY_HOPS:
+        forwarded = [address.strip() for address in request.headers.get("x-forwarded-for", "").split(",")]
+        forwarded = [address for address in forwarded if address]
+        if len(forwarded) >= TRUSTED_PROXY_HOPS:
+            return forwarded[-TRUSTED_PROXY_HOPS]
+    return request.client.host if request.client else ""
+
 @api_router.post("/contact")
-async def submit_contact(contact: ContactSubmissionCreate):
+async def submit_contact(contact: ContactSubmissionCreate, request: Request):
+    submission = fingerprint(contact.email, contact.message)
+    if submission in recent_contacts:
+        # Answered like any other and charged to no limit, so a double click is harmless
+        # and a bot learns nothing
+        contact_rejections.inc(reason="duplicate")
+        return CONTACT_ACCEPTED
+    ip, email = client_ip(request), contact.email.strip().casefold()
+    # Both buckets must have a token before either is charged, so a refused request costs nothing
+    wait = max(contact_ip_limits.wait(ip), contact_email_limits.wait(email))
+    if wait:
+        contact_rejections.inc(reason="rate_limited")
+        raise HTTPException(status_code=429, detail="Слишком много заявок, попробуйте позже",
+                            headers={"Retry-After": str(math.ceil(wait))})
+    contact_ip_limits.acquire(ip)
+    contact_email_limits.acquire(email)
     contact_dict = contact.dict()
     contact_obj = ContactSubmission(**contact_dict)
-    await db.contact_submissions.insert_one(contact_obj.dict())
-    
-    # TODO: Add SMTP and Telegram integration here
-    return {"success": True, "message": "Спасибо за обращение! Мы свяжемся с вами в ближайшее время."}
+    try:
+        await contact_queue.put(contact_obj.dict())
+    except QueueFull:
+        logger.error("Contact submission rejected: write-behind queue is full")
+        raise HTTPException(status_code=503, detail="Сервис временно перегружен, попробуйте позже")
+    # Only remembered once accepted, so a retry after a 503 is not taken for a duplicate
+    recent_contacts.add(submission)
+    return CONTACT_ACCEPTED
 
-# Price calculator endpoint
+@api_router.get("/contact/export", dependencies=[Depends(require_admin)])
+async def export_contacts(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    status: Optional[str] = None,
+    after: Optional[str] = None,
+):
+    """Stream submissions created in ``[since, until)``, oldest first, as NDJSON or CSV.
+
+    ``after`` is the id of the last row of an interrupted export, which then resumes right after it.
+    """
+    resume = None
+    if after:
+        resume = await resume_point(db.contact_submissions, after)
+        if resume is None:
+            raise HTTPException(status_code=400, detail="Unknown submission id in after")
+    documents = iter_submissions(db.contact_submissions, since, until, status, resume)
+    chunks = (chunk async for chunk, _ in export_chunks(documents, format))
+    filename = f"contacts-{datetime.utcnow():%Y%m%d-%H%M%S}.{format}"
+    return StreamingResponse(chunks, media_type=MEDIA_TYPES[format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+# Price calculator endpoints
 @api_router.post("/calculate-price", response_model=PriceCalculationResult)
 async def calculate_price(calculation: PriceCalculation):
-    # Pricing logic based on tier and area
-    base_prices = {
-        "basic": 1500,    # ₽ per m²
-        "standard": 3500, # ₽ per m²
-        "premium": 7000   # ₽ per m²
-    }
-    
-    if calculation.tier not in base_prices:
+    try:
+        breakdown = pricing.table.quote(calculation.area, calculation.tier, calculation.options)
+    except UnknownTier:
         raise HTTPException(status_code=400, detail="Invalid tier")
-    
-    base_price = base_prices[calculation.tier]
-    total_price = base_price * calculation.area
-    
-    # Add complexity multiplier for larger areas
-    if calculation.area > 50:
-        total_price *= 0.9  # 10% discount for large areas
-    elif calculation.area > 20:
-        total_price *= 0.95  # 5% discount for medium areas
-    
-    breakdown = {
-        "base_price_per_m2": base_price,
-        "area": calculation.area,
-        "subtotal": base_price * calculation.area,
-        "discount": 0 if calculation.area <= 20 else (5 if calculation.area <= 50 else 10),
-        "total": total_price,
-        "tier_description": {
-            "basic": "Простое художественное оформление",
-            "standard": "Детализированная работа с элементами",
-            "premium": "Премиальная работа с максимальной детализацией"
-        }[calculation.tier]
-    }
+    except UnknownOption as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid option: {exc}")
     
     return PriceCalculationResult(
-        price=total_price,
+        price=breakdown["total"],
         breakdown=breakdown,
         tier=calculation.tier,
         area=calculation.area
     )
 
+@api_router.post("/calculate-price/batch", response_model=BatchPriceCalculationResult)
+async def calculate_price_batch(request: BatchPriceCalculation):
+    """Quote many rows, or every tier over an area sweep, in one vectorized pass."""
+    if request.rows:
+        areas = [row.area for row in request.rows]
+        tiers = [row.tier for row in request.rows]
+        options = [row.options for row in request.rows]
+    elif request.sweep:
+        sweep = request.sweep
+        if sweep.step <= 0 or sweep.area_to < sweep.area_from:
+            raise HTTPException(status_code=400, detail="Invalid sweep range")
+        steps = int((sweep.area_to - sweep.area_from) / sweep.step + 1e-9) + 1
+        if steps * len(sweep.tiers) > MAX_BATCH_QUOTES:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUOTES} quotes per request")
+        sweep_areas = sweep.area_from + np.arange(steps) * sweep.step
+        areas = np.tile(sweep_areas, len(sweep.tiers))
+        tiers = np.repeat(np.asarray(sweep.tiers, dtype=object), steps)
+        options = [sweep.options] * len(areas) if sweep.options else None
+    else:
+        raise HTTPException(status_code=400, detail="Provide rows or sweep")
+    if len(areas) > MAX_BATCH_QUOTES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUOTES} quotes per request")
+
+    table = pricing.table
+    try:
+        quotes = table.quote_batch(areas, tiers, options)
+    except UnknownTier as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid tier: {exc}")
+    except UnknownOption as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid option: {exc}")
+
+    tier_indexes = quotes["tier_index"]
+    columns = zip(*(quotes[name].tolist() for name in (
+        "tier_index", "base_price_per_m2", "area", "subtotal", "discount", "surcharge", "minimum_charge", "total")))
+    results = [
+        {
+            "price": total,
+            "breakdown": {
+                "base_price_per_m2": price,
+                "area": area,
+                "subtotal": subtotal,
+                "discount": discount,
+                "surcharge": surcharge,
+                "minimum_charge": minimum_charge,
+                "total": total,
+                "tier_description": table.descriptions[tier],
+            },
+            "tier": table.tiers[tier],
+            "area": area,
+        }
+        for tier, price, area, subtotal, discount, surcharge, minimum_charge, total in columns
+    ]
+    counts = np.bincount(tier_indexes, minlength=len(table.tiers))
+    by_tier = {
+        name: {
+            "count": int(counts[i]),
+            "area": float(quotes["area"][tier_indexes == i].sum()),
+            "subtotal": float(quotes["subtotal"][tier_indexes == i].sum()),
+            "total": float(quotes["total"][tier_indexes == i].sum()),
+        }
+        for i, name in enumerate(table.tiers) if counts[i]
+    }
+    totals = {
+        "count": len(results),
+        "area": float(quotes["area"].sum()),
+        "subtotal": float(quotes["subtotal"].sum()),
+        "total": float(quotes["total"].sum()),
+        "by_tier": by_tier,
+    }
+    return Response(content=dump_json({"results": results, "totals": totals}), media_type="application/json")
+
+@api_router.get("/pricing-rules")
+async def get_pricing_rules():
+    return {"revision": pricing.table.revision, **pricing.rules}
+
+@api_router.put("/pricing-rules", dependencies=[Depends(require_admin)])
+async def replace_pricing_rules(rules: PricingRules):
+    """Store a new ruleset revision; every instance picks it up within PRICING_RELOAD_SECONDS."""
+    try:
+        revision = await pricing.replace(rules.dict())
+    except InvalidRules as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"revision": revision}
+
 # Content endpoints
 @api_router.get("/testimonials", response_model=List[Testimonial])
-async def get_testimonials():
-    testimonials = await db.testimonials.find({"approved": True}).to_list(1000)
-    return [Testimonial(**testimonial) for testimonial in testimonials]
+async def get_testimonials(fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+                           accept_encoding: Optional[str] = Header(None), if_none_match: Optional[str] = Header(None)):
+    projection, fields_key = sparse_fields(Testimonial, fields)
+    return await cached_json("testimonials", f"list:{fields_key}" if fields_key else "list",
+                             partial(load_testimonials, projection), accept_encoding, if_none_match,
+                             strong=not fields_key)
 
 @api_router.get("/faqs", response_model=List[FAQ])
-async def get_faqs():
-    faqs = await db.faqs.find({"active": True}).sort("order", 1).to_list(1000)
-    return [FAQ(**faq) for faq in faqs]
+async def get_faqs(fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+                   accept_encoding: Optional[str] = Header(None), if_none_match: Optional[str] = Header(None)):
+    projection, fields_key = sparse_fields(FAQ, fields)
+    return await cached_json("faqs", f"list:{fields_key}" if fields_key else "list",
+                             partial(load_faqs, projection), accept_encoding, if_none_match,
+                             strong=not fields_key)
 
 @api_router.get("/process", response_model=List[ProcessStep])
-async def get_process_steps():
-    steps = await db.process_steps.find({"active": True}).sort("step", 1).to_list(1000)
-    return [ProcessStep(**step) for step in steps]
+async def get_process_steps(fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+                            accept_encoding: Optional[str] = Header(None), if_none_match: Optional[str] = Header(None)):
+    projection, fields_key = sparse_fields(ProcessStep, fields)
+    return await cached_json("process_steps", f"list:{fields_key}" if fields_key else "list",
+                             partial(load_process_steps, projection), accept_encoding, if_none_match,
+                             strong=not fields_key)
+
+# Metrics endpoint
+metrics.gauge("response_cache_entries", "Cached response bodies.", lambda: response_cache.stats()["entries"])
+metrics.gauge("response_cache_bytes", "Size of the cached response bodies.", lambda: response_cache.stats()["bytes"])
+metrics.gauge("response_cache_hits_total", "Response cache hits.", lambda: response_cache.hits, kind="counter")
+metrics.gauge("response_cache_misses_total", "Response cache misses.", lambda: response_cache.misses, kind="counter")
+metrics.gauge("cache_fills_in_flight", "Cache misses being loaded.", lambda: len(cache_fills))
+metrics.gauge("cache_fill_loads_total", "Loads run to fill cache misses.", lambda: cache_fills.loads, kind="counter")
+metrics.gauge("cache_fill_coalesced_total", "Cache misses served by another request's load instead of their own.",
+              lambda: cache_fills.coalesced, kind="counter")
+metrics.gauge("contact_queue_pending", "Contact submissions not yet written to Mongo.", lambda: contact_queue.pending)
+metrics.gauge("contact_queue_accepted_total", "Contact submissions accepted.", lambda: contact_queue.accepted,
+              kind="counter")
+metrics.gauge("notifications_sent_total", "Notifications delivered.", lambda: notifier.sent, kind="counter")
+metrics.gauge("notifications_failed_total", "Notifications given up on.", lambda: notifier.failed, kind="counter")
+metrics.gauge("stream_clients", "Connected /api/stream clients.", lambda: change_feed.subscribers)
+metrics.gauge("stream_events_total", "Events sent to /api/stream clients.", lambda: change_feed.events, kind="counter")
+metrics.gauge("stream_overflows_total", "Clients reset for falling behind the change stream.",
+              lambda: change_feed.overflows, kind="counter")
+metrics.gauge("pricing_rules_revision", "Revision of the pricing rules in use.", lambda: pricing.table.revision)
+
+@api_router.get("/metrics")
+async def get_metrics():
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 # Seed data endpoint (for development)
 @api_router.post("/seed-data")
 async def seed_data():
-    # Clear existing data completely
-    await db.portfolio.delete_many({})
-    await db.services.delete_many({})
-    await db.testimonials.delete_many({})
-    await db.faqs.delete_many({})
-    await db.process_steps.delete_many({})
-    
     # Sample portfolio projects with real images (NO DUPLICATES)
     portfolio_projects = [
         {
@@ -451,12 +1313,17 @@ async def seed_data():
         }
     ]
     
-    # Insert data
-    await db.portfolio.insert_many(portfolio_projects)
-    await db.services.insert_many(services)
-    await db.testimonials.insert_many(testimonials)
-    await db.faqs.insert_many(faqs)
-    await db.process_steps.insert_many(process_steps)
+    # Swap the new data in through staging collections, so readers never see it empty or partial
+    await replace_collections(db, {
+        "portfolio": portfolio_projects,
+        "services": services,
+        "testimonials": testimonials,
+        "faqs": faqs,
+        "process_steps": process_steps,
+    })
+    await rebuild_counts(db.portfolio)
+    await content_changed(*CONTENT_COLLECTIONS)
+    schedule_search_rebuild()
     
     return {"message": "Данные успешно загружены"}
 
@@ -469,7 +1336,13 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
+# Not for the event stream, which the compressor would buffer, nor for already compressed images
+app.add_middleware(SelectiveGZipMiddleware, minimum_size=COMPRESS_MIN_BYTES,
+                   excluded=("/api/stream", IMAGE_URL_PREFIX))
+# Outermost, so request timings include compression
+app.add_middleware(MetricsMiddleware, registry=metrics)
 
 # Configure logging
 logging.basicConfig(
@@ -478,6 +1351,55 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    await drop_stale_staging(db)
+    await ensure_indexes(db)
+
+@app.on_event("startup")
+async def build_category_counts():
+    # Databases from before the summary existed, or filled behind the API's back
+    if await category_summary.count_documents({}, limit=1) == 0 and await db.portfolio.count_documents({}, limit=1):
+        await rebuild_counts(db.portfolio)
+
+@app.on_event("startup")
+async def load_collection_versions():
+    await versions.start()
+
+@app.on_event("startup")
+async def start_change_feed():
+    await change_feed.start()
+
+@app.on_event("startup")
+async def start_inline_image_migration():
+    app.state.image_migration = asyncio.create_task(migrate_inline_images())
+
+@app.on_event("startup")
+async def load_pricing_rules():
+    await pricing.start()
+
+@app.on_event("startup")
+async def start_contact_queue():
+    await contact_queue.start()
+    notifier.start()
+
+@app.on_event("startup")
+async def start_search_index():
+    schedule_search_rebuild()
+
+@app.on_event("startup")
+async def seed_empty_database():
+    # The landing page no longer seeds on every visit; fill a fresh database once instead
+    if await db.services.count_documents({}, limit=1) == 0:
+        await seed_data()
+        logger.info("Seeded empty database with sample content")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    await contact_queue.stop()
+    await notifier.stop()
+    await pricing.stop()
+    await versions.stop()
+    await change_feed.stop()
+    client.close()
+    image_pipeline.shutdown()
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""In-memory defences for the contact form: rate limits and duplicate suppression.
+
+``TokenBuckets`` keeps one token bucket per key (client IP, e-mail address):
+``capacity`` submissions at once, refilled at ``rate`` per second. Buckets live
+in an LRU dict of at most ``max_keys`` entries. A bucket untouched for
+``capacity / rate`` seconds is full again anyway, so evicting the least recently
+used one loses nothing unless the table is too small for the traffic, and then
+it errs towards letting a request through.
+
+``RollingBloomFilter`` remembers fingerprints of recent submissions in two
+generations of Bloom filter bits. New fingerprints go into the current one;
+when it holds ``capacity`` of them or is ``window`` seconds old it becomes the
+previous one and the old previous one is forgotten, so memory is fixed and a
+fingerprint is remembered for at least ``window`` seconds (or ``capacity``
+newer submissions). The false-positive rate is kept tiny, because a false
+positive silently drops a genuine enquiry.
+
+Everything runs on the event loop thread, costs a few microseconds, and never
+touches the database.
+"""
+import hashlib
+import math
+import re
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+_PUNCTUATION_RE = re.compile(r"[^\w]+")
+
+
+def fingerprint(email: str, message: str) -> bytes:
+    """Identity of a submission, insensitive to case, "ё"/"е", punctuation and spacing."""
+    text = message.casefold().replace("ё", "е")
+    normalized = " ".join(_PUNCTUATION_RE.sub(" ", text).split())
+    return hashlib.blake2b(f"{email.strip().casefold()}\0{normalized}".encode(), digest_size=16).digest()
+
+
+class TokenBuckets:
+    def __init__(self, rate: float, capacity: float, max_keys: int = 100_000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets: "OrderedDict[Hashable, list]" = OrderedDict()  # key -> [tokens, updated at]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _bucket(self, key: Hashable) -> list:
+        now = self.clock()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.capacity, now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        return bucket
+
+    def wait(self, key: Hashable, cost: float = 1.0) -> float:
+        """Seconds until ``key``'s bucket holds ``cost`` tokens (0 if it does now), taking none."""
+        tokens = self._bucket(key)[0]
+        return 0.0 if tokens >= cost else (cost - tokens) / self.rate
+
+    def acquire(self, key: Hashable, cost: float = 1.0) -> float:
+        """Take ``cost`` tokens from ``key``'s bucket; 0 if it had them, else seconds until it will."""
+        bucket = self._bucket(key)
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            return 0.0
+        return (cost - bucket[0]) / self.rate
+
+
+class RollingBloomFilter:
+    def __init__(self, capacity: int = 100_000, error_rate: float = 1e-6, window: float = 86400.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.capacity = capacity
+        self.window = window
+        self.clock = clock
+        # Optimal size and hash count for ``capacity`` items at ``error_rate`` per generation
+        self.bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self._current = bytearray((self.bits + 7) // 8)
+        self._previous = bytearray(len(self._current))
+        self._count = 0
+        self._started = clock()
+
+    def _positions(self, item: bytes):
+        digest = hashlib.blake2b(item, digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        # Double hashing: k positions from two 64-bit hashes
+        return [(first + i * second) % self.bits for i in range(self.hashes)]
+
+    @staticmethod
+    def _contains(bits: bytearray, positions) -> bool:
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in positions)
+
+    def __contains__(self, item: bytes) -> bool:
+        """Whether ``item`` was (probably) added within the window."""
+        positions = self._positions(item)
+        return self._contains(self._current, positions) or self._contains(self._previous, positions)
+
+    def add(self, item: bytes) -> None:
+        if self._count >= self.capacity or self.clock() - self._started >= self.window:
+            self._previous, self._current = self._current, bytearray(len(self._current))
+            self._count = 0
+            self._started = self.clock()
+        for position in self._positions(item):
+            self._current[position >> 3] |= 1 << (position & 7)
+        self._count += 1
@@ -0,0 +1,54 @@
+"""Replace whole collections without readers seeing them empty or half-filled.
+
+The new contents are written into uniquely named staging collections, indexed
+there, and only then renamed over the live ones with ``renameCollection``
+(``dropTarget=True``). Each rename swaps one collection atomically, so a reader
+sees either the complete old contents or the complete new ones, and dropping
+the old collection wholesale is much cheaper than deleting it document by
+document.
+"""
+import logging
+import time
+import uuid
+from typing import Dict, List
+
+from indexes import create_collection_indexes
+
+logger = logging.getLogger(__name__)
+
+STAGING_MARKER = "__staging_"
+
+
+async def replace_collections(db, contents: Dict[str, List[dict]], chunk_size: int = 5000) -> None:
+    """Make each collection in ``contents`` hold exactly the given documents."""
+    token = f"{int(time.time())}_{uuid.uuid4().hex[:8]}"
+    staged = {name: f"{name}{STAGING_MARKER}{token}" for name in contents}
+    try:
+        for name, documents in contents.items():
+            staging = db[staged[name]]
+            await db.create_collection(staging.name)
+            for start in range(0, len(documents), chunk_size):
+                await staging.insert_many(documents[start:start + chunk_size], ordered=False)
+            # Indexes are built before the swap, so the renamed collection is immediately queryable
+            await create_collection_indexes(staging, name)
+    except Exception:
+        for staging in staged.values():
+            await db.drop_collection(staging)
+        raise
+    # Every collection is fully staged before the first swap, so a failed load leaves all of them untouched
+    for name, staging in staged.items():
+        await db[staging].rename(name, dropTarget=True)
+
+
+async def drop_stale_staging(db, max_age: float = 3600) -> None:
+    """Drop staging collections left behind by a process that died mid-replacement.
+
+    Only those older than ``max_age`` seconds, so another instance's replacement in progress is left alone.
+    """
+    for name in await db.list_collection_names():
+        if STAGING_MARKER not in name:
+            continue
+        created = name.split(STAGING_MARKER, 1)[1].split("_", 1)[0]
+        if created.isdigit() and time.time() - int(created) > max_age:
+            logger.warning("Dropping leftover staging collection %s", name)
+            await db.drop_collection(name)
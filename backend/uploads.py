@@ -0,0 +1,175 @@
+"""Streaming ``multipart/form-data`` uploads straight into the blob store.
+
+The request body is fed to python-multipart's callback parser chunk by chunk
+as it arrives. File parts are written to a ``BlobWriter``, hashed along the
+way, and never held in memory; text fields are kept, up to a small cap. Limits
+are checked as bytes arrive: a declared ``Content-Length`` over the total is
+refused before anything is read, and a file that passes the per-file limit,
+or whose first bytes are not an image, stops the upload then and there.
+
+Parsing, hashing and disk writes run in the threadpool, one chunk at a time,
+so memory use is bounded by the chunk size however large the files are.
+"""
+from dataclasses import dataclass
+from typing import AsyncIterable, Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from blobstore import BlobStore, BlobWriter, sniff_media_type
+
+
+class InvalidUpload(Exception):
+    pass
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class UnsupportedMediaType(Exception):
+    pass
+
+
+@dataclass
+class StoredFile:
+    field: str
+    filename: str
+    digest: str
+    size: int
+    media_type: str
+    created: bool  # stored by this upload, not already in the store
+
+
+class MultipartReceiver:
+    """Callbacks for ``MultipartParser`` that store file parts and collect text fields."""
+
+    def __init__(self, store: BlobStore, max_file_bytes: int, max_files: int,
+                 max_field_bytes: int = 1024 * 1024, max_fields: int = 100):
+        self.store = store
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.max_field_bytes = max_field_bytes
+        self.max_fields = max_fields
+        self.fields: Dict[str, str] = {}
+        self.files: List[StoredFile] = []
+        self._header_field = b""
+        self._header_value = b""
+        self._headers: Dict[bytes, bytes] = {}
+        self._name = ""
+        self._filename: Optional[str] = None
+        self._value = bytearray()
+        self._writer: Optional[BlobWriter] = None
+        self.complete = False
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_end": self.on_end,
+        }
+
+    def on_part_begin(self) -> None:
+        self._headers = {}
+        self._value = bytearray()
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        disposition, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if disposition != b"form-data" or b"name" not in options:
+            raise InvalidUpload("Part without a form-data Content-Disposition")
+        self._name = options[b"name"].decode("utf-8", "replace")
+        filename = options.get(b"filename")
+        self._filename = filename.decode("utf-8", "replace") if filename is not None else None
+        if self._filename is not None:
+            if len(self.files) >= self.max_files:
+                raise UploadTooLarge(f"At most {self.max_files} files per upload")
+            self._writer = self.store.writer()
+        elif len(self.fields) >= self.max_fields:
+            raise InvalidUpload(f"At most {self.max_fields} fields per upload")
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._writer is None:
+            if len(self._value) + end - start > self.max_field_bytes:
+                raise UploadTooLarge(f"Field {self._name} is too large")
+            self._value += data[start:end]
+            return
+        writer = self._writer
+        had_head = len(writer.head) >= writer.HEAD_BYTES
+        writer.write(data[start:end])
+        if writer.size > self.max_file_bytes:
+            raise UploadTooLarge(f"{self._filename} is too large")
+        if not had_head and len(writer.head) >= writer.HEAD_BYTES:
+            self._check_image(writer.head)
+
+    def on_part_end(self) -> None:
+        if self._writer is None:
+            self.fields[self._name] = self._value.decode("utf-8", "replace")
+            return
+        writer, self._writer = self._writer, None
+        with writer:
+            media_type = self._check_image(writer.head)  # files shorter than the sniffed head
+            digest = writer.commit()
+        self.files.append(StoredFile(self._name, self._filename, digest, writer.size, media_type, writer.created))
+
+    def on_end(self) -> None:
+        self.complete = True
+
+    def abort(self) -> None:
+        if self._writer is not None:
+            self._writer.abort()
+            self._writer = None
+
+    def _check_image(self, head: bytes) -> str:
+        media_type = sniff_media_type(head)
+        if not media_type.startswith("image/"):
+            raise UnsupportedMediaType(f"{self._filename} is not a JPEG, PNG, GIF, WebP or AVIF image")
+        return media_type
+
+
+async def receive_multipart(body: AsyncIterable[bytes], content_type: Optional[str],
+                            content_length: Optional[str], receiver: MultipartReceiver,
+                            max_bytes: int) -> MultipartReceiver:
+    """Parse a streamed ``multipart/form-data`` body into ``receiver``, enforcing ``max_bytes`` overall."""
+    media_type, options = parse_options_header(content_type or "")
+    if media_type != b"multipart/form-data" or b"boundary" not in options:
+        raise InvalidUpload("Expected multipart/form-data")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise UploadTooLarge("Upload is too large")
+    parser = MultipartParser(options[b"boundary"], receiver.callbacks())
+    received = 0
+    try:
+        async for chunk in body:
+            received += len(chunk)
+            if received > max_bytes:
+                raise UploadTooLarge("Upload is too large")
+            if chunk:
+                await run_in_threadpool(parser.write, chunk)
+        parser.finalize()
+        if not receiver.complete:
+            raise InvalidUpload("Upload ended before its closing boundary")
+    except ValueError as exc:  # python-multipart's parse errors
+        receiver.abort()
+        raise InvalidUpload(str(exc))
+    except BaseException:
+        receiver.abort()
+        raise
+    return receiver
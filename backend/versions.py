@@ -0,0 +1,84 @@
+"""Per-collection version stamps for conditional GETs.
+
+Every write to a content collection increments that collection's counter in
+``collection_versions``. The counters are mirrored in memory, so an ETag is a
+dict lookup and an ``If-None-Match`` that still matches is answered with 304
+before Mongo is touched. A background poll picks up writes made by other
+instances and reports which collections changed, so their cached responses can
+be dropped as well.
+"""
+import asyncio
+import logging
+from typing import Callable, Dict, Iterable, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+
+def matching_etag(if_none_match: Optional[str], etag: str) -> Optional[str]:
+    """The tag in ``If-None-Match`` that still matches ``etag``, by weak comparison as the header requires.
+
+    A ``-br``/``-gzip`` suffix (the ETag of an encoded response) is ignored.
+    """
+    if not if_none_match:
+        return None
+    if if_none_match.strip() == "*":
+        return etag
+    opaque = etag.strip('"')
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        value = tag[2:] if tag.startswith("W/") else tag
+        value = value.strip('"')
+        if value == opaque or value.rsplit("-", 1)[0] == opaque:
+            return tag
+    return None
+
+
+class CollectionVersions:
+    def __init__(self, collection, poll_interval: float = 5.0,
+                 on_change: Optional[Callable[[Iterable[str]], None]] = None):
+        self.collection = collection
+        self.poll_interval = poll_interval
+        self.on_change = on_change
+        self.versions: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        await self.refresh()
+        self._task = asyncio.create_task(self._poll())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def etag(self, *names: str) -> str:
+        """Strong ETag of a response built from collections ``names``."""
+        return '"' + ".".join(str(self.versions.get(name, 0)) for name in names) + '"'
+
+    async def bump(self, *names: str) -> None:
+        for name in names:
+            document = await self.collection.find_one_and_update(
+                {"collection": name}, {"$inc": {"version": 1}},
+                upsert=True, return_document=ReturnDocument.AFTER, projection={"_id": 0, "version": 1},
+            )
+            self.versions[name] = max(self.versions.get(name, 0), document["version"])
+
+    async def refresh(self) -> None:
+        changed = []
+        async for document in self.collection.find({}, {"_id": 0, "collection": 1, "version": 1}):
+            name, version = document["collection"], document["version"]
+            if version > self.versions.get(name, 0):
+                changed.append(name)
+                self.versions[name] = version
+        if changed and self.on_change is not None:
+            self.on_change(changed)
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Failed to refresh collection versions")
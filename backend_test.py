@@ -84,7 +84,7 @@ class BackendTester:
             if response.status_code == 200:
                 data = response.json()
                 if "categories" in data and isinstance(data["categories"], list):
-                    categories = data["categories"]
+                    categories = [entry["category"] for entry in data["categories"]]
                     expected_categories = ['murals', 'portraits', 'commercial', 'abstract', 'automotive']
                     if any(cat in categories for cat in expected_categories):
                         self.log_test("GET Portfolio Categories", True, f"Categories: {categories}")
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import './App.css';
 import {
   Palette,
@@ -24,6 +24,32 @@ import {
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Uploaded images are served by the backend under /api/images/<hash>
+const imageUrl = (src) => (src && src.startsWith('/api/') ? `${BACKEND_URL}${src}` : src);
+
+// Builds a srcset string from a { width: url } map of resized variants
+const srcSet = (variants) => Object.entries(variants || {})
+  .map(([width, src]) => `${imageUrl(src)} ${width}w`)
+  .join(', ');
+
+// Grid cells are full width on mobile, half on md and a third on lg screens
+const portfolioSizes = '(min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw';
+
+// Changes pushed over /api/stream, re-dispatched by collection name to the sections showing them
+const contentChanges = new EventTarget();
+
+// Calls handler with every change ({ operation, document } or { operation: 'delete', id })
+// and reset ({ operation: 'reset' }) of a collection while the component is mounted
+const useContentChanges = (collection, handler) => {
+  const handlerRef = useRef(handler);
+  handlerRef.current = handler;
+  useEffect(() => {
+    const listener = (event) => handlerRef.current(event.detail);
+    contentChanges.addEventListener(collection, listener);
+    return () => contentChanges.removeEventListener(collection, listener);
+  }, [collection]);
+};
+
 // Icon mapping for services and process steps
 const iconMap = {
   Palette: Palette,
@@ -193,50 +219,102 @@ const Hero = () => {
 };
 
 // Portfolio Section
-const Portfolio = () => {
+const uniqueProjects = (data) => data.filter((project, index, self) =>
+  index === self.findIndex(p => p.title === project.title && p.category === project.category)
+);
+
+// Filter chips from the server's per-category counts, led by 'all' with the grand total
+const categoryChips = (counts) => [
+  { category: 'all', count: counts.reduce((total, entry) => total + entry.count, 0) },
+  ...counts
+];
+
+const Portfolio = ({ landing }) => {
   const [projects, setProjects] = useState([]);
   const [categories, setCategories] = useState([]);
   const [activeCategory, setActiveCategory] = useState('all');
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState(null);
 
   useEffect(() => {
-    fetchPortfolio();
-    fetchCategories();
-  }, []);
-
-  const fetchPortfolio = async () => {
+    if (!landing) return;
+    if (landing.error) {
+      setError(landing.error);
+    } else {
+      setProjects(uniqueProjects(landing.portfolio));
+      setNextCursor(landing.portfolio_next_cursor);
+      setCategories(categoryChips(landing.categories));
+    }
+    setLoading(false);
+  }, [landing]);
+
+  // Filtering and paging happen on the server; a cursor appends the next page.
+  // 'no-cache' revalidates with the stored ETag, so an unchanged page costs a 304.
+  const fetchPortfolio = async (category = activeCategory, cursor = null) => {
+    const params = new URLSearchParams();
+    if (category !== 'all') params.set('category', category);
+    if (cursor) params.set('cursor', cursor);
     try {
-      const response = await fetch(`${API}/portfolio`);
+      const response = await fetch(`${API}/portfolio?${params}`, { cache: 'no-cache' });
       if (!response.ok) throw new Error('Не удалось загрузить портфолио');
       const data = await response.json();
-      const uniqueProjects = data.filter((project, index, self) =>
-        index === self.findIndex(p => p.title === project.title && p.category === project.category)
-      );
-      setProjects(uniqueProjects);
+      setProjects(previous => uniqueProjects(cursor ? [...previous, ...data] : data));
+      setNextCursor(response.headers.get('X-Next-Cursor'));
       setError(null);
     } catch (error) {
       console.error('Error fetching portfolio:', error);
       setError(error.message);
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
+  const selectCategory = (category) => {
+    setActiveCategory(category);
+    setLoading(true);
+    fetchPortfolio(category);
+  };
+
+  const loadMore = () => {
+    setLoadingMore(true);
+    fetchPortfolio(activeCategory, nextCursor);
+  };
+
   const fetchCategories = async () => {
     try {
-      const response = await fetch(`${API}/portfolio/categories`);
+      const response = await fetch(`${API}/portfolio/categories`, { cache: 'no-cache' });
       if (!response.ok) throw new Error('Не удалось загрузить категории');
       const data = await response.json();
-      setCategories(['all', ...data.categories]);
+      setCategories(categoryChips(data.categories));
     } catch (error) {
       console.error('Error fetching categories:', error);
     }
   };
 
-  const filteredProjects = activeCategory === 'all' 
-    ? projects 
-    : projects.filter(project => project.category === activeCategory);
+  // Pushed changes are applied in place; a reset refetches what is on screen
+  useContentChanges('portfolio', (change) => {
+    if (change.operation === 'reset') {
+      fetchPortfolio(activeCategory);
+      fetchCategories();
+    } else if (change.operation === 'delete') {
+      setProjects(previous => previous.filter(project => project.id !== change.id));
+      fetchCategories();
+    } else {
+      const project = change.document;
+      const shown = activeCategory === 'all' || project.category === activeCategory;
+      setProjects(previous => {
+        if (!shown) return previous.filter(p => p.id !== project.id);
+        if (previous.some(p => p.id === project.id)) {
+          return previous.map(p => (p.id === project.id ? project : p));
+        }
+        return uniqueProjects([project, ...previous]);
+      });
+      fetchCategories();
+    }
+  });
 
   const categoryNames = {
     all: 'Все работы',
@@ -261,10 +339,10 @@ const Portfolio = () => {
 
         {/* Category Filter */}
         <div className="flex flex-wrap justify-center gap-4 mb-12">
-          {categories.map(category => (
+          {categories.map(({ category, count }) => (
             <button
               key={category}
-              onClick={() => setActiveCategory(category)}
+              onClick={() => selectCategory(category)}
               className={`px-6 py-3 rounded-full font-semibold transition-colors ${
                 activeCategory === category
                   ? 'bg-yellow-400 text-black'
@@ -272,6 +350,7 @@ const Portfolio = () => {
               }`}
             >
               {categoryNames[category] || category}
+              <span className="ml-2 opacity-60">{count}</span>
             </button>
           ))}
         </div>
@@ -288,43 +367,67 @@ const Portfolio = () => {
             <h3 className="text-white font-semibold mb-2">Ошибка загрузки</h3>
             <p className="text-gray-400 mb-4">{error}</p>
             <button
-              onClick={fetchPortfolio}
+              onClick={() => {
+                fetchPortfolio();
+                fetchCategories();
+              }}
               className="bg-yellow-400 hover:bg-yellow-500 text-black font-semibold py-3 px-6 rounded-full transition-colors"
             >
               Попробовать снова
             </button>
           </div>
-        ) : filteredProjects.length === 0 ? (
+        ) : projects.length === 0 ? (
           <div className="text-center py-12">
             <p className="text-gray-400 text-lg">Проекты в этой категории пока не добавлены</p>
           </div>
         ) : (
-          <div className="grid md:grid-cols-2 lg:grid-cols-3 gap-8">
-            {filteredProjects.map(project => (
-              <div key={project.id} className="group relative overflow-hidden rounded-lg bg-gray-800 hover:transform hover:scale-105 transition-all duration-300">
-                <div className="aspect-square">
-                  <img
-                    src={project.image}
-                    alt={project.title}
-                    className="w-full h-full object-cover"
-                    loading="lazy"
-                    onError={(e) => {
-                      e.target.src = 'https://images.unsplash.com/photo-1487452066049-a710f7296400?w=400&h=400&fit=crop';
-                    }}
-                  />
-                </div>
-                <div className="absolute inset-0 bg-black/70 opacity-0 group-hover:opacity-100 transition-opacity duration-300 flex items-center justify-center">
-                  <div className="text-center px-4">
-                    <h3 className="text-xl font-bold text-white mb-2">{project.title}</h3>
-                    <p className="text-gray-300 text-sm mb-4">{project.description}</p>
-                    <span className="bg-yellow-400 text-black px-3 py-1 rounded-full text-sm font-semibold">
-                      {categoryNames[project.category] || project.category}
-                    </span>
+          <>
+            <div className="grid md:grid-cols-2 lg:grid-cols-3 gap-8">
+              {projects.map(project => (
+                <div key={project.id} className="group relative overflow-hidden rounded-lg bg-gray-800 hover:transform hover:scale-105 transition-all duration-300">
+                  <div className="aspect-square">
+                    <picture className="block w-full h-full">
+                      {project.variants?.webp && (
+                        <source type="image/webp" srcSet={srcSet(project.variants.webp)} sizes={portfolioSizes} />
+                      )}
+                      <img
+                        src={imageUrl(project.image)}
+                        srcSet={project.variants?.jpeg ? srcSet(project.variants.jpeg) : undefined}
+                        sizes={project.variants?.jpeg ? portfolioSizes : undefined}
+                        alt={project.title}
+                        className="w-full h-full object-cover"
+                        loading="lazy"
+                        onError={(e) => {
+                          e.target.srcset = '';
+                          e.target.src = 'https://images.unsplash.com/photo-1487452066049-a710f7296400?w=400&h=400&fit=crop';
+                        }}
+                      />
+                    </picture>
+                  </div>
+                  <div className="absolute inset-0 bg-black/70 opacity-0 group-hover:opacity-100 transition-opacity duration-300 flex items-center justify-center">
+                    <div className="text-center px-4">
+                      <h3 className="text-xl font-bold text-white mb-2">{project.title}</h3>
+                      <p className="text-gray-300 text-sm mb-4">{project.description}</p>
+                      <span className="bg-yellow-400 text-black px-3 py-1 rounded-full text-sm font-semibold">
+                        {categoryNames[project.category] || project.category}
+                      </span>
+                    </div>
                   </div>
                 </div>
+              ))}
+            </div>
+            {nextCursor && (
+              <div className="text-center mt-12">
+                <button
+                  onClick={loadMore}
+                  disabled={loadingMore}
+                  className="bg-gray-800 hover:bg-gray-700 text-white font-semibold py-3 px-8 rounded-full transition-colors disabled:opacity-50"
+                >
+                  {loadingMore ? 'Загрузка...' : 'Показать ещё'}
+                </button>
               </div>
-            ))}
-          </div>
+            )}
+          </>
         )}
       </div>
     </section>
@@ -394,24 +497,31 @@ const About = () => {
   );
 };
 // Services Section
-const Services = () => {
+const uniqueServices = (data) => data.filter((service, index, self) =>
+  index === self.findIndex(s => s.title === service.title)
+);
+
+const Services = ({ landing }) => {
   const [services, setServices] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
   useEffect(() => {
-    fetchServices();
-  }, []);
+    if (!landing) return;
+    if (landing.error) {
+      setError(landing.error);
+    } else {
+      setServices(uniqueServices(landing.services));
+    }
+    setLoading(false);
+  }, [landing]);
 
   const fetchServices = async () => {
     try {
-      const response = await fetch(`${API}/services`);
+      const response = await fetch(`${API}/services`, { cache: 'no-cache' });
       if (!response.ok) throw new Error('Не удалось загрузить услуги');
       const data = await response.json();
-      const uniqueServices = data.filter((service, index, self) =>
-        index === self.findIndex(s => s.title === service.title)
-      );
-      setServices(uniqueServices);
+      setServices(uniqueServices(data));
       setError(null);
     } catch (error) {
       console.error('Error fetching services:', error);
@@ -421,6 +531,9 @@ const Services = () => {
     }
   };
 
+  // Services are few; any pushed change refetches the list
+  useContentChanges('services', fetchServices);
+
   return (
     <section id="services" className="py-20 bg-black">
       <div className="container mx-auto px-4">
@@ -645,24 +758,31 @@ const PriceCalculator = () => {
 };
 
 // Process Section
-const Process = () => {
+const uniqueSteps = (data) => data.filter((step, index, self) =>
+  index === self.findIndex(s => s.step === step.step && s.title === step.title)
+);
+
+const Process = ({ landing }) => {
   const [steps, setSteps] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
   useEffect(() => {
-    fetchProcess();
-  }, []);
+    if (!landing) return;
+    if (landing.error) {
+      setError(landing.error);
+    } else {
+      setSteps(uniqueSteps(landing.process));
+    }
+    setLoading(false);
+  }, [landing]);
 
   const fetchProcess = async () => {
     try {
-      const response = await fetch(`${API}/process`);
+      const response = await fetch(`${API}/process`, { cache: 'no-cache' });
       if (!response.ok) throw new Error('Не удалось загрузить информацию о процессе');
       const data = await response.json();
-      const uniqueSteps = data.filter((step, index, self) =>
-        index === self.findIndex(s => s.step === step.step && s.title === step.title)
-      );
-      setSteps(uniqueSteps);
+      setSteps(uniqueSteps(data));
       setError(null);
     } catch (error) {
       console.error('Error fetching process:', error);
@@ -672,6 +792,8 @@ const Process = () => {
     }
   };
 
+  useContentChanges('process_steps', fetchProcess);
+
   return (
     <section id="process" className="py-20 bg-black">
       <div className="container mx-auto px-4">
@@ -737,26 +859,38 @@ const Process = () => {
 };
 
 // Testimonials Section
-const Testimonials = () => {
+const uniqueTestimonials = (data) => data.filter((testimonial, index, self) =>
+  index === self.findIndex(t => t.name === testimonial.name && t.text === testimonial.text)
+);
+
+const uniqueFaqs = (data) => data.filter((faq, index, self) =>
+  index === self.findIndex(f => f.question === faq.question)
+);
+
+const Testimonials = ({ landing }) => {
   const [testimonials, setTestimonials] = useState([]);
   const [faqs, setFaqs] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
   useEffect(() => {
-    fetchTestimonials();
-    fetchFaqs();
-  }, []);
+    if (!landing) return;
+    if (landing.error) {
+      setError(landing.error);
+    } else {
+      setTestimonials(uniqueTestimonials(landing.testimonials));
+      setFaqs(uniqueFaqs(landing.faqs));
+    }
+    setLoading(false);
+  }, [landing]);
 
   const fetchTestimonials = async () => {
     try {
-      const response = await fetch(`${API}/testimonials`);
+      const response = await fetch(`${API}/testimonials`, { cache: 'no-cache' });
       if (!response.ok) throw new Error('Не удалось загрузить отзывы');
       const data = await response.json();
-      const uniqueTestimonials = data.filter((testimonial, index, self) =>
-        index === self.findIndex(t => t.name === testimonial.name && t.text === testimonial.text)
-      );
-      setTestimonials(uniqueTestimonials);
+      setTestimonials(uniqueTestimonials(data));
+      setError(null);
     } catch (error) {
       console.error('Error fetching testimonials:', error);
       setError(error.message);
@@ -765,13 +899,11 @@ const Testimonials = () => {
 
   const fetchFaqs = async () => {
     try {
-      const response = await fetch(`${API}/faqs`);
+      const response = await fetch(`${API}/faqs`, { cache: 'no-cache' });
       if (!response.ok) throw new Error('Не удалось загрузить FAQ');
       const data = await response.json();
-      const uniqueFaqs = data.filter((faq, index, self) =>
-        index === self.findIndex(f => f.question === faq.question)
-      );
-      setFaqs(uniqueFaqs);
+      setFaqs(uniqueFaqs(data));
+      setError(null);
     } catch (error) {
       console.error('Error fetching FAQs:', error);
       setError(error.message);
@@ -780,6 +912,9 @@ const Testimonials = () => {
     }
   };
 
+  useContentChanges('testimonials', fetchTestimonials);
+  useContentChanges('faqs', fetchFaqs);
+
   return (
     <section id="testimonials" className="py-20 bg-gray-900">
       <div className="container mx-auto px-4">
@@ -903,6 +1038,7 @@ const Contact = () => {
         body: JSON.stringify(formData)
       });
 
+      if (response.status === 429) throw new Error('Слишком много заявок, попробуйте позже');
       if (!response.ok) throw new Error('Не удалось отправить заявку');
 
       setSubmitted(true);
@@ -1084,17 +1220,33 @@ const Footer = () => {
 // Main App Component
 function App() {
   const [activeSection, setActiveSection] = useState('hero');
+  const [landing, setLanding] = useState(null);
 
   useEffect(() => {
-    // Seed data on app start
-    const seedData = async () => {
+    // Load every content section in a single request
+    const fetchLanding = async () => {
       try {
-        await fetch(`${API}/seed-data`, { method: 'POST' });
+        const response = await fetch(`${API}/landing`);
+        if (!response.ok) throw new Error('Не удалось загрузить данные');
+        setLanding(await response.json());
       } catch (error) {
-        console.error('Error seeding data:', error);
+        console.error('Error fetching landing data:', error);
+        setLanding({ error: error.message });
       }
     };
-    seedData();
+    fetchLanding();
+
+    // Live updates; EventSource reconnects by itself, resuming after the last event it saw
+    const stream = new EventSource(`${API}/stream`);
+    stream.addEventListener('change', (event) => {
+      const change = JSON.parse(event.data);
+      contentChanges.dispatchEvent(new CustomEvent(change.collection, { detail: change }));
+    });
+    stream.addEventListener('reset', (event) => {
+      JSON.parse(event.data).collections.forEach(collection => {
+        contentChanges.dispatchEvent(new CustomEvent(collection, { detail: { operation: 'reset' } }));
+      });
+    });
 
     // Scroll spy for active section
     const handleScroll = () => {
@@ -1114,7 +1266,10 @@ function App() {
     };
 
     window.addEventListener('scroll', handleScroll);
-    return () => window.removeEventListener('scroll', handleScroll);
+    return () => {
+      window.removeEventListener('scroll', handleScroll);
+      stream.close();
+    };
   }, []);
 
   return (
@@ -1123,11 +1278,11 @@ function App() {
       <main>
         <Hero />
         <About />
-        <Portfolio />
-        <Services />
+        <Portfolio landing={landing} />
+        <Services landing={landing} />
         <PriceCalculator />
-        <Process />
-        <Testimonials />
+        <Process landing={landing} />
+        <Testimonials landing={landing} />
         <Contact />
       </main>
       <Footer />
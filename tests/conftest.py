@@ -0,0 +1,20 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# The backend is a flat set of modules run from backend/, not an installed package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+# server.py reads its settings at import; nothing here connects to Mongo
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test")
+os.environ.setdefault("MEDIA_DIR", tempfile.mkdtemp(prefix="test-media-"))
+os.environ.setdefault("JOURNAL_DIR", tempfile.mkdtemp(prefix="test-journal-"))
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
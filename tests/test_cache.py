@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from cache import CachedResponse, ResponseCache, SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_misses_share_one_load():
+    flights = SingleFlight()
+    loads = 0
+
+    async def load():
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(0.01)
+        return b"body"
+
+    results = await asyncio.gather(*(flights.run("key", load) for _ in range(50)))
+    assert results == [b"body"] * 50
+    assert (loads, flights.loads, flights.coalesced, len(flights)) == (1, 1, 49, 0)
+
+
+async def test_cancelled_waiter_does_not_cancel_shared_load():
+    flights = SingleFlight()
+    released = asyncio.Event()
+
+    async def load():
+        await released.wait()
+        return 42
+
+    first = asyncio.create_task(flights.run("key", load))
+    second = asyncio.create_task(flights.run("key", load))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    released.set()
+    assert await second == 42
+    assert first.cancelled()
+
+
+async def test_errors_reach_every_waiter_and_are_not_kept():
+    flights = SingleFlight()
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        if calls == 1:
+            raise ConnectionError("mongo down")
+        return "ok"
+
+    results = await asyncio.gather(*(flights.run("key", load) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert await flights.run("key", load) == "ok"
+    assert calls == 2
+
+
+def entry(size: int) -> CachedResponse:
+    return CachedResponse(body=b"x" * size)
+
+
+def test_cache_evicts_least_recently_used_over_max_bytes():
+    cache = ResponseCache(max_bytes=250)
+    cache.set("faqs", "a", entry(100))
+    cache.set("faqs", "b", entry(100))
+    assert cache.get("faqs", "a") is not None  # now b is the least recently used
+    cache.set("faqs", "c", entry(100))
+    assert cache.get("faqs", "b") is None
+    assert cache.get("faqs", "a") is not None and cache.get("faqs", "c") is not None
+    assert cache.stats()["bytes"] == 200
+    cache.set("faqs", "huge", entry(251))
+    assert cache.get("faqs", "huge") is None
+
+
+def test_cache_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("cache.time.monotonic", lambda: now[0])
+    cache = ResponseCache(ttl=10)
+    cache.set("services", "list", entry(10))
+    now[0] += 9.9
+    assert cache.get("services", "list") is not None
+    now[0] += 0.2
+    assert cache.get("services", "list") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_invalidate_drops_namespace_and_derived():
+    cache = ResponseCache(derived=("landing",))
+    cache.set("faqs", "list", entry(10))
+    cache.set("services", "list", entry(10))
+    cache.set("landing", "all", entry(10))
+    cache.invalidate("faqs")
+    assert cache.get("faqs", "list") is None and cache.get("landing", "all") is None
+    assert cache.get("services", "list") is not None
@@ -0,0 +1,75 @@
+import gzip
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Route
+
+from compression import SelectiveGZipMiddleware, compress_all, negotiate
+
+pytestmark = pytest.mark.anyio
+
+BODY = b"0123456789" * 1000
+
+
+def app():
+    async def body(request):
+        return Response(BODY, media_type="text/plain")
+
+    async def tagged(request):
+        size = int(request.query_params.get("size", len(BODY)))
+        return Response(BODY[:size], media_type="text/plain", headers={"ETag": request.query_params["etag"]})
+
+    async def precompressed(request):
+        return Response(gzip.compress(BODY), media_type="text/plain",
+                        headers={"ETag": '"3-gzip"', "Content-Encoding": "gzip"})
+
+    inner = Starlette(routes=[Route("/api/tagged", tagged), Route("/api/precompressed", precompressed),
+                              Route("/api/{path:path}", body)])
+    return SelectiveGZipMiddleware(inner, minimum_size=500, excluded=("/api/stream", "/api/images/"))
+
+
+@pytest.mark.parametrize("path, encoded", [
+    ("/api/services", True),
+    ("/api/stream", False),
+    ("/api/images/abc", False),
+])
+async def test_gzip_skips_excluded_paths(path, encoded):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app()), base_url="http://t") as client:
+        response = await client.get(path, headers={"Accept-Encoding": "gzip"})
+    assert ("content-encoding" in response.headers) is encoded
+    assert response.content == BODY
+
+
+@pytest.mark.parametrize("params, accept, etag", [
+    ({"etag": '"3"'}, "gzip", '"3-gzip"'),
+    ({"etag": '"3"'}, "identity", '"3"'),
+    ({"etag": '"3"', "size": "10"}, "gzip", '"3"'),  # under the minimum size, sent as is
+    ({"etag": 'W/"3"'}, "gzip", 'W/"3"'),
+])
+async def test_gzip_suffixes_strong_etag_of_bodies_it_encodes(params, accept, etag):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app()), base_url="http://t") as client:
+        response = await client.get("/api/tagged", params=params, headers={"Accept-Encoding": accept})
+    assert response.headers["etag"] == etag
+
+
+async def test_gzip_keeps_etag_of_precompressed_bodies():
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app()), base_url="http://t") as client:
+        response = await client.get("/api/precompressed", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["etag"] == '"3-gzip"'
+    assert response.content == BODY
+
+
+def test_compress_all_levels_round_trip():
+    for strong in (False, True):
+        encoded = compress_all(BODY, 100, strong)
+        assert gzip.decompress(encoded["gzip"]) == BODY
+    assert compress_all(b"tiny", 100) == {}
+
+
+def test_negotiate_prefers_highest_weight():
+    assert negotiate("gzip;q=0.5, br", ["br", "gzip"]) == "br"
+    assert negotiate("br;q=0, gzip", ["br", "gzip"]) == "gzip"
+    assert negotiate("identity", ["br", "gzip"]) is None
+    assert negotiate(None, ["gzip"]) is None
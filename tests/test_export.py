@@ -0,0 +1,66 @@
+import csv
+import io
+from datetime import datetime, timedelta
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from export import EXPORT_FIELDS, _csv_cell, export_chunks, iter_submissions, resume_point
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("=HYPERLINK(\"http://x\")", "'=HYPERLINK(\"http://x\")"),
+    ("+cmd|' /C calc'!A0", "'+cmd|' /C calc'!A0"),
+    ("@SUM(A1:A2)", "'@SUM(A1:A2)"),
+    ("\t=1+1", "'\t=1+1"),
+    ("-2+3", "'-2+3"),
+    ("+7 900 123-45-67", "+7 900 123-45-67"),
+    ("+7 (900) 123-45-67", "+7 (900) 123-45-67"),
+    ("-5", "-5"),
+    ("Роспись стены", "Роспись стены"),
+    (None, ""),
+    (datetime(2024, 5, 17, 12, 30), "2024-05-17T12:30:00"),
+])
+def test_csv_cell_escapes_formulas_only(value, expected):
+    assert _csv_cell(value) == expected
+
+
+@pytest.fixture
+async def submissions():
+    collection = AsyncMongoMockClient()["test"]["contact_submissions"]
+    start = datetime(2024, 1, 1)
+    # Pairs of rows share a created_at, so resuming has to break ties on id
+    await collection.insert_many([
+        {"id": f"{i:03d}", "created_at": start + timedelta(minutes=i // 2), "status": "new",
+         "name": "Анна", "phone": "+7 900 000-00-00", "email": f"{i}@example.com", "message": "=1+1"}
+        for i in range(25)
+    ])
+    return collection
+
+
+def rows(chunks) -> list:
+    return list(csv.reader(io.StringIO(b"".join(chunks).decode())))
+
+
+async def test_resumed_export_neither_repeats_nor_skips_rows(submissions):
+    everything = [chunk async for chunk, _ in export_chunks(iter_submissions(submissions), "csv")]
+    cut = None
+    received = []
+    # The transfer is cut off after the second chunk
+    async for chunk, last_id in export_chunks(iter_submissions(submissions), "csv", chunk_bytes=300):
+        received.append(chunk)
+        cut = last_id
+        if len(received) == 2:
+            break
+    after = await resume_point(submissions, cut)
+    async for chunk, _ in export_chunks(iter_submissions(submissions, after=after), "csv", header=False):
+        received.append(chunk)
+    assert rows(received) == rows(everything)
+    assert rows(received)[0] == list(EXPORT_FIELDS)
+    assert len(rows(received)) == 26
+
+
+async def test_resume_point_of_unknown_id_is_none(submissions):
+    assert await resume_point(submissions, "missing") is None
@@ -0,0 +1,32 @@
+import asyncio
+import io
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from PIL import Image
+
+from blobstore import BlobStore
+from imaging import DerivativePipeline
+
+pytestmark = pytest.mark.anyio
+
+
+def png(width=400, height=300) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 60)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+async def test_render_recovers_from_broken_pool(tmp_path):
+    store = BlobStore(tmp_path)
+    pipeline = DerivativePipeline(store, max_workers=1)
+    try:
+        digest = store.put(png())
+        # A worker dying mid-task, as when the OOM killer takes it, breaks the whole pool
+        with pytest.raises(BrokenProcessPool):
+            await asyncio.get_running_loop().run_in_executor(pipeline._pool(), os._exit, 1)
+        variants = await pipeline.render(digest)
+        assert set(variants) == {"webp", "jpeg"} and set(variants["webp"]) == {"320"}
+    finally:
+        pipeline.shutdown()
@@ -0,0 +1,38 @@
+import pytest
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from indexes import QueryShape, index_serves, uncovered_shapes
+
+PAGE = (("created_at", DESCENDING), ("id", DESCENDING))
+
+
+@pytest.mark.parametrize("keys, shape, served", [
+    # Equality prefix in any order, then the sort keys in order
+    ([("category", 1), ("created_at", -1), ("id", -1)], QueryShape("portfolio", ("category",), PAGE), True),
+    ([("b", 1), ("a", 1)], QueryShape("c", ("a", "b")), True),
+    # The whole index reversed serves the reversed sort
+    ([("created_at", 1), ("id", 1)], QueryShape("portfolio", (), PAGE), True),
+    ([("id", 1), ("title", 1)], QueryShape("portfolio", ("id",)), True),
+    # Mixed directions the index cannot walk either way
+    ([("created_at", -1), ("id", 1)], QueryShape("portfolio", (), PAGE), False),
+    # Sort keys out of order, or the equality field after them
+    ([("id", -1), ("created_at", -1)], QueryShape("portfolio", (), PAGE), False),
+    ([("created_at", -1), ("id", -1), ("category", 1)], QueryShape("portfolio", ("category",), PAGE), False),
+    ([("created_at", -1)], QueryShape("portfolio", (), PAGE), False),
+    # A shape with neither equality nor sort is a scan whatever the indexes
+    ([("id", 1)], QueryShape("portfolio"), False),
+])
+def test_index_serves(keys, shape, served):
+    assert index_serves(keys, shape) is served
+
+
+def test_uncovered_shapes_reports_only_shapes_without_an_index():
+    registry = {"portfolio": [IndexModel([("category", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)])]}
+    covered = QueryShape("portfolio", ("category",), PAGE, "portfolio page by category")
+    uncovered = QueryShape("portfolio", ("featured",), PAGE, "featured portfolio page")
+    other_collection = QueryShape("services", ("active",), (("order", ASCENDING),), "active services")
+    assert uncovered_shapes(registry, [covered, uncovered, other_collection]) == [uncovered, other_collection]
+
+
+def test_registered_indexes_cover_every_query_shape():
+    assert uncovered_shapes() == []
@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+from ingest import WriteBehindQueue
+
+pytestmark = pytest.mark.anyio
+
+
+class Sink:
+    def __init__(self, fail=False):
+        self.documents = []
+        self.fail = fail
+
+    async def __call__(self, batch):
+        if self.fail:
+            raise ConnectionError("database down")
+        self.documents.extend(batch)
+
+
+def queue(tmp_path, sink):
+    return WriteBehindQueue(sink, tmp_path, name="contacts", max_delay=0.01)
+
+
+async def test_live_writer_segments_are_left_alone(tmp_path):
+    first_sink = Sink(fail=True)
+    first = queue(tmp_path, first_sink)
+    await first.start()
+    await first.put({"id": "a"})
+    second_sink = Sink()
+    second = queue(tmp_path, second_sink)
+    await second.start()
+    await second.stop()
+    assert second_sink.documents == []
+    first_sink.fail = False
+    first._wakeup.set()
+    await first.stop()
+    assert [d["id"] for d in first_sink.documents] == ["a"]
+    assert os.listdir(tmp_path) == []
+
+
+async def test_dead_writer_segments_are_replayed_once(tmp_path):
+    dead = queue(tmp_path, Sink(fail=True))
+    await dead.start()
+    await dead.put({"id": "a"})
+    await dead.put({"id": "b"})
+    # The process dies: its lock goes with it, its journal stays
+    dead._task.cancel()
+    os.close(dead._lock_fd)
+    sinks = [Sink(), Sink()]
+    survivors = [queue(tmp_path, sink) for sink in sinks]
+    for survivor in survivors:
+        await survivor.start()
+    for survivor in survivors:
+        await survivor.stop()
+    assert sorted(d["id"] for sink in sinks for d in sink.documents) == ["a", "b"]
+    assert os.listdir(tmp_path) == []
+
+
+async def test_legacy_segments_are_replayed(tmp_path):
+    (tmp_path / "contacts-000000000007.jsonl").write_bytes(b'{"id":"old"}\n{"id":')
+    sink = Sink()
+    replaying = queue(tmp_path, sink)
+    await replaying.start()
+    await replaying.stop()
+    assert sink.documents == [{"id": "old"}]
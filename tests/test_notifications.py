@@ -0,0 +1,190 @@
+import email
+import email.policy
+import socket
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from aiosmtpd.controller import Controller
+from mongomock_motor import AsyncMongoMockClient
+
+from notifications import FAILED, PENDING, SENDING, SENT, NotificationDispatcher, SmtpChannel, TelegramChannel, \
+    outbox_records
+
+pytestmark = pytest.mark.anyio
+
+
+def submission(i, **overrides):
+    return {"id": f"s{i}", "name": f"Клиент {i}", "phone": "+7 900 000-00-00", "email": f"c{i}@example.ru",
+            "message": f"Заявка {i}", "created_at": datetime.utcnow(), **overrides}
+
+
+class Inbox:
+    """aiosmtpd handler that keeps messages and refuses those whose body contains "REFUSE"."""
+
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        if b"REFUSE" in envelope.content:
+            return "554 Message refused"
+        self.messages.append(envelope.content.decode("utf-8", "replace"))
+        return "250 OK"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp():
+    inbox = Inbox()
+    controller = Controller(inbox, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    yield controller, inbox
+    controller.stop()
+
+
+@pytest.fixture
+def outbox():
+    return AsyncMongoMockClient()["test"]["notification_outbox"]
+
+
+def email_channel(controller):
+    return SmtpChannel(controller.hostname, controller.port, "site@example.ru", ["studio@example.ru"], timeout=5)
+
+
+def dispatcher(outbox, channel, name="email", **options):
+    return NotificationDispatcher(outbox, {name: channel}, base_backoff=0.001, max_backoff=0.001, **options)
+
+
+async def store(outbox, submissions, channel="email"):
+    await outbox.insert_many([record for s in submissions for record in outbox_records(s, [channel])])
+
+
+async def statuses(outbox):
+    return {record["submission_id"]: record["status"] async for record in outbox.find({})}
+
+
+async def make_due(outbox):
+    await outbox.update_many({}, {"$set": {"next_attempt_at": datetime.utcnow() - timedelta(seconds=1)}})
+
+
+async def test_smtp_delivers_batch_over_one_connection(smtp, outbox):
+    controller, inbox = smtp
+    channel = email_channel(controller)
+    await store(outbox, [submission(i) for i in range(3)])
+    assert await dispatcher(outbox, channel).dispatch_once("email") == 3
+    await channel.close()
+    assert await statuses(outbox) == {"s0": SENT, "s1": SENT, "s2": SENT}
+    assert len(inbox.messages) == 3
+
+
+async def test_smtp_refusal_fails_only_that_record(smtp, outbox):
+    controller, inbox = smtp
+    channel = email_channel(controller)
+    await store(outbox, [submission(0), submission(1, message="REFUSE"), submission(2)])
+    await dispatcher(outbox, channel).dispatch_once("email")
+    await channel.close()
+    assert await statuses(outbox) == {"s0": SENT, "s1": PENDING, "s2": SENT}
+    refused = await outbox.find_one({"submission_id": "s1"})
+    assert refused["attempts"] == 1 and "554" in refused["last_error"]
+
+
+async def test_smtp_connection_drop_fails_batch_for_retry(smtp, outbox):
+    controller, inbox = smtp
+    channel = SmtpChannel("127.0.0.1", free_port(), "site@example.ru", ["studio@example.ru"], timeout=5)
+    await store(outbox, [submission(i) for i in range(2)])
+    await dispatcher(outbox, channel).dispatch_once("email")
+    assert await statuses(outbox) == {"s0": PENDING, "s1": PENDING}
+    assert "ConnectionRefusedError" in (await outbox.find_one({"submission_id": "s1"}))["last_error"]
+    channel.port = controller.port  # the server is back
+    await make_due(outbox)
+    await dispatcher(outbox, channel).dispatch_once("email")
+    await channel.close()
+    assert await statuses(outbox) == {"s0": SENT, "s1": SENT}
+
+
+async def test_header_injection_is_flattened(smtp, outbox):
+    controller, inbox = smtp
+    channel = email_channel(controller)
+    await store(outbox, [submission(0, name="bad\nname", email="x@example.ru\r\nBcc: y@example.ru")])
+    await dispatcher(outbox, channel).dispatch_once("email")
+    await channel.close()
+    assert await statuses(outbox) == {"s0": SENT}
+    message = email.message_from_string(inbox.messages[0], policy=email.policy.default)
+    assert message["Bcc"] is None
+    assert message["Subject"] == "Заявка с сайта: bad name"
+
+
+async def test_poison_record_does_not_wedge_batch(smtp, outbox):
+    controller, inbox = smtp
+    channel = email_channel(controller)
+    await store(outbox, [submission(i) for i in range(3)])
+    await outbox.update_one({"submission_id": "s1"}, {"$unset": {"payload.name": ""}})
+    await dispatcher(outbox, channel).dispatch_once("email")
+    await channel.close()
+    assert await statuses(outbox) == {"s0": SENT, "s1": PENDING, "s2": SENT}
+    assert "KeyError" in (await outbox.find_one({"submission_id": "s1"}))["last_error"]
+    assert len(inbox.messages) == 2
+
+
+async def test_backoff_until_failed(outbox):
+    channel = TelegramChannel("token", "chat", api_url="http://telegram.test")
+    channel._client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(502)))
+    worker = dispatcher(outbox, channel, "telegram", max_attempts=3)
+    await store(outbox, [submission(0)], "telegram")
+    for _ in range(3):
+        await make_due(outbox)
+        await worker.dispatch_once("telegram")
+    record = await outbox.find_one({})
+    assert (record["status"], record["attempts"], worker.failed) == (FAILED, 3, 1)
+    assert record["last_error"].startswith("HTTP 502")
+    await make_due(outbox)
+    assert await worker.dispatch_once("telegram") == 0
+    await channel.close()
+
+
+async def test_expired_leases_count_as_attempts(outbox):
+    worker = dispatcher(outbox, None, max_attempts=2)
+    await store(outbox, [submission(0)])
+    for attempts in (1, 2):
+        # A worker claimed the record and died without settling it
+        await outbox.update_many({}, {"$set": {"status": SENDING, "lease": "dead"}})
+        await make_due(outbox)
+        await worker._reclaim_expired("email", datetime.utcnow())
+        record = await outbox.find_one({})
+        assert record["attempts"] == attempts
+    assert record["status"] == FAILED and worker.failed == 1
+
+
+async def test_telegram_packs_records_and_reports_per_message(outbox):
+    sent = []
+
+    def telegram(request):
+        text = httpx.Request("POST", request.url, content=request.content).read().decode()
+        sent.append(text)
+        return httpx.Response(200, json={"ok": True})
+
+    channel = TelegramChannel("token", "chat", api_url="http://telegram.test")
+    channel._client = httpx.AsyncClient(transport=httpx.MockTransport(telegram))
+    await store(outbox, [submission(i) for i in range(3)], "telegram")
+    await dispatcher(outbox, channel, "telegram").dispatch_once("telegram")
+    await channel.close()
+    assert await statuses(outbox) == {"s0": SENT, "s1": SENT, "s2": SENT}
+    assert len(sent) == 1
+
+
+async def test_telegram_connection_error_keeps_records_pending(outbox):
+    def unreachable(request):
+        raise httpx.ConnectError("connection refused", request=request)
+
+    channel = TelegramChannel("token", "chat", api_url="http://telegram.test")
+    channel._client = httpx.AsyncClient(transport=httpx.MockTransport(unreachable))
+    await store(outbox, [submission(0)], "telegram")
+    await dispatcher(outbox, channel, "telegram").dispatch_once("telegram")
+    await channel.close()
+    record = await outbox.find_one({})
+    assert record["status"] == PENDING and "ConnectError" in record["last_error"]
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from pricing import DEFAULT_TABLE, InvalidRules, UnknownOption, UnknownTier, compile_rules
+
+RULES = {
+    "tiers": [
+        {"name": "basic", "price_per_m2": 1500},
+        {"name": "premium", "price_per_m2": 7000, "minimum_charge": 50_000},
+    ],
+    "area_brackets": [{"above": 50, "discount": 10}, {"above": 20, "discount": 5}],
+    "surcharges": [{"group": "surface", "option": "brick", "percent": 15}],
+    "minimum_charge": 10_000,
+}
+
+
+@pytest.mark.parametrize("area, discount", [(20, 0), (20.5, 5), (50, 5), (51, 10)])
+def test_bracket_applies_strictly_above_its_breakpoint(area, discount):
+    quote = DEFAULT_TABLE.quote(area, "basic")
+    assert quote["discount"] == discount
+    assert quote["total"] == pytest.approx(1500 * area * (1 - discount / 100))
+
+
+def test_quote_applies_surcharge_and_minimum_charge():
+    table = compile_rules(RULES)
+    assert table.quote(100, "basic", {"surface": "brick"})["total"] == pytest.approx(1500 * 100 * 0.9 * 1.15)
+    assert table.quote(2, "basic")["total"] == 10_000
+    assert table.quote(2, "premium")["total"] == 50_000
+
+
+def test_quote_rejects_unknown_tier_and_option():
+    table = compile_rules(RULES)
+    with pytest.raises(UnknownTier):
+        table.quote(10, "gold")
+    with pytest.raises(UnknownOption):
+        table.quote(10, "basic", {"surface": "glass"})
+
+
+def test_quote_batch_matches_quote_row_by_row():
+    table = compile_rules(RULES)
+    rng = np.random.default_rng(7)
+    areas = rng.uniform(1, 120, 500).round(1).tolist() + [20, 50]
+    tiers = [("basic", "premium")[i % 2] for i in range(len(areas))]
+    options = [{"surface": "brick"} if i % 3 == 0 else None for i in range(len(areas))]
+    batch = table.quote_batch(areas, tiers, options)
+    for i, (area, tier, option) in enumerate(zip(areas, tiers, options)):
+        quote = table.quote(area, tier, option)
+        for field in ("subtotal", "discount", "surcharge", "minimum_charge", "total"):
+            assert batch[field][i] == pytest.approx(quote[field]), (field, area, tier)
+
+
+def test_quote_batch_rejects_unknown_tier():
+    with pytest.raises(UnknownTier):
+        DEFAULT_TABLE.quote_batch([10, 20], ["basic", "gold"])
+
+
+@pytest.mark.parametrize("rules", [
+    {"tiers": []},
+    {"tiers": [{"name": "a", "price_per_m2": 1}, {"name": "a", "price_per_m2": 2}]},
+    {"tiers": [{"name": "a", "price_per_m2": -1}]},
+    {"tiers": [{"name": "a", "price_per_m2": 1}], "area_brackets": [{"above": 10, "discount": 100}]},
+    {"tiers": [{"price_per_m2": 1}]},
+])
+def test_compile_rejects_invalid_rules(rules):
+    with pytest.raises(InvalidRules):
+        compile_rules(rules)
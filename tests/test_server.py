@@ -0,0 +1,290 @@
+import asyncio
+import base64
+import hashlib
+import io
+from datetime import datetime
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from mongomock_motor import AsyncMongoMockClient
+from starlette.requests import Request
+from PIL import Image
+
+import server
+from search import stem
+from spam import RollingBloomFilter, TokenBuckets
+
+pytestmark = pytest.mark.anyio
+
+
+def png(colour=(0, 0, 0)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), colour).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def png_base64() -> str:
+    return base64.b64encode(png()).decode()
+
+
+async def test_inline_image_is_stored():
+    url = await server.store_inline_image("data:image/png;base64," + png_base64())
+    assert server.blob_store.exists(url.removeprefix(server.IMAGE_URL_PREFIX))
+
+
+async def test_inline_non_image_is_refused_before_storing():
+    data = b"just some text, not a picture"
+    text = base64.b64encode(data).decode()
+    with pytest.raises(HTTPException) as refused:
+        await server.store_inline_image(text)
+    assert refused.value.status_code == 415
+    assert not server.blob_store.exists(hashlib.sha256(data).hexdigest())
+
+
+async def test_inline_invalid_base64_is_refused():
+    with pytest.raises(HTTPException) as refused:
+        await server.store_inline_image("not base64!")
+    assert refused.value.status_code == 400
+
+
+def project(project_id: str, title: str) -> dict:
+    return {"id": project_id, "title": title, "description": "Роспись стены", "category": "murals"}
+
+
+async def test_search_rebuild_keeps_writes_made_during_it(monkeypatch):
+    async def portfolio():
+        yield project("kept", "Мурал во дворе")
+        yield project("deleted", "Граффити в переходе")
+        # Written by requests while the rebuild is still reading
+        server.index_document("portfolio", project("added", "Портрет на фасаде"))
+        server.unindex_document("portfolio", "deleted")
+
+    monkeypatch.setattr(server, "SEARCH_SOURCES", {"portfolio": portfolio})
+    monkeypatch.setattr(server, "search_index", server.SearchIndex())
+    await server.build_search_index()
+    assert set(server.search_index.documents) == {("portfolio", "kept"), ("portfolio", "added")}
+    assert server.search_changes is None
+
+
+def search_index(*projects) -> server.SearchIndex:
+    index = server.SearchIndex()
+    for document in projects:
+        index.add("portfolio", document)
+    return index
+
+
+def hit_ids(hits) -> list:
+    return [hit["id"] for hit in hits]
+
+
+def test_search_stems_russian_word_forms():
+    assert stem("стену") == stem("стены") == "стен"
+    index = search_index({**project("wall", "Роспись стены в детской"), "description": ""},
+                         {**project("car", "Аэрография на капоте"), "description": ""})
+    assert hit_ids(index.search("стену ")) == ["wall"]
+    assert hit_ids(index.search("стеной ")) == ["wall"]
+
+
+def test_search_matches_last_word_as_prefix_while_typing():
+    index = search_index({**project("graffiti", "Граффити в переходе"), "description": ""},
+                         {**project("portrait", "Портрет на фасаде"), "description": ""})
+    assert hit_ids(index.search("граф")) == ["graffiti"]
+    # Once the word is finished it has to match in full
+    assert index.search("граф ") == []
+
+
+def test_search_forgets_removed_documents():
+    index = search_index(project("graffiti", "Граффити в переходе"), project("mural", "Мурал во дворе"))
+    index.remove("portfolio", "graffiti")
+    index.remove("portfolio", "unknown")
+    assert index.search("граффити ") == []
+    assert "граффити" not in index.vocabulary
+    assert hit_ids(index.search("мурал ")) == ["mural"]
+    assert len(index) == 1
+
+
+def test_search_ranks_by_bm25():
+    index = search_index(
+        {**project("title", "Мурал"), "description": "Работа во дворе школы"},
+        {**project("description", "Работа во дворе"), "description": "Мурал на торце дома"},
+        {**project("both", "Мурал у реки"), "description": "Мурал и граффити"},
+        project("other", "Портрет на фасаде"),
+    )
+    # The title weighs more than the description, and more occurrences more than fewer
+    assert hit_ids(index.search("мурал ")) == ["both", "title", "description"]
+    # A document matching more of the query's words ranks first whatever its scores
+    assert hit_ids(index.search("мурал торце ")) == ["description", "both", "title"]
+
+
+def test_cursor_round_trips():
+    created_at = datetime(2024, 5, 17, 12, 30, 45, 123000)
+    cursor = server.encode_cursor(created_at, "6f1c")
+    assert "=" not in cursor
+    assert server.decode_cursor(cursor) == (created_at, "6f1c")
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", "WzFd", base64.urlsafe_b64encode(b'["x","y"]').decode()])
+def test_malformed_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as invalid:
+        server.decode_cursor(cursor)
+    assert invalid.value.status_code == 400
+
+
+@pytest.mark.parametrize("fields, projection, key", [
+    (None, {"_id": 0}, ""),
+    ("", {"_id": 0}, ""),
+    (" , ,", {"_id": 0}, ""),
+    ("title", {"_id": 0, "id": 1, "title": 1}, "id,title"),
+    ("price,title", {"_id": 0, "id": 1, "price": 1, "title": 1}, "id,price,title"),
+    # Whitespace, duplicates, order and an explicit id all give the same key
+    (" title , price,title,", {"_id": 0, "id": 1, "price": 1, "title": 1}, "id,price,title"),
+    ("title,id,price", {"_id": 0, "id": 1, "price": 1, "title": 1}, "id,price,title"),
+])
+def test_sparse_fields(fields, projection, key):
+    assert server.sparse_fields(server.Service, fields) == (projection, key)
+
+
+def test_sparse_fields_always_include_required():
+    projection, key = server.sparse_fields(server.PortfolioProject, "title",
+                                           required=server.PORTFOLIO_CURSOR_FIELDS)
+    assert key == "created_at,id,title"
+    assert projection == {"_id": 0, "created_at": 1, "id": 1, "title": 1}
+
+
+@pytest.mark.parametrize("fields", ["password", "title,_id", "Title", "title;price"])
+def test_unknown_sparse_fields_are_a_400(fields):
+    with pytest.raises(HTTPException) as unknown:
+        server.sparse_fields(server.Service, fields)
+    assert unknown.value.status_code == 400
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("bytes=0-1,5-6", None),
+    ("items=0-1", None),
+    ("bytes=a-b", None),
+])
+def test_parse_range(header, expected):
+    assert server.parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=50-10"])
+def test_unsatisfiable_range_is_a_416(header):
+    with pytest.raises(HTTPException) as unsatisfiable:
+        server.parse_range(header, 1000)
+    assert unsatisfiable.value.status_code == 416
+    assert unsatisfiable.value.headers["Content-Range"] == "bytes */1000"
+
+
+class Queue:
+    def __init__(self):
+        self.items = []
+
+    async def put(self, item):
+        self.items.append(item)
+
+
+def request_from(ip: str) -> Request:
+    return Request({"type": "http", "method": "POST", "path": "/api/contact", "headers": [], "client": (ip, 1)})
+
+
+def contact(email: str, message: str = "Хочу роспись в детской") -> server.ContactSubmissionCreate:
+    return server.ContactSubmissionCreate(name="Анна", phone="+7 900 123-45-67", email=email, message=message)
+
+
+@pytest.fixture
+def contact_limits(monkeypatch):
+    monkeypatch.setattr(server, "contact_ip_limits", TokenBuckets(rate=1 / 3600, capacity=2))
+    monkeypatch.setattr(server, "contact_email_limits", TokenBuckets(rate=1 / 3600, capacity=1))
+    monkeypatch.setattr(server, "recent_contacts", RollingBloomFilter(capacity=100))
+    monkeypatch.setattr(server, "contact_queue", Queue())
+    return server.contact_queue
+
+
+async def test_contact_double_click_is_not_rate_limited(contact_limits):
+    for _ in range(3):
+        assert (await server.submit_contact(contact("a@example.com"), request_from("1.2.3.4")))["success"]
+    assert len(contact_limits.items) == 1
+
+
+async def test_contact_refused_by_email_limit_leaves_ip_tokens(contact_limits):
+    await server.submit_contact(contact("a@example.com"), request_from("1.2.3.4"))
+    for attempt in range(3):
+        with pytest.raises(HTTPException) as limited:
+            await server.submit_contact(contact("a@example.com", f"Ещё вопрос {attempt}"), request_from("1.2.3.4"))
+        assert limited.value.status_code == 429
+        assert int(limited.value.headers["Retry-After"]) > 3500
+    # The refusals above took nothing from the IP's bucket
+    await server.submit_contact(contact("b@example.com"), request_from("1.2.3.4"))
+    assert len(contact_limits.items) == 2
+
+
+def stored_blobs() -> set:
+    return {path.name for path in server.blob_store.root.rglob("*") if path.is_file()}
+
+
+@pytest.fixture
+def mock_db(monkeypatch):
+    database = AsyncMongoMockClient()["test"]
+    monkeypatch.setattr(server, "db", database)
+    monkeypatch.setattr(server, "category_summary", database[server.SUMMARY_COLLECTION])
+    monkeypatch.setattr(server.versions, "collection", database.collection_versions)
+    monkeypatch.setattr(server, "schedule_variants", lambda project_id, image_url: None)
+    return database
+
+
+async def post_bulk(manifest: str, files: dict) -> httpx.Response:
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.post("/api/portfolio/bulk", data={"projects": manifest}, files=files)
+
+
+@pytest.mark.parametrize("manifest, files, status", [
+    # A later part that is not an image stops the upload after the first was stored
+    ('[]', {"a": ("a.png", png((1, 2, 3)), "image/png"), "b": ("b.png", b"plain text", "image/png")}, 415),
+    # Every part stored, then the manifest is refused
+    ('[{"title": "x"}]', {"a": ("a.png", png((4, 5, 6)), "image/png")}, 422),
+    ('[{"title": "Мурал", "description": "", "category": "murals", "image": "missing"}]',
+     {"a": ("a.png", png((7, 8, 9)), "image/png")}, 400),
+])
+async def test_rejected_bulk_upload_leaves_store_unchanged(mock_db, manifest, files, status):
+    before = stored_blobs()
+    response = await post_bulk(manifest, files)
+    assert response.status_code == status
+    assert stored_blobs() == before
+
+
+async def test_failed_upload_keeps_blobs_already_in_use(mock_db):
+    image = png((10, 11, 12))
+    digest = hashlib.sha256(image).hexdigest()
+    response = await post_bulk('[{"title": "Мурал", "description": "", "category": "murals", "image": "a"}]',
+                               {"a": ("a.png", image, "image/png")})
+    assert response.status_code == 200
+    response = await post_bulk('[{"title": "x"}]', {"a": ("a.png", image, "image/png")})
+    assert response.status_code == 422
+    assert server.blob_store.exists(digest)
+
+
+async def test_inline_image_migration_skips_rows_without_a_string_image(mock_db):
+    await mock_db.portfolio.insert_many([
+        {"id": "inline", "image": "data:image/png;base64," + png_base64(), "variants": None},
+        {"id": "no-image"},
+        {"id": "null-image", "image": None},
+        {"id": "number-image", "image": 7},
+        {"id": "url", "image": "https://example.com/a.png"},
+    ])
+    await server.migrate_inline_images()
+    migrated = await mock_db.portfolio.find_one({"id": "inline"})
+    assert migrated["image"].startswith(server.IMAGE_URL_PREFIX)
+    assert (await mock_db.portfolio.find_one({"id": "number-image"}))["image"] == 7
+
+
+async def test_concurrent_inline_image_migrations_swap_each_row_once(mock_db):
+    await mock_db.portfolio.insert_one({"id": "inline", "image": "data:image/png;base64," + png_base64()})
+    await asyncio.gather(server.migrate_inline_images(), server.migrate_inline_images())
+    assert (await mock_db.collection_versions.find_one({"collection": "portfolio"}))["version"] == 1
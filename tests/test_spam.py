@@ -0,0 +1,82 @@
+from spam import RollingBloomFilter, TokenBuckets, fingerprint
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_allows_burst_then_reports_wait():
+    clock = Clock()
+    buckets = TokenBuckets(rate=1 / 60, capacity=3, clock=clock)
+    assert [buckets.acquire("1.2.3.4") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert buckets.acquire("1.2.3.4") == 60.0
+    assert buckets.acquire("5.6.7.8") == 0.0
+
+
+def test_bucket_refills_over_time_up_to_capacity():
+    clock = Clock()
+    buckets = TokenBuckets(rate=1.0, capacity=2, clock=clock)
+    buckets.acquire("ip", cost=2)
+    clock.now = 1.5
+    assert buckets.acquire("ip") == 0.0
+    assert buckets.acquire("ip") == 0.5
+    clock.now = 100
+    assert buckets.acquire("ip", cost=2) == 0.0
+    assert buckets.acquire("ip") == 1.0
+
+
+def test_buckets_evict_least_recently_used_key():
+    buckets = TokenBuckets(rate=1.0, capacity=1, max_keys=2, clock=Clock())
+    buckets.acquire("a")
+    buckets.acquire("b")
+    buckets.acquire("a")
+    buckets.acquire("c")
+    assert len(buckets) == 2
+    # "b" was evicted, so it starts over with a full bucket
+    assert buckets.acquire("b") == 0.0
+
+
+def test_fingerprint_ignores_case_punctuation_and_yo():
+    assert fingerprint("Client@Example.ru ", "Ещё  раз: позвоните!") == fingerprint("client@example.ru", "еще раз позвоните")
+    assert fingerprint("a@example.ru", "привет") != fingerprint("b@example.ru", "привет")
+
+
+def test_bloom_filter_remembers_for_window_then_forgets():
+    clock = Clock()
+    recent = RollingBloomFilter(capacity=1000, window=100, clock=clock)
+    recent.add(b"first")
+    assert b"first" in recent and b"other" not in recent
+    clock.now = 150  # the next add starts a new generation; the old one is still consulted
+    recent.add(b"second")
+    assert b"first" in recent and b"second" in recent
+    clock.now = 300
+    recent.add(b"third")
+    assert b"first" not in recent and b"second" in recent
+
+
+def test_bloom_filter_rotates_at_capacity():
+    recent = RollingBloomFilter(capacity=10, clock=Clock())
+    for i in range(25):
+        recent.add(f"item {i}".encode())
+    assert b"item 24" in recent and b"item 15" in recent
+    assert b"item 0" not in recent
+
+
+def test_bloom_filter_false_positive_rate_is_tiny():
+    recent = RollingBloomFilter(capacity=10_000, error_rate=1e-6, clock=Clock())
+    for i in range(10_000):
+        recent.add(f"seen {i}".encode())
+    assert all(f"seen {i}".encode() in recent for i in range(10_000))
+    assert sum(f"unseen {i}".encode() in recent for i in range(10_000)) == 0
+
+
+def test_wait_reports_without_taking_tokens():
+    buckets = TokenBuckets(rate=1 / 60, capacity=1, clock=Clock())
+    assert buckets.wait("ip") == 0.0
+    assert buckets.wait("ip") == 0.0
+    assert buckets.acquire("ip") == 0.0
+    assert buckets.wait("ip") == 60.0
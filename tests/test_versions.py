@@ -0,0 +1,21 @@
+import pytest
+
+from versions import matching_etag
+
+ETAG = '"3.5.1"'
+
+
+@pytest.mark.parametrize("header, expected", [
+    ('"3.5.1"', '"3.5.1"'),
+    ('W/"3.5.1"', 'W/"3.5.1"'),
+    ('"3.5.1-br"', '"3.5.1-br"'),
+    ('"3.5.1-gzip"', '"3.5.1-gzip"'),
+    ('"old", "3.5.1"', '"3.5.1"'),
+    ("*", ETAG),
+    ('"3.5.2"', None),
+    ('"3.5"', None),
+    ("", None),
+    (None, None),
+])
+def test_matching_etag(header, expected):
+    assert matching_etag(header, ETAG) == expected